@@ -3,50 +3,172 @@ AriaRay Brown
 June, 2022
 
 [analyze]
-Analyze and inspect the frequency distribution of 
+Analyze and inspect the frequency distribution of
 co-occurring phonemes (speech sounds) in multiple
 languages.
 """
 
 from utilities import *
-import text_to_ipa
 import train_ngram
-import identify
-import evaluate
-import matplotlib.pyplot as plt
-import nltk
+import json
+import os
+import time
+import numpy as np
 
 LANGS = LANGUAGES[:-1] # don't include en_uk for analysis
+RESULTS_PATH = "./results/"
 
-lang_ngrams = train_ngram.train_languages(LANGS)
+MIN_COUNT = 2 # n-grams must occur more than this many times in a language to count as present
+TOP_SHARED = 20 # number of most shared n-grams to report
+MAX_MATRIX_BYTES = 1 << 29 # largest dense language x n-gram matrix built by ngram_matrix() (512 MiB)
 
-unigrams = []
-bigrams = []
-trigrams = []
 
-# Inspecting shared unigrams, bigrams, and trigrams across languages
-for l in lang_ngrams:
-    # for gram in lang_ngrams[l]["unigrams"].keys():
-    #     if lang_ngrams[l]["unigrams"][gram]["count"] > 2: # ensure that this phoneme occurs more than once
-    #         bigrams.append(gram)
-    for gram in lang_ngrams[l]["bigrams"].keys():
-        if lang_ngrams[l]["bigrams"][gram]["count"] > 2:
-            bigrams.append(gram)
-    for gram in lang_ngrams[l]["trigrams"].keys():
-        if lang_ngrams[l]["trigrams"][gram]["count"] > 2:
-            trigrams.append(gram)
+def ngram_matrix(language_ngrams, langs=LANGS, min_count=MIN_COUNT):
+    """
+    Build a language x n-gram matrix of counts, with the n-grams of all orders as columns.
+    Columns are grouped by order, and in order of first occurrence within each order.
+    The matrix is dense (8 bytes per cell), which suits a few dozen languages and
+    up to about a million distinct n-grams; larger matrices (over MAX_MATRIX_BYTES) 
+    raise a ValueError.
 
-bigram_fd = nltk.FreqDist(bigrams) # shows most common based on number of languages that share the speech sound
-print(bigram_fd.most_common(20)) 
+    param: language_ngrams, the dictionary of n-grams from train_ngram.train_languages()
+    param: langs, the list of languages (rows)
+    param: min_count, int count an n-gram must exceed to be included for a language
+    return: matrix, a float array of shape (languages, n-grams) of counts (0 if absent)
+    return: grams, the list of n-gram tuples (columns)
+    return: columns, a dictionary of order name : (first column, end column)
+    """
+    orders = []
+    for l in langs:
+        orders.extend(n for n in language_ngrams[l] if n not in orders)
 
-trigram_fd = nltk.FreqDist(trigrams)
-print(trigram_fd.most_common(20))
+    grams, columns = [], {}
+    rows, cols, counts = [], [], []
+    for n in orders:
+        index = {} # n-gram : column
+        start = len(grams)
 
-# unigram_fd = nltk.FreqDist(unigrams)
-# print(unigram_fd.most_common(20)) 
+        for row, l in enumerate(langs):
+            for gram, entry in language_ngrams[l].get(n, {}).items():
+                if entry["count"] > min_count:
+                    if gram not in index:
+                        index[gram] = len(grams)
+                        grams.append(gram)
+                    rows.append(row)
+                    cols.append(index[gram])
+                    counts.append(entry["count"])
 
+        columns[n] = (start, len(grams))
 
+    size = len(langs) * len(grams) * np.dtype(float).itemsize
+    if size > MAX_MATRIX_BYTES:
+        raise ValueError("A " + str(len(langs)) + " x " + str(len(grams)) + " matrix needs " + str(size) 
+                         + " bytes, over MAX_MATRIX_BYTES (" + str(MAX_MATRIX_BYTES) + ")")
 
-# Show plots
-#plt.show()
+    matrix = np.zeros((len(langs), len(grams)))
+    matrix[np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)] = counts
 
+    return matrix, grams, columns
+
+
+def compare_profiles(matrix, top=TOP_SHARED):
+    """
+    Compare the languages (rows) of a language x n-gram count matrix.
+
+    param: matrix, a float array of shape (languages, n-grams) of counts
+    param: top, int number of most shared n-grams to return
+    return: comparison, a dictionary of:
+                "overlap": array of the number of n-grams shared by each pair of languages
+                "jaccard": array of shared n-grams / n-grams in either language
+                "cosine": array of cosine similarity of n-gram frequencies
+                "most_shared": array of the columns of the top most shared n-grams
+                "shared_by": array of the number of languages sharing each n-gram
+    """
+    present = (matrix > 0).astype(float)
+
+    overlap = present @ present.T
+    sizes = np.diag(overlap)
+    union = sizes[:, None] + sizes[None, :] - overlap
+    jaccard = np.divide(overlap, union, out=np.zeros_like(overlap), where=union > 0)
+
+    totals = matrix.sum(axis=1, keepdims=True)
+    freqs = np.divide(matrix, totals, out=np.zeros_like(matrix), where=totals > 0)
+    norms = np.linalg.norm(freqs, axis=1)
+    dots = freqs @ freqs.T
+    outer = norms[:, None] * norms[None, :]
+    cosine = np.divide(dots, outer, out=np.zeros_like(dots), where=outer > 0)
+
+    # Most shared n-grams, ties in order of first occurrence
+    shared_by = present.sum(axis=0)
+    most_shared = np.argsort(-shared_by, kind="stable")[:top]
+
+    return {"overlap": overlap, "jaccard": jaccard, "cosine": cosine,
+            "most_shared": most_shared, "shared_by": shared_by}
+
+
+def analyze_overlap(language_ngrams, langs=LANGS, min_count=MIN_COUNT, top=TOP_SHARED, results_path=RESULTS_PATH):
+    """
+    Compare the n-gram profiles of languages for each order of n-grams: the number
+    of n-grams each pair of languages shares, their Jaccard and cosine similarities,
+    and the n-grams shared by the most languages. Writes results to a JSON file.
+
+    param: language_ngrams, the dictionary of n-grams from train_ngram.train_languages()
+    param: langs, the list of languages to compare
+    param: min_count, int count an n-gram must exceed to be counted for a language
+    param: top, int number of most shared n-grams to report
+    param: results_path, string path to the directory to write results to
+    return: analysis, a dictionary of results for each order of n-grams
+    """
+    matrix, grams, columns = ngram_matrix(language_ngrams, langs, min_count)
+
+    analysis = {"langs": langs, "min_count": min_count, "orders": {}}
+    for n, (start, end) in columns.items():
+        comparison = compare_profiles(matrix[:, start:end], top)
+        present = matrix[:, start:end] > 0
+
+        analysis["orders"][n] = {
+            "grams": end - start,
+            "overlap": comparison["overlap"].astype(int).tolist(),
+            "jaccard": comparison["jaccard"].round(4).tolist(),
+            "cosine": comparison["cosine"].round(4).tolist(),
+            "most_shared": [{"gram": " ".join(grams[start + column]),
+                             "languages": int(comparison["shared_by"][column]),
+                             "shared_by": [l for l, has in zip(langs, present[:, column]) if has]}
+                            for column in comparison["most_shared"]]}
+
+    # Write results to file
+    if not os.path.isdir(results_path):
+        os.makedirs(results_path)
+    results_file = os.path.join(results_path, "analysis-" + time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(results_file, "w", encoding="utf-8") as f:
+        json.dump(analysis, f, indent=2, ensure_ascii=False)
+    analysis["results_file"] = results_file
+
+    return analysis
+
+
+def print_analysis(analysis):
+    """
+    Print the most shared n-grams, and the most similar language to each language, for each order.
+    """
+    langs = analysis["langs"]
+    for n, results in analysis["orders"].items():
+        print("\n" + n + " (" + str(results["grams"]) + " n-grams):")
+        print("Most shared:", [(shared["gram"], shared["languages"]) for shared in results["most_shared"]])
+
+        for i, l in enumerate(langs):
+            others = [(results["jaccard"][i][j], langs[j]) for j in range(len(langs)) if j != i]
+            if others:
+                jaccard, closest = max(others)
+                print(l + ": closest", closest, "(Jaccard", str(jaccard) + ", cosine", str(results["cosine"][i][langs.index(closest)]) + ")")
+
+    print("\nResults written to:", analysis["results_file"])
+
+
+# Inspecting shared n-grams across languages
+if __name__ == "__main__":
+
+    lang_ngrams = train_ngram.train_languages(LANGS)
+
+    analysis = analyze_overlap(lang_ngrams)
+    print_analysis(analysis)
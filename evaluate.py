@@ -12,13 +12,38 @@ import text_to_ipa
 import train_ngram
 import identify
 from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor
+import json
+import math
+import os
+import time
 
 SNIPPETS = "./test-docs/snippets.txt"
+RESULTS_PATH = "./results/"
 
-# For the future:
-# TEST_DOCS = {}
-# for l in LANGUAGES:
-#     TEST_DOCS[l] = "./test-docs/"+l+".txt"
+# On-disk cache of transcribed test inputs, so re-runs only redo identification
+# (see transcribe() and init_transcription_cache()). Set to None to always transcribe.
+TRANSCRIPTION_CACHE = "./cache/transcriptions.sqlite"
+_transcription_cache_pid = None # process that opened the cache
+
+# Snippet sizes (number of chars, or phonemes) tested in test_snippet_sizes(), where None is the full snippet
+SNIPPET_SIZES = list(range(5,50,10)) + [None]
+
+# Unknown tokens already handled in each language (per process), 
+# reused across snippet sizes by run_snippet_sizes() 
+_oov_memo = {}
+
+# Test documents for each language (one sentence per line)
+TEST_DOCS = {}
+for l in LANGUAGES:
+    TEST_DOCS[l] = "./test-docs/"+l+".txt"
+
+# Numbers of most frequent n-grams compared in sweep_k(), where 0 is all n-grams
+SWEEP_KS = [20, 50, 100, 200, 500, 1000, 0]
+
+# Latencies are counted in buckets growing by 5%, so percentiles 
+# can be estimated (within 5%) without keeping every latency
+LATENCY_BUCKET_GROWTH = 1.05
 
 
 def _load_snippets(file):
@@ -40,7 +65,48 @@ def _load_snippets(file):
     return snippets
 
 
-def test(sentence, lang, n_chars=None):
+def init_transcription_cache(db_path):
+    """
+    Set the on-disk cache of transcribed test inputs used by transcribe(),
+    closing the one opened by this process, if any. The new file is opened on
+    the next transcription.
+
+    param: db_path, string path to a SQLite file, or None to always transcribe
+    """
+    global TRANSCRIPTION_CACHE, _transcription_cache_pid
+
+    if _transcription_cache_pid == os.getpid():
+        text_to_ipa.open_translation_cache_db(None)
+    TRANSCRIPTION_CACHE = db_path
+    _transcription_cache_pid = None
+
+
+def transcribe(sentence, lang, oov_memo=None):
+    """
+    Transcribe a sentence into IPA with text_to_ipa.translate(), through the on-disk 
+    translation cache at TRANSCRIPTION_CACHE (keyed by a hash of the language, mode,
+    IPA dictionary version, transcription configuration and text), opened once in each 
+    process. The in-memory tier of the cache is kept.
+
+    param: sentence, string of text
+    param: lang, string language abbreviation for the known language of the text
+    param: oov_memo, (optional) dictionary of unknown tokens already handled
+                     (see text_to_ipa.ipa_lookup())
+    return: phonemes, the string IPA transcription
+    """
+    global _transcription_cache_pid
+
+    if TRANSCRIPTION_CACHE and _transcription_cache_pid != os.getpid():
+        # A connection opened before forking must not be used (or closed) in the new process
+        if _transcription_cache_pid is not None:
+            text_to_ipa.translation_cache_db = None
+        text_to_ipa.open_translation_cache_db(TRANSCRIPTION_CACHE)
+        _transcription_cache_pid = os.getpid()
+
+    return text_to_ipa.translate(sentence, lang, oov_memo=oov_memo)
+
+
+def test(sentence, lang, n_chars=None, oov_memo=None):
     """
     Test a string of known-language text using the 
     phoneme-based n-gram language identification model.
@@ -50,11 +116,13 @@ def test(sentence, lang, n_chars=None):
                  known language of the text
     param: n_chars, int number of chars of the given sentence
                     to identify. Defaults to full length of sentence.
+    param: oov_memo, (optional) dictionary of unknown tokens already handled
+                     (see text_to_ipa.ipa_lookup())
     """
     if n_chars == -1: n_chars = len(sentence)
     sentence = sentence[:n_chars]
 
-    phonemes = text_to_ipa.translate(sentence, lang)
+    phonemes = transcribe(sentence, lang, oov_memo)
     predictions = identify.identify_language(phonemes)
     language = identify.best(predictions)
     
@@ -76,18 +144,27 @@ def test_snippets(file, n_chars=None, print_all=True):
     snippets = _load_snippets(file)
     results = {}
     
-    num_accurate = 0
     for lang in tqdm(snippets, desc="Testing snippets"):
 
         sentence = snippets[lang]
         result = test(sentence, lang, n_chars)
         
         results[lang] = result
-        
-        accurate = result[2]
-        if accurate: num_accurate += 1
     
-    accuracy = num_accurate/len(snippets)
+    print_snippet_results(results, print_all)
+
+    return results
+
+
+def print_snippet_results(results, print_all=True):
+    """
+    Print the results of a snippets test, with the accuracy over all snippets.
+
+    param: results, a dictionary of test() results for each language key
+    param: print_all, default True, print all scores (else only the top language)
+    """
+    num_accurate = len([l for l in results if results[l][2]])
+    accuracy = num_accurate/len(results)
 
     print("\nSnippets Identification Test\n")
 
@@ -98,30 +175,393 @@ def test_snippets(file, n_chars=None, print_all=True):
         for l, result in results.items():
             print(l + ": " + str(result[0][0][0]), result[1:])
 
-    print("\nAccuracy:", str(num_accurate)+"/"+str(len(snippets)),"("+str(accuracy)+")")
+    print("\nAccuracy:", str(num_accurate)+"/"+str(len(results)),"("+str(accuracy)+")")
+
+
+def _test_job(job):
+    """
+    Test one (sentence, language, size) job for run_snippet_sizes(),
+    reusing the unknown tokens already handled for the language in this process.
+    """
+    sentence, lang, n_chars = job
+    oov_memo = _oov_memo.setdefault(lang, {})
+
+    return test(sentence, lang, n_chars, oov_memo)
+
+
+def _test_prefix_job(job):
+    """
+    Test one (sentence, language, sizes) job for run_snippet_sizes() in phonemes:
+    the sentence is transcribed once, and its phoneme prefixes of each size are 
+    scored incrementally (see identify.identify_prefixes()).
+    Returns a dictionary of size : test()-like result.
+    """
+    sentence, lang, sizes = job
+    phonemes = transcribe(sentence, lang, _oov_memo.setdefault(lang, {}))
+
+    results = {}
+    for n_phonemes, predictions in identify.identify_prefixes(phonemes, sizes).items():
+        results[n_phonemes] = (predictions, lang, identify.best(predictions) == NAMED_LANGS[lang])
 
     return results
 
 
-def test_snippet_sizes(file):
+def run_snippet_sizes(file, sizes=SNIPPET_SIZES, workers=None, unit="chars"):
+    """
+    Test a snippet from each trained language at each size, 
+    running jobs on a pool of processes.
+    Snippets are loaded once, and each language's jobs are sent to
+    the same process so they can reuse its handled unknown tokens.
+
+    In chars, each size is a different string, so it is transcribed and scored
+    from scratch (one job per language and size). In phonemes, each snippet is 
+    transcribed once and all sizes are scored in one incremental pass (one job per language).
+
+    param: file, path to tab-delimited txt file of snippets
+    param: sizes, list of int number of chars (or phonemes) to identify (None for the full snippet)
+    param: workers, (optional) int number of processes (default: number of CPUs)
+    param: unit, default "chars". "chars" to cut the snippet text, "phonemes" to cut its transcription
+    return: size_results, a dictionary of test_snippets()-like results for each size key
+    """
+    if unit not in ("chars", "phonemes"):
+        raise ValueError("unit must be chars or phonemes, not " + str(unit))
+
+    snippets = _load_snippets(file)
+    size_results = {size: {} for size in sizes}
+
+    if unit == "phonemes":
+        jobs = [(snippets[lang], lang, sizes) for lang in snippets]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(tqdm(executor.map(_test_prefix_job, jobs),
+                                total=len(jobs), desc="Testing snippet sizes"))
+
+        for (sentence, lang, job_sizes), prefix_results in zip(jobs, results):
+            for n_phonemes, result in prefix_results.items():
+                size_results[n_phonemes][lang] = result
+
+        return size_results
+
+    # Group jobs by language
+    jobs = [(snippets[lang], lang, n_chars) for lang in snippets for n_chars in sizes]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(tqdm(executor.map(_test_job, jobs, chunksize=len(sizes)),
+                            total=len(jobs), desc="Testing snippet sizes"))
+
+    for (sentence, lang, n_chars), result in zip(jobs, results):
+        size_results[n_chars][lang] = result
+
+    return size_results
+
+
+def test_snippet_sizes(file, workers=None, unit="chars"):
     """
     Test accuracy of model on identifying the language
     of a single snippet of text in varying sizes from each trained language.
 
     param: file, path to tab-delimited txt file of snippets
+    param: workers, (optional) int number of processes (see run_snippet_sizes())
+    param: unit, default "chars", the unit of sizes: "chars" of text, or "phonemes" 
+                 of its transcription (scored incrementally, see run_snippet_sizes())
     """
     print("\n****************************************")
     print("***Test Varying Snippet-of-Text Sizes***")
     print("****************************************\n")
 
-    # Test varying sizes
-    for n_chars in range(5,50,10):
-        test_snippets(file, n_chars, print_all=False)
-        print("--> when testing string length:", n_chars,"\n")
+    size_results = run_snippet_sizes(file, SNIPPET_SIZES, workers, unit)
+
+    # Print varying sizes, then full length
+    for n_chars, results in size_results.items():
+        print_snippet_results(results, print_all=False)
+        if n_chars is None:
+            print("--> when testing full strings.\n")
+        else:
+            print("--> when testing", "string length:" if unit == "chars" else "phoneme length:", n_chars,"\n")
 
-    # Test full length
-    test_snippets(file, print_all=False)
-    print("--> when testing full strings.\n")
+
+def test_prefix_curve(file, max_length=None, results_path=RESULTS_PATH):
+    """
+    Test accuracy of model on identifying the language of a single snippet of
+    text from each trained language, at every length (in phonemes) of the 
+    snippet's transcription. Each transcription is scored once, incrementally 
+    (see identify.identify_prefixes()).
+    Languages without an IPA dictionary are skipped.
+
+    param: file, path to tab-delimited txt file of snippets
+    param: max_length, (optional) int max number of phonemes to test (default: full snippets)
+    param: results_path, string path to the directory to write results to
+    return: curve, a dictionary of length : {"tested", "correct", "accuracy"}, where
+                   only snippets with at least that many phonemes are tested
+    """
+    snippets = _load_snippets(file)
+    curve = {}
+
+    for lang in tqdm(snippets, desc="Testing prefix lengths"):
+        if not os.path.isfile(IPA_PATH + text_to_ipa.languages[lang]["ipa_csv"]):
+            continue
+
+        phonemes = transcribe(snippets[lang], lang)
+        n_phonemes = len(text_to_ipa.parse_ipa_input(phonemes))
+        if max_length:
+            n_phonemes = min(n_phonemes, max_length)
+
+        prefix_predictions = identify.identify_prefixes(phonemes, range(1, n_phonemes+1))
+        for length, predictions in prefix_predictions.items():
+            counts = curve.setdefault(length, {"tested": 0, "correct": 0})
+            counts["tested"] += 1
+            counts["correct"] += (identify.best(predictions) == NAMED_LANGS[lang])
+
+    curve = {length: curve[length] for length in sorted(curve)}
+    for counts in curve.values():
+        counts["accuracy"] = counts["correct"]/counts["tested"]
+
+    # Write results to file
+    if not os.path.isdir(results_path):
+        os.makedirs(results_path)
+    results_file = os.path.join(results_path, "prefix-curve-" + time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(results_file, "w", encoding="utf-8") as f:
+        json.dump(curve, f, indent=2)
+
+    print("\nPrefix Length Identification Test\n")
+    for length, counts in curve.items():
+        print(str(length) + " phonemes:", str(counts["correct"])+"/"+str(counts["tested"]), "("+str(counts["accuracy"])+")")
+    print("Results written to:", results_file)
+
+    return curve
+
+
+def sweep_k(file, ks=SWEEP_KS, results_path=RESULTS_PATH):
+    """
+    Test accuracy and scoring speed of the model on a single snippet of text
+    from each trained language, keeping only the top k n-grams of each
+    language profile, for each k. Top k tables are taken from the trained
+    n-grams (see train_ngram.top_k_profiles()), so nothing is retrained,
+    and each snippet is translated once.
+    Languages without an IPA dictionary are skipped.
+
+    param: file, path to tab-delimited txt file of snippets
+    param: ks, list of int numbers of n-grams to keep (0 for all n-grams)
+    param: results_path, string path to the directory to write results to
+    return: report, a dictionary of k : {"correct", "tested", "accuracy", "mean_ms"}
+    """
+    snippets = _load_snippets(file)
+    transcribed = {lang: transcribe(snippets[lang], lang) for lang in snippets
+                   if os.path.isfile(IPA_PATH + text_to_ipa.languages[lang]["ipa_csv"])}
+
+    report = {}
+    for k in tqdm(ks, desc="Testing top k n-grams"):
+        profiles = train_ngram.top_k_profiles(identify.LANGUAGE_NGRAMS, k)
+        correct, seconds = 0, 0.0
+
+        for lang, phonemes in transcribed.items():
+            start = time.perf_counter()
+            predicted = identify.best(identify.identify_language(phonemes, profiles=profiles))
+            seconds += time.perf_counter() - start
+
+            correct += (predicted == NAMED_LANGS[lang])
+
+        report[k] = {"correct": correct, "tested": len(transcribed),
+                     "accuracy": correct/len(transcribed),
+                     "mean_ms": 1000 * seconds/len(transcribed)}
+
+    # Write results to file
+    if not os.path.isdir(results_path):
+        os.makedirs(results_path)
+    results_file = os.path.join(results_path, "sweep-k-" + time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(results_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print("\nTop k N-grams Identification Test\n")
+    for k, metrics in report.items():
+        print("k =", str(k or "all") + ":", str(metrics["correct"])+"/"+str(metrics["tested"]),
+              "("+str(metrics["accuracy"])+"),", round(metrics["mean_ms"], 3), "ms per snippet")
+    print("Results written to:", results_file)
+
+    return report
+
+
+def _add_latency(histogram, seconds):
+    """
+    Count a latency (in seconds) in a latency histogram dictionary of bucket : count.
+    """
+    bucket = math.floor(math.log(max(seconds, 1e-7)) / math.log(LATENCY_BUCKET_GROWTH))
+    histogram[bucket] = histogram.get(bucket, 0) + 1
+
+
+def _latency_percentile(histogram, p):
+    """
+    Estimate the p-th percentile latency (in milliseconds) from a latency histogram.
+    """
+    total = sum(histogram.values())
+    if not total:
+        return None
+
+    rank = math.ceil(total * p / 100)
+    seen = 0
+    for bucket in sorted(histogram):
+        seen += histogram[bucket]
+        if seen >= rank:
+            break
+
+    # Report the upper bound of the bucket
+    return 1000 * LATENCY_BUCKET_GROWTH ** (bucket + 1)
+
+
+def _summarize(lines, correct, seconds, histogram):
+    """
+    Summarize streamed counts as a dictionary of accuracy and throughput metrics,
+    where seconds is the wall-clock time taken for all lines.
+    """
+    return {"lines": lines,
+            "correct": correct,
+            "accuracy": correct/lines if lines else None,
+            "lines_per_sec": lines/seconds if seconds else None,
+            "p50_ms": _latency_percentile(histogram, 50),
+            "p99_ms": _latency_percentile(histogram, 99)}
+
+
+def test_documents(docs=TEST_DOCS, ipa=False, results_path=RESULTS_PATH, shortlist=None, audit=False):
+    """
+    Test accuracy and speed of the model on test documents of any size.
+    Each line of a document is identified as a separate sentence. Documents
+    are streamed, keeping only running counts (no results per line).
+    Languages without a test document are skipped.
+
+    param: docs, dictionary of language key : path to test document
+    param: ipa, default False. If True, document lines are already in IPA
+                (else they are translated from text first).
+    param: results_path, string path to the directory to write results to
+    param: shortlist, (optional) int number of languages to shortlist before full scoring
+                      (see identify.score_coarse_to_fine())
+    param: audit, default False. If True (with a shortlist), also score all languages in full,
+                  and report how often the best language fell outside the shortlist.
+                  Latencies then include full scoring, so leave off when measuring speed.
+    return: report, a dictionary of metrics for each language and overall,
+                    with a confusion matrix (known language : predicted language : count)
+    """
+    abbreviations = {NAMED_LANGS[l]: l for l in NAMED_LANGS}
+    shortlist_stats = identify.shortlist_stats() if shortlist and audit else None
+
+    report = {"languages": {}, "overall": {}, "confusion": {}}
+    total_lines, total_correct, total_histogram = 0, 0, {}
+    total_start = time.perf_counter()
+
+    for lang, doc in docs.items():
+        if not os.path.isfile(doc):
+            print("No test document for", lang + ":", doc)
+            continue
+
+        lines, correct, histogram = 0, 0, {}
+        confusion = {}
+        lang_start = time.perf_counter()
+
+        with open(doc, mode="r", encoding="utf-8") as f:
+            for line in tqdm(f, desc="Testing "+lang, unit=" lines"):
+                if line.isspace():
+                    continue
+
+                start = time.perf_counter()
+
+                phonemes = line if ipa else transcribe(line, lang)
+                predicted = identify.best(identify.identify_language(phonemes, shortlist=shortlist, audit=shortlist_stats))
+
+                latency = time.perf_counter() - start
+
+                predicted = abbreviations[predicted]
+                confusion[predicted] = confusion.get(predicted, 0) + 1
+
+                lines += 1
+                correct += (predicted == lang)
+                _add_latency(histogram, latency)
+
+        seconds = time.perf_counter() - lang_start
+        report["languages"][lang] = _summarize(lines, correct, seconds, histogram)
+        report["confusion"][lang] = confusion
+
+        total_lines += lines
+        total_correct += correct
+        for bucket, count in histogram.items():
+            total_histogram[bucket] = total_histogram.get(bucket, 0) + count
+
+    total_seconds = time.perf_counter() - total_start
+    report["overall"] = _summarize(total_lines, total_correct, total_seconds, total_histogram)
+    if shortlist_stats is not None:
+        report["shortlist"] = identify.shortlist_report(shortlist_stats)
+
+    # Write results to file
+    if not os.path.isdir(results_path):
+        os.makedirs(results_path)
+    results_file = os.path.join(results_path, "test-docs-" + time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(results_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print("\nTest Documents Identification Test\n")
+    for l, metrics in report["languages"].items():
+        print(l + ":", str(metrics["correct"])+"/"+str(metrics["lines"]), "("+str(metrics["accuracy"])+")")
+    print("\nAccuracy:", str(total_correct)+"/"+str(total_lines), "("+str(report["overall"]["accuracy"])+")")
+    print("Results written to:", results_file)
+
+    return report
+
+
+def test_quantized(file, bits=8, model_file=None):
+    """
+    Compare accuracy of a quantized model against the (float) trained model
+    on a single snippet of text from each trained language.
+
+    param: file, path to tab-delimited txt file of snippets
+    param: bits, int size of quantized codes, 8 or 16 (default 8)
+    param: model_file, (optional) path to a quantized model file
+                       (see train_ngram.save_quantized()). If not given,
+                       the trained model is quantized in memory.
+    return: report, a dictionary of accuracies for each model, 
+                    the agreement of their top predictions, and score differences
+    """
+    report = {"bits": bits}
+
+    if model_file:
+        start = time.perf_counter()
+        quantized = train_ngram.load_quantized(model_file)
+        report["load_ms"] = 1000 * (time.perf_counter() - start)
+        report["file_bytes"] = os.path.getsize(model_file)
+        # (All tables of a model have the same bits, whichever languages and orders it has)
+        tables = next(iter(quantized.values()))
+        report["bits"] = next(iter(tables.values()))["bits"]
+    else:
+        quantized = train_ngram.quantize_languages(identify.LANGUAGE_NGRAMS, bits)
+
+    snippets = _load_snippets(file)
+    float_correct, quantized_correct, agree = 0, 0, 0
+    score_diffs = []
+
+    for lang in tqdm(snippets, desc="Testing quantized model"):
+        phonemes = transcribe(snippets[lang], lang)
+
+        float_predictions = identify.identify_language(phonemes)
+        quantized_predictions = identify.identify_language(phonemes, method="quantized", profiles=quantized)
+
+        float_best = identify.best(float_predictions)
+        quantized_best = identify.best(quantized_predictions)
+
+        float_correct += (float_best == NAMED_LANGS[lang])
+        quantized_correct += (quantized_best == NAMED_LANGS[lang])
+        agree += (float_best == quantized_best)
+
+        quantized_scores = dict(quantized_predictions)
+        score_diffs.extend(abs(score - quantized_scores[l]) for l, score in float_predictions)
+
+    report["float_accuracy"] = float_correct/len(snippets)
+    report["quantized_accuracy"] = quantized_correct/len(snippets)
+    report["top_agreement"] = agree/len(snippets)
+    report["mean_score_diff"] = sum(score_diffs)/len(score_diffs)
+    report["max_score_diff"] = max(score_diffs)
+
+    print("\nQuantized Model Test\n")
+    for key, value in report.items():
+        print(key + ":", value)
+
+    return report
 
 
 # Run test functions as needed
@@ -136,5 +576,17 @@ if __name__ == "__main__":
     #use python3 evaluate.py >> results/snippet-sizes.txt in terminal
     test_snippet_sizes(SNIPPETS)
 
+    # Snippet sizes in phonemes of each transcription, scored incrementally
+    # test_snippet_sizes(SNIPPETS, unit="phonemes")
+
+    # Accuracy at every snippet length in phonemes, writing results to ./results/
+    # test_prefix_curve(SNIPPETS)
+
+    # Accuracy and speed using only the top k n-grams, writing results to ./results/
+    # sweep_k(SNIPPETS)
+
+    # Test documents in ./test-docs/<lang>.txt, writing results to ./results/
+    # test_documents(TEST_DOCS)
+
 
 
@@ -11,6 +11,9 @@ import text_to_ipa
 import train_ngram
 from train_ngram import print_grams
 import math
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor, wait
 
 # Dictionary of ngrams stored for each language:
 # {"en": {"bigrams": {(,): {"count": int, "log_prob": float} , ...}, 
@@ -19,22 +22,69 @@ import math
 #        }, ...
 LANGUAGE_NGRAMS = train_ngram.train_languages(LANGUAGES)
 
+# Integer phoneme IDs, and n-gram tables keyed by 64-bit rolling hashes of n-grams of IDs,
+# built from LANGUAGE_NGRAMS when first used (see packed_profiles() and compute_packed_ngrams()):
+PHONEME_IDS = {}
+PACKED_NGRAMS = {}
 
-def compute_ngrams(phonemes):
+# Coarse-to-fine identification (see score_coarse_to_fine()):
+SHORTLIST_SIZE = 3 # number of languages kept after the coarse stage
+COARSE_ORDERS = ["bigrams"] # n-grams scored in the coarse stage
+
+# Weight of each size of n-gram in compare_language() (see configure_orders())
+DEFAULT_WEIGHTS = {"bigrams": 0.3, "trigrams": 0.6, "fourgrams": 0.1}
+NGRAM_WEIGHTS = dict(DEFAULT_WEIGHTS)
+
+# Identification of raw text (see identify_text()):
+TEXT_TIMEOUT = 1.0 # seconds to wait for transcriptions into candidate languages
+COVERAGE_WEIGHT = 0.5 # weight of the log of dictionary coverage in the score of each language (tuned on sentences of each language)
+
+# Language segmentation (see identify_segments()):
+SEGMENT_WINDOW = 50 # phonemes in each window scored
+SEGMENT_MIN_SPAN = 20 # spans of fewer phonemes are merged into the span before them
+
+# Scoring method and profiles used by identify_language() when neither is given
+# (see set_default_model(); a model_registry.ModelRegistry can serve its models here)
+default_model = ("freq", None)
+
+
+def configure_orders(sizes, weights=None):
     """
-    param: phonemes, the list of string phonemes 
-    return: computed; a dictionary of lists of bigrams, trigrams, and four-grams
-                      for the given phonemes
+    Change the n-gram sizes used to identify languages (1 to 7, see train_ngram.make_orders()),
+    and retrain the language profiles (LANGUAGE_NGRAMS) with them.
+
+    param: sizes, a list of int n-gram sizes, e.g. range(1, 8)
+    param: weights, (optional) a dictionary of n-gram name : float weight in compare_language().
+                    Default: DEFAULT_WEIGHTS for bigrams, trigrams and four-grams, else equal weights.
     """
-    computed = {"bigrams":[],"trigrams":[],"fourgrams":[]}
+    orders = train_ngram.make_orders(sizes)
+    if weights is None:
+        weights = DEFAULT_WEIGHTS if set(orders) == set(DEFAULT_WEIGHTS) else {n: 1/len(orders) for n in orders}
+    if set(weights) != set(orders):
+        raise ValueError("weights must be given for each of " + str(list(orders)))
+
+    # Update in place, so defaults and references to these dictionaries stay current
+    train_ngram.ORDERS.clear()
+    train_ngram.ORDERS.update(orders)
+    NGRAM_WEIGHTS.clear()
+    NGRAM_WEIGHTS.update((n, weights[n]) for n in orders)
+    if not set(COARSE_ORDERS) <= set(orders):
+        COARSE_ORDERS[:] = [next(iter(orders))]
+
+    LANGUAGE_NGRAMS.clear()
+    LANGUAGE_NGRAMS.update(train_ngram.train_languages(LANGUAGES))
+    PACKED_NGRAMS.clear() # rebuilt when next used
 
-    bigrams = train_ngram.create_ngrams(phonemes, 2)
-    trigrams = train_ngram.create_ngrams(phonemes, 3)
-    fourgrams = train_ngram.create_ngrams(phonemes, 4)
 
-    computed["bigrams"] = bigrams
-    computed["trigrams"] = trigrams
-    computed["fourgrams"] = fourgrams
+def compute_ngrams(phonemes):
+    """
+    param: phonemes, the list of string phonemes 
+    return: computed; a dictionary of n-grams of each size in train_ngram.ORDERS
+                      (bigrams, trigrams, and four-grams by default) for the given phonemes
+    """
+    computed = {}
+    for n, size in train_ngram.ORDERS.items():
+        computed[n] = train_ngram.create_ngrams(phonemes, size)
 
     # for n in computed:
     #     print("\n"+n+":\t\t\tcount\tlogprob")
@@ -44,19 +94,59 @@ def compute_ngrams(phonemes):
     return computed
 
 
-def score_similarity(text_ngrams):
+def packed_profiles():
+    """
+    Returns PACKED_NGRAMS, the language profiles keyed by 64-bit n-gram keys,
+    building them from LANGUAGE_NGRAMS (see train_ngram.pack_profiles()) on first use,
+    so that only "packed" scoring pays for them.
+    """
+    if not PACKED_NGRAMS:
+        PACKED_NGRAMS.update(train_ngram.pack_profiles(LANGUAGE_NGRAMS, PHONEME_IDS))
+
+    return PACKED_NGRAMS
+
+
+def compute_packed_ngrams(phonemes, phoneme_ids=None):
+    """
+    Count the padded n-grams of a list of phonemes as 64-bit keys, with the
+    same rolling hash used in training (see train_ngram.extract_ngram_keys()),
+    without building n-gram tuples or log probabilities.
+    Phonemes without an ID get a new ID for this query only.
+
+    param: phonemes, the list of string phonemes
+    param: phoneme_ids, (optional) the dictionary of phoneme : int ID. Default PHONEME_IDS,
+                        after building the packed profiles (see packed_profiles()).
+    return: computed, a dictionary of the form {"bigrams": {int key: int count, ...}, ...}
+    """
+    if phoneme_ids is None:
+        packed_profiles()
+        phoneme_ids = PHONEME_IDS
+
+    max_n = max(train_ngram.ORDERS.values())
+
+    # Map phonemes to IDs in one buffer, padded for the largest n
+    ids = array("L", [phoneme_ids["$"]]) * (max_n - 1)
+    ids.extend(train_ngram.phoneme_to_ids(phonemes, phoneme_ids, extend=False))
+    ids.extend(array("L", [phoneme_ids["/$"]]) * (max_n - 1))
+
+    return train_ngram.extract_ngram_keys(ids)
+
+
+def score_similarity(text_ngrams, method="freq", profiles=None, langs=LANGUAGES):
     """
     Compare n-grams to each possible language profile to predict the language.
     Returns a list of tuples of similarity scores for each compared language.
     
     example return: [...,("french", 123),...]
 
+    param: method, profiles, (optional) see compare_language()
+    param: langs, (optional) the list of languages to compare to (default all LANGUAGES)
     return: scores, a list of tuples in the form ((string language, float score),...)
     """
     scores = []
 
-    for l in LANGUAGES:
-        score = compare_language(text_ngrams, l)
+    for l in langs:
+        score = compare_language(text_ngrams, l, method, profiles)
         scores.append( (NAMED_LANGS[l], score) )
 
     # Sort scores highest to lowest
@@ -66,27 +156,83 @@ def score_similarity(text_ngrams):
     return scores
 
 
-def compare_language(ngrams_list, language, method="freq"):
+def score_coarse_to_fine(text_ngrams, shortlist_size=SHORTLIST_SIZE, method="freq", profiles=None, audit=None):
+    """
+    Compare n-grams to language profiles in two stages: a cheap coarse stage
+    scores all languages with only the COARSE_ORDERS n-grams (bigrams) to pick 
+    a shortlist, then only the shortlisted languages are scored with all n-grams.
+    Returns similarity scores for the shortlisted languages, like score_similarity().
+
+    param: text_ngrams, the dictionary of n-grams from compute_ngrams()
+    param: shortlist_size, int number of languages to score in full (default SHORTLIST_SIZE)
+    param: method, profiles, (optional) see compare_language()
+    param: audit, (optional) a dictionary of audit counters from shortlist_stats(). If given, 
+                  also score all languages in full (so queries are slower than without a shortlist), 
+                  and count in it whether the best language fell outside the shortlist
+    return: scores, a list of tuples in the form ((string language, float score),...)
+    """
+    # Coarse stage: pick the top languages using only the coarse n-grams
+    coarse_ngrams = {n: text_ngrams[n] for n in COARSE_ORDERS}
+    coarse_scores = sorted(LANGUAGES, key=lambda l: compare_language(coarse_ngrams, l, method, profiles), reverse=True)
+    shortlist = coarse_scores[:shortlist_size]
+
+    # Fine stage: score the shortlist with all n-grams
+    scores = score_similarity(text_ngrams, method, profiles, shortlist)
+
+    if audit is not None:
+        full_scores = score_similarity(text_ngrams, method, profiles)
+        audit["audited"] += 1
+        if best(full_scores) != best(scores):
+            audit["misses"] += 1
+
+    return scores
+
+
+def shortlist_stats():
+    """
+    Returns a new dictionary of audit counters for score_coarse_to_fine().
+    """
+    return {"audited": 0, "misses": 0}
+
+
+def shortlist_report(stats):
+    """
+    Returns a dictionary of the audit counters from score_coarse_to_fine(), including 
+    the rate of audited queries where the best language fell outside the shortlist.
+    """
+    report = dict(stats)
+    report["miss_rate"] = report["misses"]/report["audited"] if report["audited"] else None
+
+    return report
+
+
+def compare_language(ngrams_list, language, method="freq", profiles=None):
     """
     Compares the given list of ngrams to the language profile 
     (frequency distribution of ngrams) in the given language.
     Returns a score for matching similarity.
 
+    param: method, default "freq", the scoring method:
+                "freq": score with log probabilities of trained n-grams
+                "quantized": score with quantized log probabilities
+                             (see train_ngram.quantize_languages())
+                "packed": score like "freq", with 64-bit n-gram keys
+                          (see compute_packed_ngrams())
+    param: profiles, (optional) the dictionary of language profiles to compare to.
+                     Defaults to LANGUAGE_NGRAMS ("freq") or packed_profiles() ("packed");
+                     required for "quantized".
     return: total_score, the float similarity score
 
     """
     total_score = 0
-    lowest_prob = 0.0001128 # by taking lowest probability unigram across all languages, minus trailing digits
+    lowest_prob = train_ngram.LOWEST_PROB # by taking lowest probability unigram across all languages, minus trailing digits
+    unknown = math.log(lowest_prob)
+
+    weights = NGRAM_WEIGHTS
     
     if method=="freq":
     
-        lang_profile = LANGUAGE_NGRAMS[language]
-
-        w2 = 0.3 # weight of bigrams
-        w3 = 0.6 # weight of trigrams
-        w4 = 0.1 # weight of fourgrams
-
-        weights = {"bigrams":w2,"trigrams":w3,"fourgrams":w4}
+        lang_profile = (profiles or LANGUAGE_NGRAMS)[language]
 
         # Compute weighted score for each size ngram
         for n in ngrams_list.keys():
@@ -104,7 +250,7 @@ def compare_language(ngrams_list, language, method="freq"):
                 # Else, using a smoothing method for unknown ngrams
                 else:
                     # Current method: add a very low probability
-                    score += math.log(lowest_prob)
+                    score += unknown
 
                 #print(gram, score)
             
@@ -113,33 +259,410 @@ def compare_language(ngrams_list, language, method="freq"):
             
             # Integrate total score with weighted scores for each n TODO: consider equation
             total_score += n_score - math.log(weights[n]) # since n_score is a log-prob, subtract weights to reduce probability
+
+    elif method=="quantized":
+
+        lang_profile = profiles[language]
+
+        # Same as "freq", with log probabilities read from quantized codes
+        for n in ngrams_list.keys():
+            n_score = 0
+            table = lang_profile[n]
+            offset, scale = table["offset"], table["scale"]
+
+            for gram, entry in ngrams_list[n].items():
+                num_occur = entry["count"]
+
+                # Hash each n-gram once, for all languages compared
+                key = entry.get("hash")
+                if key is None:
+                    key = entry["hash"] = train_ngram.gram_hash(gram)
+
+                code = train_ngram.quantized_code(table, key)
+                score = unknown if code is None else offset + code * scale
+                n_score += score + num_occur
+
+            total_score += n_score - math.log(weights[n])
+
+    elif method=="packed":
+
+        lang_profile = (profiles or packed_profiles())[language]
+
+        # Same as "freq", with packed keys : counts
+        for n in ngrams_list.keys():
+            n_score = 0
+            table = lang_profile[n]
+
+            for key, num_occur in ngrams_list[n].items():
+                n_score += table.get(key, unknown) + num_occur
+
+            total_score += n_score - math.log(weights[n])
         
     return total_score
 
 
-def identify_language(ipa):
+def set_default_model(method="freq", profiles=None):
+    """
+    Set the scoring method and language profiles identify_language() uses when
+    neither is given (default: "freq" with LANGUAGE_NGRAMS). Both are swapped 
+    as a single reference, so calls already identifying finish with the old model.
+    """
+    global default_model
+    default_model = (method, profiles)
+
+
+def identify_language(ipa, method=None, profiles=None, shortlist=None, audit=None):
     """
     Identify the language of a string of IPA characters
     by comparing its n-gram clusters of phonemes (speech sounds) 
     to the n-gram frequency distributions of possible languages.
 
     param: ipa, the string utterance in unicode IPA characters
+    param: method, profiles, (optional) see compare_language(). If neither is given,
+                             the default model is used (see set_default_model()); 
+                             if only profiles are given, the method is "freq".
+    param: shortlist, (optional) int number of languages to shortlist in a coarse stage 
+                      before full scoring (see score_coarse_to_fine()). Default None,
+                      score all languages in full.
+    param: audit, (optional) see score_coarse_to_fine()
     return: predicted_language, the string predicted language
     """
+    if method is None:
+        method, profiles = default_model if profiles is None else ("freq", profiles)
     
     # Parse ipa into phonemes
     phonemes = text_to_ipa.parse_ipa_input(ipa)
 
     # Compute n-grams for the transcribed phonemes
-    text_ngrams = compute_ngrams(phonemes)
+    if method=="packed":
+        text_ngrams = compute_packed_ngrams(phonemes)
+    else:
+        text_ngrams = compute_ngrams(phonemes)
 
     # Compare n-grams to each possible language profile
     # to predict the language
-    predictions = score_similarity(text_ngrams)
+    if shortlist:
+        predictions = score_coarse_to_fine(text_ngrams, shortlist, method, profiles, audit)
+    else:
+        predictions = score_similarity(text_ngrams, method, profiles)
 
     return predictions
 
 
+def gram_scorer(method="freq", profiles=None, langs=LANGUAGES):
+    """
+    Returns a function score_gram(n, gram), which returns the list of scores a single n-gram adds
+    to the compare_language() score of each language in langs, not counting its count or the 
+    weight of its size. Scores are computed once per distinct n-gram.
+
+    param: method, profiles, (optional) see compare_language(); "packed" is not supported
+    param: langs, (optional) the list of languages to score (default all LANGUAGES)
+    """
+    gram_scores = {}
+    def score_gram(n, gram):
+        if (n, gram) not in gram_scores:
+            single = {n: {gram: {"count": 0}}}
+            gram_scores[(n, gram)] = [compare_language(single, l, method, profiles) + math.log(NGRAM_WEIGHTS[n])
+                                      for l in langs]
+        return gram_scores[(n, gram)]
+
+    return score_gram
+
+
+def identify_prefixes(ipa, lengths=None, method="freq", profiles=None, langs=LANGUAGES):
+    """
+    Identify the language of each prefix of a string of IPA characters, 
+    reading its phonemes only once. Gives the same scores as identify_language()
+    on each prefix of the phonemes.
+
+    Running sums of the scores of distinct n-grams seen so far are kept for each
+    language, and the n-grams padded at the end are only added for each prefix scored.
+
+    param: ipa, the string utterance in unicode IPA characters
+    param: lengths, (optional) a list of int prefix lengths, in phonemes (None for all phonemes). 
+                    Default: every length from 1 phoneme to all phonemes.
+    param: method, profiles, (optional) see compare_language(); "packed" is not supported
+    param: langs, (optional) the list of languages to compare to (default all LANGUAGES)
+    return: prefix_predictions, a dictionary of length : score_similarity()-like predictions
+    """
+    if method == "packed":
+        raise ValueError("identify_prefixes() does not support the packed method")
+
+    phonemes = text_to_ipa.parse_ipa_input(ipa)
+
+    if lengths is None:
+        lengths = range(1, len(phonemes)+1)
+    targets = {}
+    for length in lengths:
+        end = len(phonemes) if length is None else min(length, len(phonemes))
+        targets.setdefault(end, []).append(length)
+
+    score_gram = gram_scorer(method, profiles, langs)
+
+    orders = {n: train_ngram.ORDERS[n] for n in NGRAM_WEIGHTS}
+    history = {n: ("$",) * (size-1) for n, size in orders.items()} # last n-1 (left-padded) phonemes
+    seen = {n: set() for n in orders}
+    sums = {n: [0.0] * len(langs) for n in orders}
+
+    prefix_predictions = {}
+    for end in range(len(phonemes)+1):
+
+        if end:
+            # Add the n-gram ending at the new phoneme, if not seen before
+            for n, size in orders.items():
+                gram = history[n] + (phonemes[end-1],)
+                history[n] = gram[1:]
+                if gram not in seen[n]:
+                    seen[n].add(gram)
+                    sums[n] = [total + score for total, score in zip(sums[n], score_gram(n, gram))]
+
+        if end not in targets:
+            continue
+
+        # Score this prefix, with the n-grams padded at its end
+        scores = [0.0] * len(langs)
+        for n, size in orders.items():
+            padded = history[n] + ("/$",) * (size-1)
+            n_scores = list(sums[n])
+            for i in range(size-1):
+                n_scores = [total + score for total, score in zip(n_scores, score_gram(n, padded[i:i+size]))]
+
+            # Counts of all n-grams, as added in compare_language()
+            num_grams = end + size - 1
+            scores = [total + n_score + num_grams - math.log(NGRAM_WEIGHTS[n]) 
+                      for total, n_score in zip(scores, n_scores)]
+
+        predictions = sorted(zip([NAMED_LANGS[l] for l in langs], scores), key=lambda x:x[1], reverse=True)
+        for length in targets[end]:
+            prefix_predictions[length] = predictions
+
+    return prefix_predictions
+
+
+def identify_windows(ipa, window=SEGMENT_WINDOW, step=1, method="freq", profiles=None, langs=LANGUAGES):
+    """
+    Identify the language of each window of a number of phonemes in a string of IPA characters,
+    sliding the window over its phonemes. Gives the same scores as identify_language() on each window.
+
+    The n-grams in the window are counted, and the scores of distinct n-grams are summed
+    for each language: each step only adds the n-gram entering the window and removes the 
+    one leaving it, so the whole string is scored in linear time.
+
+    param: ipa, the string utterance in unicode IPA characters
+               (or its list of phonemes, from text_to_ipa.parse_ipa_input())
+    param: window, int number of phonemes in each window (at least the largest n-gram size).
+                   Strings with fewer phonemes are scored as a single window.
+    param: step, int number of phonemes between windows scored (the last window is always scored)
+    param: method, profiles, (optional) see compare_language(); "packed" is not supported
+    param: langs, (optional) the list of languages to compare to (default all LANGUAGES)
+    yield: (start, predictions), the index of the first phoneme in the window (see
+           text_to_ipa.parse_ipa_input()), and score_similarity()-like predictions for the window
+    """
+    if method == "packed":
+        raise ValueError("identify_windows() does not support the packed method")
+
+    orders = {n: train_ngram.ORDERS[n] for n in NGRAM_WEIGHTS}
+    if window < max(orders.values()):
+        raise ValueError("window must be at least " + str(max(orders.values())) + " phonemes")
+
+    phonemes = ipa if isinstance(ipa, list) else text_to_ipa.parse_ipa_input(ipa)
+    if len(phonemes) <= window:
+        yield 0, score_similarity(compute_ngrams(phonemes), method, profiles, langs)
+        return
+
+    score_gram = gram_scorer(method, profiles, langs)
+    counts = {n: {} for n in orders}
+    sums = {n: [0.0] * len(langs) for n in orders}
+
+    def add_gram(n, gram):
+        count = counts[n].get(gram, 0)
+        if not count:
+            sums[n] = [total + score for total, score in zip(sums[n], score_gram(n, gram))]
+        counts[n][gram] = count + 1
+
+    def remove_gram(n, gram):
+        count = counts[n][gram]
+        if count == 1:
+            del counts[n][gram]
+            sums[n] = [total - score for total, score in zip(sums[n], score_gram(n, gram))]
+        else:
+            counts[n][gram] = count - 1
+
+    # N-grams of the first window, without padding
+    for n, size in orders.items():
+        for i in range(window - size + 1):
+            add_gram(n, tuple(phonemes[i:i+size]))
+
+    last = len(phonemes) - window
+    for start in range(last + 1):
+
+        if start:
+            # Slide the window by one phoneme
+            for n, size in orders.items():
+                remove_gram(n, tuple(phonemes[start-1:start-1+size]))
+                add_gram(n, tuple(phonemes[start+window-size:start+window]))
+
+        if start % step and start != last:
+            continue
+
+        # Score this window, with the n-grams padded at its start and end
+        scores = [0.0] * len(langs)
+        for n, size in orders.items():
+            left = ("$",) * (size-1) + tuple(phonemes[start:start+size-1])
+            right = tuple(phonemes[start+window-size+1:start+window]) + ("/$",) * (size-1)
+            n_scores = sums[n]
+            for padded in (left, right):
+                for i in range(size-1):
+                    n_scores = [total + score for total, score in zip(n_scores, score_gram(n, padded[i:i+size]))]
+
+            # Counts of all n-grams, as added in compare_language()
+            num_grams = window + size - 1
+            scores = [total + n_score + num_grams - math.log(NGRAM_WEIGHTS[n])
+                      for total, n_score in zip(scores, n_scores)]
+
+        yield start, sorted(zip([NAMED_LANGS[l] for l in langs], scores), key=lambda x:x[1], reverse=True)
+
+
+def identify_segments(ipa, window=SEGMENT_WINDOW, step=1, min_span=SEGMENT_MIN_SPAN, method="freq", profiles=None, langs=LANGUAGES):
+    """
+    Split a string of IPA characters into spans of phonemes in different languages,
+    e.g. for long transcripts that switch between languages.
+
+    Each phoneme is labelled with the best language of the window centered nearest 
+    to it (see identify_windows()), and runs of phonemes with the same label form spans.
+    Spans shorter than min_span phonemes are merged into the span before them
+    (or the span after them, at the start).
+
+    param: ipa, the string utterance in unicode IPA characters
+    param: window, step, method, profiles, langs, (optional) see identify_windows()
+    param: min_span, int fewest phonemes in a span
+    return: spans, a list of tuples in the form ((int start, int end, string language),...),
+                   where start and end are indexes of phonemes (see text_to_ipa.parse_ipa_input()),
+                   the end not included
+    """
+    phonemes = text_to_ipa.parse_ipa_input(ipa)
+    spans = []
+    if not phonemes:
+        return spans
+
+    def add_span(start, end, language):
+        if spans and end - start < min_span:
+            spans[-1] = (spans[-1][0], end, spans[-1][2])
+        elif len(spans) == 1 and spans[0][1] - spans[0][0] < min_span:
+            spans[0] = (spans[0][0], end, language) # a short first span joins the next
+        else:
+            spans.append((start, end, language))
+        
+        # Merge neighbouring spans of the same language
+        if len(spans) > 1 and spans[-2][2] == spans[-1][2]:
+            spans[-2:] = [(spans[-2][0], spans[-1][1], spans[-1][2])]
+
+    # Label phonemes up to halfway between the centers of consecutive windows,
+    # and add each run of phonemes with the same label as a span
+    run = None # (start, end, language)
+    previous = None # (center, language) of the previous window
+    for start, predictions in identify_windows(phonemes, window, step, method, profiles, langs):
+        center, language = start + window // 2, predictions[0][0]
+        if previous is None:
+            run = (0, 0, language)
+        else:
+            end = (previous[0] + center + 1) // 2
+            run = (run[0], end, run[2])
+            if language != run[2]:
+                add_span(*run)
+                run = (end, end, language)
+        previous = (center, language)
+
+    if run is not None:
+        add_span(run[0], len(phonemes), run[2])
+
+    return spans
+
+
+def identify_text(sentence, langs=LANGUAGES, method="freq", profiles=None, timeout=TEXT_TIMEOUT):
+    """
+    Identify the language of a sentence of raw text, without knowing its language to transcribe it.
+
+    The sentence is tokenized once for each tokenizer family (see text_to_ipa.tokenizer_family()),
+    and its tokens transcribed into every candidate language at once in a pool of threads for the call, using
+    only the tokens found in each language's IPA dictionary (see text_to_ipa.transcribe_known_tokens()).
+    Each transcription is scored against the profile of its own language, per n-gram 
+    (so languages transcribing more tokens are not penalized), and plus COVERAGE_WEIGHT times 
+    the log of the fraction of tokens found in the language's dictionary.
+
+    Languages without an IPA dictionary, over the lexicon memory budget (with the "refuse" policy; 
+    see text_to_ipa.init_lexicon_manager()), or not transcribed within the timeout (e.g. while 
+    their dictionaries are loading; see text_to_ipa.prefetch_lexicons()) are left out.
+    Dictionaries still loading after the timeout finish loading in the background, 
+    without holding up later calls. Other errors in transcription are raised.
+
+    param: sentence, the string sentence
+    param: langs, (optional) the list of candidate languages (default all LANGUAGES)
+    param: method, profiles, (optional) see compare_language()
+    param: timeout, float seconds to wait for transcriptions
+    return: identified, a dictionary of:
+                "language": the string predicted language (None if no tokens were found in any dictionary)
+                "predictions": a list of tuples in the form ((string language, float score),...), highest first
+                "coverage": a dictionary of string language : fraction of tokens found in its dictionary
+                "transcriptions": a dictionary of string language : IPA transcription
+                "missing": the list of candidate languages left out
+    """
+    deadline = time.monotonic() + timeout
+
+    # A pool for this call only, so threads still running after a timeout never hold up later calls
+    executor = ThreadPoolExecutor(max_workers=len(langs) + 2) # (tokenizing, and each language)
+    futures = {}
+    try:
+        # Tokenize once for each tokenizer family
+        sentence = sentence.lower()
+        tokens = {}
+        for l in langs:
+            family = text_to_ipa.tokenizer_family(l)
+            if family not in tokens:
+                tokens[family] = executor.submit(text_to_ipa.tokenize_sentences, [sentence], l, batched=(family == "nltk"))
+
+        def transcribe(l):
+            return text_to_ipa.transcribe_known_tokens(tokens[text_to_ipa.tokenizer_family(l)].result()[0], l)
+
+        # Transcribe into all languages at once
+        for l in langs:
+            futures[l] = executor.submit(transcribe, l)
+        wait(futures.values(), timeout=max(deadline - time.monotonic(), 0))
+    finally:
+        for future in futures.values():
+            future.cancel() # (if not started yet)
+        executor.shutdown(wait=False)
+
+    identified = {"language": None, "predictions": [], "coverage": {}, "transcriptions": {}, "missing": []}
+    for l, future in futures.items():
+        if future.cancelled() or not future.done(): # timed out
+            identified["missing"].append(NAMED_LANGS[l])
+            continue
+
+        try:
+            phonemes, coverage = future.result()
+        except (FileNotFoundError, MemoryError): # no dictionary, or over the memory budget
+            identified["missing"].append(NAMED_LANGS[l])
+            continue
+
+        identified["coverage"][NAMED_LANGS[l]] = coverage
+        identified["transcriptions"][NAMED_LANGS[l]] = phonemes
+        if not coverage:
+            continue
+
+        # Score per n-gram, weighted by dictionary coverage
+        text_ngrams = compute_ngrams(text_to_ipa.parse_ipa_input(phonemes))
+        num_grams = sum(entry["count"] for grams in text_ngrams.values() for entry in grams.values())
+        score = compare_language(text_ngrams, l, method, profiles) / num_grams + COVERAGE_WEIGHT * math.log(coverage)
+        identified["predictions"].append( (NAMED_LANGS[l], score) )
+
+    identified["predictions"].sort(key=lambda x:x[1], reverse=True)
+    if identified["predictions"]:
+        identified["language"] = identified["predictions"][0][0]
+
+    return identified
+
+
 def best(predictions):
     """
     Returns highest-scoring language from identify_language(ipa).
@@ -178,6 +701,11 @@ if __name__ == "__main__":
     lang_scores = identify_language("j ɐ m h ɔː j ɐ n m ̩ h o u k aː j iː h ʊ k j ɪ ŋ w aː k j iː j iː k ɛː m ̩")
     print("\nScores:" + str(lang_scores), "\n")
 
+    # print(identify_text("What a beautiful morning it is today, my friend.")["predictions"])
+
+    # spans = identify_segments("wʌt ə ˈbjutəfəl ˈmɔrnɪŋ " * 5 + "j ɐ m h ɔː j ɐ n m ̩ h o u k aː j iː h ʊ k j ɪ ŋ " * 5, window=30)
+    # print("\nSpans:", spans, "\n")
+
 
 
 
@@ -0,0 +1,207 @@
+"""
+AriaRay Brown
+June, 2022
+
+[identify_batch]
+Identify the language of many lines of IPA characters (or text in
+a known language) from the command line, streaming JSONL results.
+
+Example:
+    python3 identify_batch.py dump.txt --lang en --workers 8 > results.jsonl
+    cat ipa-lines.txt | python3 identify_batch.py --top 3
+    tail -f ipa-lines.txt | python3 identify_batch.py --watch ./models/ngrams-8bit.bin
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import text_to_ipa
+import train_ngram
+import identify
+from model_registry import ModelRegistry
+
+BATCH_SIZE = 64 # lines sent to a worker at a time
+PENDING_BATCHES = 4 # max batches waiting per worker, bounding memory use
+
+# Options of the current (worker) process, set by _init_worker()
+_options = {}
+
+
+def _init_worker(options):
+    """
+    Set the identification options of a worker process, loading the quantized model if given,
+    or watching a quantized model file and identifying with its latest version.
+    Unhandled tokens of raw text are counted but not listed, so memory use stays constant.
+    """
+    text_to_ipa.UNHANDLED_LIST_LIMIT = 0
+
+    _options.clear()
+    _options.update(options)
+    _options["profiles"] = None
+
+    if options.get("quantized"):
+        _options["profiles"] = train_ngram.load_quantized(options["quantized"])
+
+    if options.get("watch"):
+        registry = ModelRegistry()
+        registry.watch("watched", options["watch"])
+        if not registry.versions("watched"):
+            raise ValueError("Could not load the watched model file " + options["watch"] + ": " 
+                             + registry.errors.get("watched", "not found"))
+        registry.serve("watched") # identify with the active version (method None)
+        _options["registry"] = registry
+
+
+def _close_worker():
+    """
+    Stop watching the model file of this process, if any, restoring identify's default model.
+    """
+    registry = _options.pop("registry", None)
+    if registry is not None:
+        registry.stop()
+        registry.unserve()
+
+
+def read_batches(files, id_column=False, batch_size=BATCH_SIZE):
+    """
+    Read lines from files (or stdin, for "-") in batches, without reading whole files.
+    Blank lines are skipped, and so are lines without an id (reported on stderr).
+
+    param: files, the list of string file paths
+    param: id_column, default False. If True, each line starts with an id and a tab
+                      (else the id is the file name and line number)
+    param: batch_size, int number of lines in each batch
+    return: a generator of lists of (string id, string line) pairs
+    """
+    batch = []
+
+    for file in files:
+        f = sys.stdin if file == "-" else open(file, "r", encoding="utf-8")
+        try:
+            for i, line in enumerate(f, start=1):
+                line = line.rstrip("\n")
+                if not line or line.isspace():
+                    continue
+
+                if id_column:
+                    if "\t" not in line:
+                        print("Skipping line without an id:", file + ":" + str(i), file=sys.stderr)
+                        continue
+                    line_id, line = line.split("\t", 1)
+                else:
+                    line_id = file + ":" + str(i)
+
+                batch.append((line_id, line))
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+    if batch:
+        yield batch
+
+
+def identify_batch(batch):
+    """
+    Identify the language of each line in a batch, with the options of this process.
+    Returns a list of JSON strings, one result for each line.
+    """
+    lang = _options.get("lang")
+    results = []
+
+    for line_id, line in batch:
+        start = time.perf_counter()
+
+        ipa = text_to_ipa.translate(line, lang) if lang else line
+        predictions = identify.identify_language(ipa, _options.get("method"),
+                                                 _options.get("profiles"), _options.get("shortlist"))
+
+        ms = 1000 * (time.perf_counter() - start)
+
+        top = predictions[:_options.get("top", 3)]
+        results.append(json.dumps({"id": line_id,
+                                   "languages": [l for l, score in top],
+                                   "scores": [score for l, score in top],
+                                   "ms": round(ms, 3)}, ensure_ascii=False))
+
+    return results
+
+
+def identify_stream(batches, options, workers=1):
+    """
+    Identify the language of batches of lines, in order, using a pool of worker processes.
+    At most PENDING_BATCHES batches per worker are read ahead, so memory use stays constant.
+
+    param: batches, an iterable of batches from read_batches()
+    param: options, a dictionary of identification options (see main())
+    param: workers, int number of worker processes (1: identify in this process)
+    return: a generator of lists of JSON result strings, one list for each batch
+    """
+    if workers <= 1:
+        _init_worker(options)
+        try:
+            for batch in batches:
+                yield identify_batch(batch)
+        finally:
+            _close_worker()
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(options,)) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append(executor.submit(identify_batch, batch))
+
+            # Yield finished batches in input order once enough are waiting
+            if len(pending) >= workers * PENDING_BATCHES:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def main(args=None):
+    """
+    Run the command line batch identifier.
+    """
+    parser = argparse.ArgumentParser(description="Identify the language of each line of input, "
+                                                 "writing one JSON result per line to stdout.")
+    parser.add_argument("files", nargs="*", default=["-"],
+                        help="input files, one utterance per line (default: stdin)")
+    parser.add_argument("--lang", default=None,
+                        help="language of raw text input, translated to IPA first "
+                             "(default: input is already IPA)")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--top", type=int, default=3, help="number of top languages to output")
+    parser.add_argument("--method", default="freq", choices=["freq", "packed"],
+                        help="scoring method (see identify.compare_language())")
+    parser.add_argument("--quantized", default=None, help="path to a quantized model file to score with")
+    parser.add_argument("--watch", default=None,
+                        help="path to a quantized model file to score with, reloaded when it changes")
+    parser.add_argument("--shortlist", type=int, default=None,
+                        help="number of languages to shortlist before full scoring")
+    parser.add_argument("--id-column", action="store_true",
+                        help="each line starts with an id and a tab")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="lines sent to a worker at a time")
+    args = parser.parse_args(args)
+
+    if args.quantized and args.watch:
+        parser.error("--quantized and --watch cannot be used together")
+
+    method = None if args.watch else "quantized" if args.quantized else args.method
+    options = {"lang": args.lang, "top": args.top, "shortlist": args.shortlist,
+               "method": method, "quantized": args.quantized, "watch": args.watch}
+
+    batches = read_batches(args.files, args.id_column, args.batch_size)
+    for results in identify_stream(batches, options, args.workers):
+        sys.stdout.write("\n".join(results) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,581 @@
+"""
+AriaRay Brown
+June, 2022
+
+[lexicon]
+Compact, read-only IPA dictionaries (lexicons) that can stand in for
+the dictionary objects built in text_to_ipa.init_ipa_dictionary().
+
+Headwords are sorted and front-coded in blocks (each headword only stores
+what differs from the one before it), and identical IPA transcriptions
+are stored once.
+
+A lexicon can also hold an EditIndex, to find the nearest headword to a
+misspelled word, which is saved with it. An EditIndex of another list of
+words can be saved on its own.
+"""
+
+import bisect
+import json
+import sys
+import zlib
+from array import array
+from collections.abc import ItemsView, Mapping
+
+BLOCK_SIZE = 16 # headwords per front-coded block
+LEXICON_MAGIC = b"IPALEX1\n"
+EDIT_INDEX_MAGIC = b"IPAEDIT1\n"
+
+EDIT_DISTANCE = 2 # max edits (insertions, deletions, substitutions, transpositions) to a nearest headword
+EDIT_MAX_DISTANCE = 3 # largest max_distance of an EditIndex (deletions are stored in 2 bits)
+EDIT_MAX_WORDS = 1 << 30 # max words in an EditIndex (word IDs are stored in 30 bits)
+EDIT_PREFIX_LENGTH = 7 # characters of each word indexed by EditIndex
+
+
+def _write_varint(out, value):
+    """
+    Append an int to a bytearray, 7 bits per byte.
+    """
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, position):
+    """
+    Read an int written by _write_varint(). Returns (value, next position).
+    """
+    value, shift = 0, 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def edit_distance(a, b, max_distance=EDIT_DISTANCE):
+    """
+    Returns the Damerau-Levenshtein (optimal string alignment) distance between
+    two strings, or max_distance + 1 if it is greater than max_distance.
+    Only the band of the table within max_distance of the diagonal is computed.
+    """
+    too_far = max_distance + 1
+    if abs(len(a) - len(b)) > max_distance:
+        return too_far
+    if a == b:
+        return 0
+
+    # Common prefixes and suffixes do not change the distance
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1-end] == b[-1-end]:
+        end += 1
+    a, b = a[start:len(a)-end], b[start:len(b)-end]
+    if len(a) > len(b):
+        a, b = b, a
+    if not a:
+        return len(b) if len(b) <= max_distance else too_far
+
+    previous2 = None
+    previous = [j if j <= max_distance else too_far for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [too_far] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        row_min = current[0]
+        char = a[i-1]
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            distance = previous[j-1] + (char != b[j-1])
+            if previous[j] + 1 < distance:
+                distance = previous[j] + 1
+            if current[j-1] + 1 < distance:
+                distance = current[j-1] + 1
+            if i > 1 and j > 1 and char == b[j-2] and a[i-2] == b[j-1] and previous2[j-2] + 1 < distance:
+                distance = previous2[j-2] + 1
+            current[j] = distance
+            if distance < row_min:
+                row_min = distance
+        if row_min > max_distance:
+            return too_far
+        previous2, previous = previous, current
+
+    return min(previous[-1], too_far)
+
+
+def _deletes(word, max_distance):
+    """
+    Returns a dictionary of each string made by deleting up to max_distance characters
+    from a word (including the word) : the fewest characters deleted to make it.
+    """
+    deletes = {word: 0}
+    edge = {word}
+    for distance in range(1, max_distance + 1):
+        edge = {w[:i] + w[i+1:] for w in edge if len(w) > 1 for i in range(len(w))}
+        for delete in edge:
+            deletes.setdefault(delete, distance)
+    return deletes
+
+
+def _hash(string):
+    """
+    Returns a 32-bit hash of a string, the same in every process.
+    """
+    return zlib.crc32(string.encode("utf-8"))
+
+
+class EditIndex:
+    """
+    A symmetric delete (SymSpell) index of a list of words, to find the words
+    within a small edit distance of a query word without comparing it to all of them.
+
+    Each word is indexed by the strings made by deleting up to max_distance characters
+    from its first prefix_length characters. Words within max_distance of a query share
+    at least one such string with it, made by at most as many deletions from either,
+    so the deletions give a lower bound on the distance of each candidate word.
+    Candidates are checked with edit_distance() from the lowest bound up, until the
+    bound is greater than the distance of the nearest word found.
+
+    Strings are stored as 32-bit hashes, combined with the number of deletions and
+    word IDs (positions in the list) in a single sorted array.
+    """
+
+    def __init__(self, words=(), max_distance=EDIT_DISTANCE, prefix_length=EDIT_PREFIX_LENGTH):
+        """
+        param: words, an iterable of string words, whose positions are their IDs
+        param: max_distance, int max edit distance of queries
+        param: prefix_length, int characters of each word to index
+        """
+        if not 0 <= max_distance <= EDIT_MAX_DISTANCE:
+            raise ValueError("max_distance must be between 0 and " + str(EDIT_MAX_DISTANCE) + ", not " + str(max_distance))
+
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+
+        entries = []
+        lengths = array("B")
+        for word_id, word in enumerate(words):
+            if word_id >= EDIT_MAX_WORDS:
+                raise ValueError("An edit index holds at most " + str(EDIT_MAX_WORDS) + " words")
+            for delete, deleted in _deletes(word[:prefix_length], max_distance).items():
+                entries.append(_hash(delete) << 32 | deleted << 30 | word_id)
+            lengths.append(min(len(word), 255))
+        entries.sort()
+        self._entries = array("Q", entries) # hash << 32 | deletions << 30 | word ID, sorted
+        self._lengths = lengths # length of each word (255 if longer)
+
+    def candidates(self, word, max_distance=None):
+        """
+        Returns a dictionary of the IDs of words that may be within max_distance
+        of a word : a lower bound on their distance.
+        """
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+
+        entries, lengths = self._entries, self._lengths
+        length = min(len(word), 255)
+
+        found = {}
+        for delete, deleted in _deletes(word[:self.prefix_length], max_distance).items():
+            key = _hash(delete)
+            i = bisect.bisect_left(entries, key << 32)
+            while i < len(entries) and entries[i] >> 32 == key:
+                word_id = entries[i] & 0x3fffffff
+                bound = max(deleted, (entries[i] >> 30) & 3, abs(lengths[word_id] - length))
+                if bound <= max_distance and bound < found.get(word_id, bound + 1):
+                    found[word_id] = bound
+                i += 1
+        return found
+
+    def nearest(self, word, words_at, max_distance=None):
+        """
+        Returns the nearest indexed word to a word, as (word ID, indexed word, distance),
+        or None if none is within max_distance. Ties go to the lowest word ID.
+
+        param: word, the string word to look up
+        param: words_at, a function taking a sorted list of word IDs,
+                         and returning (or yielding) their (word ID, indexed word) pairs
+        param: max_distance, (optional) int max edit distance, at most the index's max_distance
+        """
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+
+        candidates = self.candidates(word, max_distance)
+        by_bound = [[] for bound in range(max_distance + 1)]
+        for word_id, bound in candidates.items():
+            by_bound[bound].append(word_id)
+
+        best = None
+        limit = max_distance
+        for bound, word_ids in enumerate(by_bound):
+            if bound > limit:
+                break
+            for word_id, candidate in words_at(sorted(word_ids)):
+                distance = edit_distance(word, candidate, limit)
+                if distance <= limit and (best is None or (distance, word_id) < (best[2], best[0])):
+                    best = (word_id, candidate, distance)
+                    limit = distance # only as close words can replace the best (if lower IDs)
+
+        return best
+
+    def nbytes(self):
+        """
+        Returns the approximate memory size of the index in bytes.
+        """
+        return sys.getsizeof(self) + sys.getsizeof(self._entries) + sys.getsizeof(self._lengths)
+
+    def __len__(self):
+        """
+        Returns the number of indexed words.
+        """
+        return len(self._lengths)
+
+    def _header(self):
+        """
+        Returns the settings saved with the index (see save(), CompactLexicon.save()).
+        """
+        return {"max_distance": self.max_distance, "prefix_length": self.prefix_length}
+
+    def _load_parts(self, entries, lengths, byteorder):
+        """
+        Fill the index from the bytes of its arrays, saved in the given byteorder.
+        """
+        self._entries.frombytes(entries)
+        self._lengths.frombytes(lengths)
+        if byteorder != sys.byteorder:
+            self._entries.byteswap()
+
+    def save(self, path):
+        """
+        Save the index to a binary file (see load()), for an index of a list of
+        words that is not saved with a CompactLexicon.
+        """
+        parts = [self._entries.tobytes(), self._lengths.tobytes()]
+        header = self._header()
+        header["byteorder"] = sys.byteorder
+        header["sizes"] = [len(part) for part in parts]
+
+        with open(path, "wb") as f:
+            f.write(EDIT_INDEX_MAGIC)
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            for part in parts:
+                f.write(part)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load an index saved with save().
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+
+        if not data.startswith(EDIT_INDEX_MAGIC):
+            raise ValueError("Not an edit index file: " + path)
+
+        start = len(EDIT_INDEX_MAGIC)
+        end = data.index(b"\n", start)
+        header = json.loads(data[start:end].decode("utf-8"))
+        entries_size, lengths_size = header["sizes"]
+
+        index = cls((), header["max_distance"], header["prefix_length"])
+        index._load_parts(data[end+1:end+1+entries_size], data[end+1+entries_size:end+1+entries_size+lengths_size],
+                          header["byteorder"])
+        return index
+
+
+class _LexiconItems(ItemsView):
+    """
+    Items view of a CompactLexicon that decodes headwords in one pass, instead of looking up each one.
+    """
+
+    def __iter__(self):
+        return self._mapping.items_from()
+
+
+class CompactLexicon(Mapping):
+    """
+    A read-only dictionary of string headword : string IPA transcription,
+    stored in a few flat byte strings and arrays instead of Python objects.
+
+    Supports exact lookup (like a dict), prefix_search() and longest_prefix().
+    Headwords are iterated in sorted order.
+    """
+
+    def __init__(self, ipa_dict=None):
+        """
+        param: ipa_dict, (optional) the dictionary of headword : IPA to compress
+        """
+        self._keys = b""                     # front-coded headwords (utf-8)
+        self._block_offsets = array("L")     # start of each block in _keys
+        self._value_ids = array("L")         # IPA value ID of each headword
+        self._values = b""                   # all distinct IPA values (utf-8)
+        self._value_offsets = array("L")     # start of each value in _values (and end)
+        self._heads = []                     # first headword of each block, for bisect
+        self._length = 0
+        self.edit_index = None               # (optional) EditIndex of headwords, by index
+
+        if ipa_dict:
+            self._build(ipa_dict)
+
+    def _build(self, ipa_dict):
+        """
+        Compress a dictionary of headword : IPA.
+        """
+        items = sorted((key.encode("utf-8"), value) for key, value in ipa_dict.items())
+
+        # Intern IPA values
+        value_ids = {}
+        values = bytearray()
+        value_offsets = array("L", [0])
+        for key, value in items:
+            if value not in value_ids:
+                value_ids[value] = len(value_ids)
+                values += value.encode("utf-8")
+                value_offsets.append(len(values))
+
+        # Front-code headwords in blocks
+        keys = bytearray()
+        block_offsets = array("L")
+        previous = b""
+        for i, (key, value) in enumerate(items):
+            if i % BLOCK_SIZE == 0:
+                block_offsets.append(len(keys))
+                shared = 0 # first headword of a block is stored in full
+            else:
+                shared = 0
+                limit = min(len(key), len(previous))
+                while shared < limit and key[shared] == previous[shared]:
+                    shared += 1
+
+            _write_varint(keys, shared)
+            _write_varint(keys, len(key) - shared)
+            keys += key[shared:]
+            previous = key
+
+        self._keys = bytes(keys)
+        self._block_offsets = block_offsets
+        self._value_ids = array("L", (value_ids[value] for key, value in items))
+        self._values = bytes(values)
+        self._value_offsets = value_offsets
+        self._length = len(items)
+        self._heads = [self._block_head(block) for block in range(len(block_offsets))]
+
+    def _block_head(self, block):
+        """
+        Returns the first headword (bytes) of a block.
+        """
+        position = self._block_offsets[block]
+        shared, position = _read_varint(self._keys, position)
+        size, position = _read_varint(self._keys, position)
+        return self._keys[position:position+size]
+
+    def _iter_block(self, block):
+        """
+        Yields (headword bytes, index) for each headword in a block.
+        """
+        keys = self._keys
+        position = self._block_offsets[block]
+        index = block * BLOCK_SIZE
+        end = min(index + BLOCK_SIZE, self._length)
+        key = b""
+
+        while index < end:
+            shared, position = _read_varint(keys, position)
+            size, position = _read_varint(keys, position)
+            key = key[:shared] + keys[position:position+size]
+            position += size
+            yield key, index
+            index += 1
+
+    def _find_block(self, key):
+        """
+        Returns the block that would contain a headword (bytes).
+        """
+        return max(bisect.bisect_right(self._heads, key) - 1, 0)
+
+    def _keys_at(self, indexes):
+        """
+        Yields (index, headword) pairs for a sorted list of indexes, decoding each block once.
+        """
+        block, keys = None, None
+        for index in indexes:
+            if index // BLOCK_SIZE != block:
+                block = index // BLOCK_SIZE
+                keys = [key for key, i in self._iter_block(block)]
+            yield index, keys[index % BLOCK_SIZE].decode("utf-8")
+
+    def _value(self, index):
+        """
+        Returns the IPA value of the headword at an index.
+        """
+        value_id = self._value_ids[index]
+        start, end = self._value_offsets[value_id], self._value_offsets[value_id+1]
+        return self._values[start:end].decode("utf-8")
+
+    def _index(self, key):
+        """
+        Returns the index of a headword (string), or None if not in the lexicon.
+        """
+        if not self._length or not isinstance(key, str):
+            return None
+
+        key = key.encode("utf-8")
+        for candidate, index in self._iter_block(self._find_block(key)):
+            if candidate == key:
+                return index
+            if candidate > key:
+                break
+        return None
+
+    def __getitem__(self, key):
+        index = self._index(key)
+        if index is None:
+            raise KeyError(key)
+        return self._value(index)
+
+    def __contains__(self, key):
+        return self._index(key) is not None
+
+    def get(self, key, default=None):
+        index = self._index(key)
+        return default if index is None else self._value(index)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        for block in range(len(self._block_offsets)):
+            for key, index in self._iter_block(block):
+                yield key.decode("utf-8")
+
+    def items(self):
+        return _LexiconItems(self)
+
+    def items_from(self, key=""):
+        """
+        Yields (headword, IPA) pairs in sorted order, starting at the first headword >= key.
+        """
+        key = key.encode("utf-8")
+        for block in range(self._find_block(key) if self._length else 0, len(self._block_offsets)):
+            for candidate, index in self._iter_block(block):
+                if candidate >= key:
+                    yield candidate.decode("utf-8"), self._value(index)
+
+    def prefix_search(self, prefix):
+        """
+        Yields (headword, IPA) pairs for all headwords starting with a prefix, in sorted order.
+        """
+        for key, value in self.items_from(prefix):
+            if not key.startswith(prefix):
+                break
+            yield key, value
+
+    def longest_prefix(self, text):
+        """
+        Returns the (headword, IPA) pair for the longest headword that is
+        a prefix of the given text, or None if no headword is.
+        """
+        for i in range(len(text), 0, -1):
+            index = self._index(text[:i])
+            if index is not None:
+                return text[:i], self._value(index)
+        return None
+
+    def build_edit_index(self, max_distance=EDIT_DISTANCE, prefix_length=EDIT_PREFIX_LENGTH):
+        """
+        Build the EditIndex of the headwords, used by nearest() and saved with the lexicon.
+        """
+        self.edit_index = EditIndex(self, max_distance, prefix_length)
+        return self.edit_index
+
+    def nearest(self, word, max_distance=None):
+        """
+        Returns the (headword, IPA, distance) triple for the headword nearest to a word
+        in edit distance (see EditIndex.nearest()), or None if none is within max_distance.
+        The edit index must have been built (see build_edit_index()).
+        """
+        if self.edit_index is None:
+            raise ValueError("The lexicon has no edit index (see build_edit_index())")
+
+        found = self.edit_index.nearest(word, self._keys_at, max_distance)
+        if found is None:
+            return None
+        index, key, distance = found
+        return key, self._value(index), distance
+
+    def nbytes(self):
+        """
+        Returns the approximate memory size of the lexicon in bytes.
+        """
+        size = sys.getsizeof(self) + sys.getsizeof(self._heads)
+        size += sum(sys.getsizeof(head) for head in self._heads)
+        for part in (self._keys, self._block_offsets, self._value_ids, self._values, self._value_offsets):
+            size += sys.getsizeof(part)
+        if self.edit_index is not None:
+            size += self.edit_index.nbytes()
+        return size
+
+    def save(self, path):
+        """
+        Save the lexicon, and its edit index if built, to a binary file (see load()).
+        """
+        parts = [self._keys, self._block_offsets.tobytes(), self._value_ids.tobytes(),
+                 self._values, self._value_offsets.tobytes()]
+        header = {"length": self._length, "itemsize": self._block_offsets.itemsize,
+                  "byteorder": sys.byteorder}
+        if self.edit_index is not None:
+            parts.append(self.edit_index._entries.tobytes())
+            parts.append(self.edit_index._lengths.tobytes())
+            header["edit_index"] = self.edit_index._header()
+        header["sizes"] = [len(part) for part in parts]
+
+        with open(path, "wb") as f:
+            f.write(LEXICON_MAGIC)
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            for part in parts:
+                f.write(part)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a lexicon saved with save().
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+
+        if not data.startswith(LEXICON_MAGIC):
+            raise ValueError("Not a compact lexicon file: " + path)
+
+        start = len(LEXICON_MAGIC)
+        end = data.index(b"\n", start)
+        header = json.loads(data[start:end].decode("utf-8"))
+        position = end + 1
+
+        parts = []
+        for size in header["sizes"]:
+            parts.append(data[position:position+size])
+            position += size
+
+        lexicon = cls()
+        lexicon._length = header["length"]
+        lexicon._keys, lexicon._values = parts[0], parts[3]
+        for name, part in (("_block_offsets", parts[1]), ("_value_ids", parts[2]), ("_value_offsets", parts[4])):
+            numbers = array("L")
+            if numbers.itemsize != header["itemsize"]:
+                raise ValueError("Lexicon file was saved on an incompatible platform: " + path)
+            numbers.frombytes(part)
+            if header["byteorder"] != sys.byteorder:
+                numbers.byteswap()
+            setattr(lexicon, name, numbers)
+        lexicon._heads = [lexicon._block_head(block) for block in range(len(lexicon._block_offsets))]
+
+        if "edit_index" in header:
+            edit_index = EditIndex((), **header["edit_index"])
+            edit_index._load_parts(parts[5], parts[6], header["byteorder"])
+            lexicon.edit_index = edit_index
+
+        return lexicon
@@ -0,0 +1,221 @@
+"""
+AriaRay Brown
+June, 2022
+
+[memory_report]
+Report the memory used by IPA dictionaries (lexicons), n-gram profiles
+and unknown-token logs for each language, and keep them within a budget.
+
+Example:
+    python3 memory_report.py
+    python3 memory_report.py --load en es --budget 200 --trim
+"""
+
+import argparse
+import json
+import sys
+
+from utilities import LANGUAGES, IPA_PATH
+import text_to_ipa
+import train_ngram
+import identify
+from lexicon import CompactLexicon, EditIndex
+
+MIB = 1 << 20
+
+
+def deep_sizeof(obj, seen=None):
+    """
+    Returns the approximate memory size in bytes of an object and everything
+    it contains (dictionaries, lists, tuples, sets, arrays and lexicons).
+    Objects already in seen are not counted again.
+
+    param: obj, any object
+    param: seen, (optional) a set of ids of objects already counted, updated
+    """
+    if seen is None:
+        seen = set()
+
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+
+        if isinstance(obj, (CompactLexicon, EditIndex)):
+            size += obj.nbytes()
+            continue
+
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+
+    return size
+
+
+def memory_report(langs=LANGUAGES):
+    """
+    Report the memory used for each language by its structures:
+    "lexicon" (IPA dictionary, 0 if not loaded, with its edit index if built), each n-gram order of its
+    profile (e.g. "bigrams"), "packed" (64-bit keyed profile) and "oov_log"
+    (unknown tokens logged by text_to_ipa). Shared structures are reported under "shared".
+
+    Structures are sized separately, so the same object (e.g. a phoneme string) may be
+    counted in several structures; "total" counts each object once.
+
+    param: langs, (optional) the list of languages to report (default all LANGUAGES)
+    return: report, a dictionary of the form
+                    {"languages": {"en": {"lexicon": bytes, "bigrams": bytes, ..., "total": bytes}, ...},
+                     "shared": {"translation_cache": bytes, ...}, "total": bytes}
+    """
+    report = {"languages": {}, "shared": {}}
+    seen_all = set()
+    total = 0
+
+    for l in langs:
+        structures = {"lexicon": (text_to_ipa.languages[l]["ipa_dict"], text_to_ipa.languages[l]["edit_index"])}
+        for n, table in identify.LANGUAGE_NGRAMS.get(l, {}).items():
+            structures[n] = table
+        structures["packed"] = identify.PACKED_NGRAMS.get(l, {})
+        structures["oov_log"] = text_to_ipa.unhandled_tokens_list[l]
+
+        sizes = {name: deep_sizeof(structure) for name, structure in structures.items()}
+        sizes["total"] = sum(deep_sizeof(structure, seen_all) for structure in structures.values())
+        total += sizes["total"]
+        report["languages"][l] = sizes
+
+    shared = {"translation_cache": text_to_ipa.translation_cache,
+              "phoneme_ids": identify.PHONEME_IDS}
+    with text_to_ipa.translation_cache_lock:
+        for name, structure in shared.items():
+            report["shared"][name] = deep_sizeof(structure)
+            total += deep_sizeof(structure, seen_all)
+
+    report["total"] = total
+    return report
+
+
+def trim_profiles(k, langs=LANGUAGES):
+    """
+    Trim the n-gram profiles of languages to their top k n-grams,
+    and rebuild their packed profiles to match, if built (see train_ngram.trim_ngrams()).
+    Returns the number of n-grams removed.
+    """
+    language_ngrams = {l: identify.LANGUAGE_NGRAMS[l] for l in langs if l in identify.LANGUAGE_NGRAMS}
+    removed = train_ngram.trim_ngrams(language_ngrams, k)
+
+    if identify.PACKED_NGRAMS:
+        identify.PACKED_NGRAMS.update(train_ngram.pack_profiles(language_ngrams, identify.PHONEME_IDS))
+
+    return removed
+
+
+def enforce_budget(budget, lexicon_budget=None, policy="evict", trim=True, min_k=100):
+    """
+    Keep the memory used by lexicons and n-gram profiles within a budget.
+
+    Lexicons are limited by the lexicon manager (see text_to_ipa.init_lexicon_manager()),
+    by default to what the rest of the budget leaves. Loaded lexicons over that limit
+    are evicted now, and later loads evict others ("evict") or are refused ("refuse").
+    If still over budget, n-gram profiles are trimmed to their top k n-grams,
+    halving k until within budget (but not below min_k).
+
+    param: budget, int max bytes in total
+    param: lexicon_budget, (optional) int max bytes of lexicons
+    param: policy, "evict" or "refuse" (see text_to_ipa.init_lexicon_manager())
+    param: trim, default True, trim n-gram profiles if over budget
+    param: min_k, int smallest number of n-grams to trim profiles to
+    return: report, the memory_report() after enforcing the budget, with
+                    "budget", "within_budget" and "k" (if profiles were trimmed)
+    """
+    report = memory_report()
+    if lexicon_budget is None:
+        lexicons = sum(sizes["lexicon"] for sizes in report["languages"].values())
+        lexicon_budget = max(budget - (report["total"] - lexicons), 0)
+
+    text_to_ipa.init_lexicon_manager(lexicon_budget, text_to_ipa.LEXICON_COMPACT, policy, reset_stats=False)
+    report = memory_report()
+
+    k = None
+    if trim and report["total"] > budget:
+        k = max(len(table) for l in identify.LANGUAGE_NGRAMS for table in identify.LANGUAGE_NGRAMS[l].values())
+        while report["total"] > budget and k > min_k:
+            k = max(k // 2, min_k)
+            trim_profiles(k)
+            report = memory_report()
+
+    report["budget"] = budget
+    report["within_budget"] = report["total"] <= budget
+    if k is not None:
+        report["k"] = k
+
+    return report
+
+
+def print_report(report):
+    """
+    Print a memory report as a table in MiB.
+    """
+    names = []
+    for sizes in report["languages"].values():
+        names.extend(name for name in sizes if name not in names)
+
+    print("lang\t" + "\t".join(names))
+    for l, sizes in report["languages"].items():
+        print(l + "\t" + "\t".join("%.2f" % (sizes.get(name, 0) / MIB) for name in names))
+
+    for name, size in report["shared"].items():
+        print(name + ":", "%.2f" % (size / MIB), "MiB")
+    print("Total:", "%.2f" % (report["total"] / MIB), "MiB")
+
+    if "budget" in report:
+        print("Budget:", "%.2f" % (report["budget"] / MIB), "MiB",
+              "(within budget)" if report["within_budget"] else "(over budget)")
+    if "k" in report:
+        print("N-gram profiles trimmed to top", report["k"])
+
+
+def main(args=None):
+    """
+    Run the command line memory report.
+    """
+    parser = argparse.ArgumentParser(description="Report the memory used by lexicons, n-gram profiles "
+                                                 "and unknown-token logs for each language.")
+    parser.add_argument("--load", nargs="*", default=[], metavar="LANG",
+                        help="languages whose IPA dictionaries to load first ('all' for all)")
+    parser.add_argument("--compact", action="store_true", help="load IPA dictionaries as compact lexicons")
+    parser.add_argument("--budget", type=float, default=None, help="memory budget in MiB to enforce")
+    parser.add_argument("--lexicon-budget", type=float, default=None, help="memory budget in MiB for lexicons")
+    parser.add_argument("--policy", default="evict", choices=["evict", "refuse"],
+                        help="when loading a lexicon goes over budget (see text_to_ipa.init_lexicon_manager())")
+    parser.add_argument("--trim", action="store_true", help="trim n-gram profiles to fit the budget")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(args)
+
+    text_to_ipa.init_lexicon_manager(compact=args.compact)
+    langs = LANGUAGES if args.load == ["all"] else args.load
+    for l in langs:
+        try:
+            text_to_ipa.get_ipa_dictionary(l)
+        except FileNotFoundError:
+            print("No IPA dictionary for", l + ":", IPA_PATH + text_to_ipa.languages[l]["ipa_csv"], file=sys.stderr)
+
+    if args.budget is not None:
+        lexicon_budget = None if args.lexicon_budget is None else int(args.lexicon_budget * MIB)
+        report = enforce_budget(int(args.budget * MIB), lexicon_budget, args.policy, args.trim)
+    else:
+        report = memory_report()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
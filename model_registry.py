@@ -0,0 +1,304 @@
+"""
+AriaRay Brown
+June, 2022
+
+[model_registry]
+Hold named, versioned language identification models in a long-running
+process, and swap in new versions when their model files change on disk.
+
+Example:
+    registry = ModelRegistry()
+    registry.register("default", identify.LANGUAGE_NGRAMS, "freq")
+    registry.watch("quantized", "./models/ngrams-8bit.bin")
+    registry.identify_language("wʌt ə ˈbjutəfəl ˈmɔrnɪŋ", "quantized")
+    registry.rollback("quantized")
+
+    # Make identify.identify_language() use the active version of a model
+    registry.serve("quantized")
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+
+import train_ngram
+import identify
+
+POLL_INTERVAL = 5.0 # seconds between checks of watched model files
+KEEP_VERSIONS = 2 # versions kept for each model: the active one, and one to roll back to
+
+# A version of a model. profiles and method are passed to identify.identify_language().
+Model = namedtuple("Model", ["name", "version", "method", "profiles", "source", "loaded"])
+
+
+class ModelRegistry:
+    """
+    A registry of named models, each with its active version and older versions
+    kept for rollback and A/B scoring.
+
+    Swapping the active version replaces a single reference, so calls identifying
+    with the old version finish with it, and are never blocked by a swap.
+    """
+
+    def __init__(self, keep=KEEP_VERSIONS):
+        """
+        param: keep, int number of versions kept for each model (at least 2)
+        """
+        self.keep = max(keep, 2)
+        self._versions = {} # name : list of Model, newest first
+        self._active = {} # name : active Model
+        self._watched = {} # name : {"path", "method", "loader", "interval", "due", "stat", "digest"}
+        self._lock = threading.Lock() # held by writers only
+        self._watch_lock = threading.Lock() # held while changing or checking watched files
+        self._watch_changed = threading.Condition(self._watch_lock) # wakes the polling thread
+        self._served = None # name of the model served as identify's default model
+        self._thread = None
+        self._stop = threading.Event()
+        self.errors = {} # name : last error loading a watched model file
+
+    def register(self, name, profiles, method="freq", version=None, source=None, activate=True):
+        """
+        Add a new version of a model.
+
+        param: name, the string model name
+        param: profiles, the dictionary of language profiles (see identify.compare_language())
+        param: method, the string scoring method for the profiles (default "freq")
+        param: version, (optional) the version; default: one more than the latest version
+        param: source, (optional) where the model came from, e.g. a file path
+        param: activate, default True, make the new version active
+        return: model, the new Model
+        """
+        with self._lock:
+            versions = self._versions.get(name, [])
+            if version is None:
+                version = versions[0].version + 1 if versions else 1
+
+            model = Model(name, version, method, profiles, source, time.time())
+            versions = [model] + [m for m in versions if m.version != version]
+
+            # Keep the active version even if it is older than those kept
+            active = self._active.get(name)
+            kept = versions[:self.keep]
+            if active is not None and not activate and active not in kept:
+                kept = kept[:-1] + [active]
+
+            self._versions[name] = kept
+            if activate or active is None:
+                self._set_active(name, model)
+
+        return model
+
+    def _set_active(self, name, model):
+        """
+        Make a Model the active version of a name, and identify's default model
+        if the name is served (see serve()). Call with _lock held.
+        """
+        self._active[name] = model
+        if name == self._served:
+            identify.set_default_model(model.method, model.profiles)
+
+    def serve(self, name):
+        """
+        Make identify.identify_language() use the active version of a model
+        when no method or profiles are given, following later activations, 
+        reloads and rollbacks of the model.
+        """
+        with self._lock:
+            self._served = name
+            self._set_active(name, self._active[name])
+
+    def unserve(self):
+        """
+        Stop serving a model, restoring identify's default model.
+        """
+        with self._lock:
+            self._served = None
+            identify.set_default_model()
+
+    def active(self, name):
+        """
+        Returns the active Model of a name.
+        """
+        return self._active[name]
+
+    def get(self, name, version=None):
+        """
+        Returns a version of a model (default: the active version).
+        """
+        if version is None:
+            return self._active[name]
+
+        for model in self._versions[name]:
+            if model.version == version:
+                return model
+        raise KeyError((name, version))
+
+    def versions(self, name):
+        """
+        Returns the list of kept versions of a model, newest first.
+        """
+        return [model.version for model in self._versions.get(name, [])]
+
+    def activate(self, name, version):
+        """
+        Make a kept version of a model active.
+        """
+        with self._lock:
+            self._set_active(name, self.get(name, version))
+
+        return self._active[name]
+
+    def rollback(self, name):
+        """
+        Make the newest kept version older than the active version active.
+        Returns the new active Model, or None if there is no older version.
+        """
+        with self._lock:
+            versions = self._versions[name]
+            older = versions[versions.index(self._active[name])+1:]
+            if not older:
+                return None
+            self._set_active(name, older[0])
+
+        return older[0]
+
+    def identify_language(self, ipa, name, version=None, shortlist=None):
+        """
+        Identify the language of a string of IPA characters with a model
+        (see identify.identify_language()).
+
+        param: ipa, the string utterance in unicode IPA characters
+        param: name, the string model name
+        param: version, (optional) the model version (default: the active version)
+        param: shortlist, (optional) see identify.identify_language()
+        return: predictions, a list of tuples in the form ((string language, float score),...)
+        """
+        model = self.get(name, version)
+        return identify.identify_language(ipa, model.method, model.profiles, shortlist)
+
+    def compare_versions(self, ipa, name, versions=None, shortlist=None):
+        """
+        A/B score a string of IPA characters with several versions of a model.
+
+        param: ipa, the string utterance in unicode IPA characters
+        param: name, the string model name
+        param: versions, (optional) the list of versions to compare (default: all kept versions)
+        param: shortlist, (optional) see identify.identify_language()
+        return: predictions, a dictionary of version : predictions
+        """
+        if versions is None:
+            versions = self.versions(name)
+
+        return {version: self.identify_language(ipa, name, version, shortlist) for version in versions}
+
+    def watch(self, name, path, method="quantized", loader=train_ngram.parse_quantized, interval=POLL_INTERVAL):
+        """
+        Watch a model file, registering and activating a new version of the
+        model whenever the file changes. The file is loaded now if it exists,
+        then checked every interval seconds in a background thread (each 
+        watched file at its own interval).
+
+        Model files should be replaced by renaming a complete file over them
+        (as train_ngram.save_quantized() does). A file that fails to load is
+        recorded in errors and retried when it changes again; the active
+        version is kept meanwhile.
+
+        param: name, the string model name
+        param: path, the string path to the model file
+        param: method, the string scoring method of the loaded profiles (default "quantized")
+        param: loader, the function loading profiles from the bytes of the file,
+                       which are read once for each change (default train_ngram.parse_quantized)
+        param: interval, float seconds between checks of the file
+        """
+        if interval <= 0:
+            raise ValueError("interval must be positive, not " + str(interval))
+
+        with self._watch_lock:
+            self._watched[name] = {"path": path, "method": method, "loader": loader, "interval": interval,
+                                   "due": None, "stat": None, "digest": None}
+            self._poll([name])
+            self._watch_changed.notify_all()
+
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._poll_loop, daemon=True)
+                self._thread.start()
+
+    def poll(self):
+        """
+        Check watched model files once, loading those that changed.
+        Returns the list of newly registered Models.
+        Checks are serialized, so a file is never loaded twice by concurrent polls.
+        """
+        with self._watch_lock:
+            return self._poll(list(self._watched))
+
+    def _poll(self, names):
+        """
+        Check some watched model files once (see poll()), and schedule their next checks.
+        Each changed file is read once: its digest and profiles come from the same bytes.
+        Call with _watch_lock held.
+        """
+        registered = []
+
+        for name in names:
+            watched = self._watched[name]
+            watched["due"] = time.monotonic() + watched["interval"]
+
+            path = watched["path"]
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            stat = (stat.st_mtime_ns, stat.st_size)
+            if stat == watched["stat"]:
+                continue
+            watched["stat"] = stat
+
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                digest = hashlib.sha1(data).hexdigest()
+                if digest == watched["digest"]:
+                    continue # touched, but unchanged
+
+                profiles = watched["loader"](data)
+            except Exception as e:
+                self.errors[name] = repr(e)
+                continue
+
+            watched["digest"] = digest
+            self.errors.pop(name, None)
+            registered.append(self.register(name, profiles, watched["method"], source=path + "@" + digest[:12]))
+
+        return registered
+
+    def _poll_loop(self):
+        """
+        Poll each watched model file when its next check is due, until stop() is called.
+        """
+        with self._watch_lock:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                due = [name for name, watched in self._watched.items() if watched["due"] <= now]
+                if due:
+                    self._poll(due)
+                    continue
+
+                # Sleep until the next check, or until watch() or stop() wakes the loop
+                timeout = min((watched["due"] for watched in self._watched.values()), default=now + POLL_INTERVAL) - now
+                self._watch_changed.wait(timeout)
+
+    def stop(self):
+        """
+        Stop watching model files.
+        """
+        self._stop.set()
+        with self._watch_lock:
+            self._watch_changed.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
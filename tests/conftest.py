@@ -0,0 +1,39 @@
+"""
+Shared setup for the tests: modules are imported from the repository root,
+and read data (IPA dictionaries, documents) from paths relative to it.
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+
+@pytest.fixture
+def batched_tokenizer(monkeypatch):
+    """
+    Tokenize with the batched tokenizer, which does not need nltk's punkt data.
+    """
+    import text_to_ipa
+
+    tokenize = text_to_ipa.tokenize_sentences
+    monkeypatch.setattr(text_to_ipa, "tokenize_sentences",
+                        lambda sentences, language="en", batched=False, workers=None:
+                        tokenize(sentences, language, batched=True, workers=1))
+
+
+@pytest.fixture(autouse=True)
+def no_disk_caches(monkeypatch):
+    """
+    Keep transcriptions and compiled lexicons out of the working tree's ./cache/.
+    Tests of the disk caches point them at tmp_path.
+    """
+    import evaluate
+    import text_to_ipa
+
+    monkeypatch.setattr(evaluate, "TRANSCRIPTION_CACHE", None)
+    monkeypatch.setattr(text_to_ipa, "COMPILED_LEXICONS", None)
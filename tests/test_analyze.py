@@ -0,0 +1,60 @@
+import json
+import math
+
+import pytest
+
+import analyze
+
+
+def _entry(count):
+    return {"count": count, "log_prob": 0.0}
+
+
+LANGUAGE_NGRAMS = {
+    "aa": {"bigrams": {("a", "b"): _entry(5), ("b", "c"): _entry(3), ("c", "d"): _entry(1)},
+           "trigrams": {("a", "b", "c"): _entry(4)}},
+    "bb": {"bigrams": {("b", "c"): _entry(6), ("x", "y"): _entry(9)},
+           "trigrams": {("a", "b", "c"): _entry(3), ("x", "y", "z"): _entry(5)}},
+    "cc": {"bigrams": {("x", "y"): _entry(3)},
+           "trigrams": {}},
+}
+LANGS = ["aa", "bb", "cc"]
+
+
+def test_matrix_columns_by_order():
+    matrix, grams, columns = analyze.ngram_matrix(LANGUAGE_NGRAMS, LANGS, min_count=2)
+
+    assert grams == [("a", "b"), ("b", "c"), ("x", "y"), ("a", "b", "c"), ("x", "y", "z")]
+    assert columns == {"bigrams": (0, 3), "trigrams": (3, 5)}
+    assert matrix.tolist() == [[5, 3, 0, 4, 0], [0, 6, 9, 3, 5], [0, 0, 3, 0, 0]]
+
+
+def test_compare_profiles_equals_set_arithmetic():
+    matrix, grams, columns = analyze.ngram_matrix(LANGUAGE_NGRAMS, LANGS, min_count=2)
+    comparison = analyze.compare_profiles(matrix[:, 0:3], top=2)
+
+    present = [{g for g, e in LANGUAGE_NGRAMS[l]["bigrams"].items() if e["count"] > 2} for l in LANGS]
+    for i in range(3):
+        for j in range(3):
+            shared = len(present[i] & present[j])
+            assert comparison["overlap"][i][j] == shared
+            assert math.isclose(comparison["jaccard"][i][j], shared / len(present[i] | present[j]))
+
+    assert math.isclose(comparison["cosine"][0][0], 1.0)
+    assert comparison["cosine"][0][2] == 0.0
+    assert list(comparison["most_shared"]) == [1, 2]
+
+
+def test_analyze_overlap_writes_results(tmp_path):
+    analysis = analyze.analyze_overlap(LANGUAGE_NGRAMS, LANGS, min_count=2, top=1, results_path=str(tmp_path))
+
+    assert analysis["orders"]["trigrams"]["most_shared"] == [{"gram": "a b c", "languages": 2, "shared_by": ["aa", "bb"]}]
+    with open(analysis["results_file"], encoding="utf-8") as f:
+        assert json.load(f)["orders"]["bigrams"]["grams"] == 3
+
+
+def test_matrix_size_is_bounded(monkeypatch):
+    monkeypatch.setattr(analyze, "MAX_MATRIX_BYTES", 3 * 5 * 8 - 1)
+
+    with pytest.raises(ValueError):
+        analyze.ngram_matrix(LANGUAGE_NGRAMS, LANGS, min_count=2)
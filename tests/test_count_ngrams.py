@@ -0,0 +1,35 @@
+import pytest
+
+import identify
+import train_ngram
+
+TOKENS = "ð ə k æ t s æ t . ð ə k æ t s æ t ɒ n ð ə m æ t .".split()
+
+
+def test_counts_equal_create_ngrams():
+    orders = train_ngram.make_orders(range(1, 8))
+    counts = train_ngram.count_ngrams(TOKENS, orders)
+
+    for name, n in orders.items():
+        expected = train_ngram.create_ngrams(TOKENS, n)
+        assert train_ngram.rank_ngrams(counts[name]) == expected
+        assert list(train_ngram.rank_ngrams(counts[name])) == list(expected)
+
+
+def test_short_and_empty_inputs():
+    counts = train_ngram.count_ngrams(["a"], {"trigrams": 3})
+    assert counts["trigrams"] == {("$", "$", "a"): 1, ("$", "a", "/$"): 1, ("a", "/$", "/$"): 1}
+    assert train_ngram.rank_ngrams(train_ngram.count_ngrams([], {"bigrams": 2})["bigrams"]) == train_ngram.create_ngrams([], 2)
+
+
+def test_trained_tables_equal_create_ngrams():
+    phonemes = train_ngram.load_corpus_phonemes(train_ngram.CORPORA["en"])
+
+    for name, n in train_ngram.ORDERS.items():
+        assert identify.LANGUAGE_NGRAMS["en"][name] == train_ngram.create_ngrams(phonemes, n)
+
+
+def test_make_orders():
+    assert train_ngram.make_orders([4, 2, 3, 2]) == {"bigrams": 2, "trigrams": 3, "fourgrams": 4}
+    with pytest.raises(ValueError):
+        train_ngram.make_orders([8])
@@ -0,0 +1,127 @@
+import pytest
+
+import lexicon
+import text_to_ipa
+
+WORDS = sorted(["house", "horse", "houses", "mouse", "the", "then", "there", "they", "a", "about", "abbot",
+                "spelling", "spell", "spilling", "acknowledgement", "acknowledgment"])
+
+
+def _brute_force(word, max_distance):
+    best = None
+    for word_id, candidate in enumerate(WORDS):
+        distance = lexicon.edit_distance(word, candidate, max_distance)
+        if distance <= max_distance and (best is None or distance < best[2]):
+            best = (word_id, candidate, distance)
+    return best
+
+
+def _words_at(ids):
+    return ((i, WORDS[i]) for i in ids)
+
+
+@pytest.fixture
+def nearest_word():
+    yield text_to_ipa.init_nearest_word
+    text_to_ipa.init_nearest_word([])
+
+
+def test_edit_distance():
+    assert lexicon.edit_distance("house", "house") == 0
+    assert lexicon.edit_distance("house", "hosue") == 1 # transposition
+    assert lexicon.edit_distance("house", "mouse") == 1
+    assert lexicon.edit_distance("house", "hose") == 1
+    assert lexicon.edit_distance("spelling", "spilling") == 1
+    assert lexicon.edit_distance("spelling", "speling") == 1
+    assert lexicon.edit_distance("house", "the", 2) == 3 # max_distance + 1 when further
+
+
+@pytest.mark.parametrize("max_distance", [0, 1, 2, 3])
+def test_nearest_matches_brute_force(max_distance):
+    index = lexicon.EditIndex(WORDS, max_distance)
+
+    # (Matches share a delete that is not empty, so queries are longer than max_distance)
+    for word in ["hosue", "housse", "thee", "abot", "spelng", "acknowlegement", "xyzw", "mouse", "thy", "abbt"]:
+        assert index.nearest(word, _words_at) == _brute_force(word, max_distance)
+
+
+def test_max_distance_fits_entries(nearest_word):
+    with pytest.raises(ValueError):
+        lexicon.EditIndex(WORDS, lexicon.EDIT_MAX_DISTANCE + 1)
+    with pytest.raises(ValueError):
+        nearest_word(["en"], lexicon.EDIT_MAX_DISTANCE + 1)
+    assert text_to_ipa.NEAREST_WORD_DISTANCE == lexicon.EDIT_DISTANCE
+
+
+def test_save_load_round_trip(tmp_path):
+    index = lexicon.EditIndex(WORDS, 2)
+    path = str(tmp_path / "words.edits")
+    index.save(path)
+    loaded = lexicon.EditIndex.load(path)
+
+    assert len(loaded) == len(WORDS)
+    assert (loaded.max_distance, loaded.prefix_length) == (index.max_distance, index.prefix_length)
+    for word in ["hosue", "spelng", "xyz"]:
+        assert loaded.nearest(word, _words_at) == index.nearest(word, _words_at)
+
+
+def test_compact_lexicon_saves_edit_index(tmp_path):
+    compact = lexicon.CompactLexicon({word: word.upper() for word in WORDS})
+    compact.build_edit_index(2)
+    path = str(tmp_path / "words.lex")
+    compact.save(path)
+    loaded = lexicon.CompactLexicon.load(path)
+
+    assert loaded.nearest("hosue") == ("house", "HOUSE", 1)
+    assert loaded.nearest("xyz") is None
+
+
+def test_dictionary_edit_index_is_saved(tmp_path, monkeypatch, nearest_word):
+    monkeypatch.setattr(text_to_ipa, "COMPILED_LEXICONS", str(tmp_path) + "/")
+    monkeypatch.setitem(text_to_ipa.languages, "tr", dict(text_to_ipa.languages["tr"]))
+    nearest_word(["tr"])
+    ipa_dict = text_to_ipa.init_ipa_dictionary("tr")
+
+    index, headwords = text_to_ipa.get_edit_index("tr", ipa_dict)
+    path = text_to_ipa.compiled_edit_index_path("tr")
+    assert [p.name for p in tmp_path.iterdir()] == [path.split("/")[-1]]
+
+    # A new process (or reload) loads the saved index instead of building it
+    class LoadOnly(lexicon.EditIndex):
+        def __init__(self, words=(), *args, **kwargs):
+            assert not words, "edit index was rebuilt"
+            super().__init__(words, *args, **kwargs)
+
+    monkeypatch.setattr(text_to_ipa, "EditIndex", LoadOnly)
+    text_to_ipa.languages["tr"]["edit_index"] = None
+    loaded, loaded_headwords = text_to_ipa.get_edit_index("tr", ipa_dict)
+    assert loaded is not index and len(loaded) == len(index) and loaded_headwords == headwords
+    assert text_to_ipa.nearest_word_ipa(headwords[0] + "q", ipa_dict, "tr") == (ipa_dict[headwords[0]], headwords[0])
+
+
+def test_dictionary_is_hashed_once(tmp_path, monkeypatch, batched_tokenizer):
+    monkeypatch.setattr(text_to_ipa, "COMPILED_LEXICONS", str(tmp_path) + "/")
+    monkeypatch.setitem(text_to_ipa.languages, "tr", dict(text_to_ipa.languages["tr"], ipa_dict={}, ipa_version=None))
+    monkeypatch.setattr(text_to_ipa, "ipa_versions", {})
+
+    hashed = []
+    hash_ipa_dictionary = text_to_ipa.hash_ipa_dictionary
+    monkeypatch.setattr(text_to_ipa, "hash_ipa_dictionary", lambda path: hashed.append(path) or hash_ipa_dictionary(path))
+
+    # A cold translation versions its cache key, then loads the dictionary
+    text_to_ipa.translate("merhaba dünya", "tr", use_cache=True)
+    text_to_ipa.init_ipa_dictionary("tr", compact=True) # (compiles and saves the lexicon)
+    text_to_ipa.init_ipa_dictionary("tr", compact=True) # (loads the saved lexicon)
+    text_to_ipa.compiled_lexicon_path("tr")
+    assert len(hashed) == 1
+
+
+def test_changed_dictionary_is_hashed_again(tmp_path, monkeypatch):
+    monkeypatch.setattr(text_to_ipa, "IPA_PATH", str(tmp_path) + "/")
+    csv = tmp_path / "tr.csv"
+    csv.write_text("token,ipa\nev,e v\n", encoding="utf-8")
+    version = text_to_ipa.ipa_dictionary_version("tr")
+
+    assert text_to_ipa.ipa_dictionary_version("tr") == version
+    csv.write_text("token,ipa\nev,e v\nsu,s u\n", encoding="utf-8")
+    assert text_to_ipa.ipa_dictionary_version("tr") != version
@@ -0,0 +1,37 @@
+import math
+
+import evaluate
+
+
+def test_latency_lands_in_its_own_bucket():
+    histogram = {}
+    evaluate._add_latency(histogram, 0.002)
+    (bucket,) = histogram
+
+    # The bucket's bounds contain the latency
+    assert evaluate.LATENCY_BUCKET_GROWTH ** bucket <= 0.002 < evaluate.LATENCY_BUCKET_GROWTH ** (bucket + 1)
+
+
+def test_percentile_is_within_one_bucket():
+    histogram = {}
+    for ms in range(1, 101):
+        evaluate._add_latency(histogram, ms / 1000)
+
+    p50 = evaluate._latency_percentile(histogram, 50)
+    p99 = evaluate._latency_percentile(histogram, 99)
+    assert 50 <= p50 <= 50 * evaluate.LATENCY_BUCKET_GROWTH
+    assert 99 <= p99 <= 99 * evaluate.LATENCY_BUCKET_GROWTH
+    assert evaluate._latency_percentile({}, 50) is None
+
+
+def test_documents_report_wall_clock_throughput(tmp_path):
+    doc = tmp_path / "en.txt"
+    doc.write_text("wʌt ə ˈbjutəfəl ˈmɔrnɪŋ\n\nðɪs ɪz ə tɛst\n", encoding="utf-8")
+
+    report = evaluate.test_documents({"en": str(doc)}, ipa=True, results_path=str(tmp_path / "results"))
+
+    overall = report["overall"]
+    assert overall["lines"] == 2
+    assert report["languages"]["en"]["lines"] == 2
+    assert overall["lines_per_sec"] > 0
+    assert not math.isnan(overall["p50_ms"])
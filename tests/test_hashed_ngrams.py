@@ -0,0 +1,41 @@
+import identify
+import train_ngram
+from utilities import LANGUAGES
+
+
+def test_rolling_keys_equal_ngram_keys():
+    # Padded for fourgrams: 3 "$" IDs (1) and 3 "/$" IDs (2)
+    ids = [1, 1, 1, 5, 7, 5, 7, 9, 2, 2, 2]
+    counts = train_ngram.extract_ngram_keys(ids, check={})
+
+    for name, n in train_ngram.ORDERS.items():
+        expected = {}
+        # Each order is padded with its own n-1 IDs on each side
+        for i in range(4 - n, len(ids) - 4 + 1):
+            key = train_ngram.ngram_key(ids[i:i+n])
+            expected[key] = expected.get(key, 0) + 1
+        assert counts[name] == expected
+
+
+def test_query_keys_equal_packed_tuple_tables():
+    phonemes = train_ngram.load_corpus_phonemes(train_ngram.CORPORA[LANGUAGES[0]])[:500]
+    tables = {n: train_ngram.create_ngrams(phonemes, size) for n, size in train_ngram.ORDERS.items()}
+    phoneme_ids = {}
+    packed = train_ngram.pack_profiles({LANGUAGES[0]: tables}, phoneme_ids)
+
+    computed = identify.compute_packed_ngrams(phonemes, phoneme_ids)
+    for n, table in tables.items():
+        counts = {train_ngram.ngram_key(train_ngram.phoneme_to_ids(gram, phoneme_ids)): entry["count"]
+                  for gram, entry in table.items()}
+        assert computed[n] == counts
+        assert set(packed[LANGUAGES[0]][n]) == set(counts)
+
+
+def test_packed_profiles_are_built_on_first_use(monkeypatch):
+    monkeypatch.setattr(identify, "PACKED_NGRAMS", {})
+
+    identify.identify_language("wʌt ə ˈbjutəfəl ˈmɔrnɪŋ")
+    assert identify.PACKED_NGRAMS == {}
+
+    identify.identify_language("wʌt ə ˈbjutəfəl ˈmɔrnɪŋ", method="packed")
+    assert set(identify.PACKED_NGRAMS) == set(identify.LANGUAGE_NGRAMS)
@@ -0,0 +1,54 @@
+import json
+
+import identify
+import identify_batch
+import text_to_ipa
+
+PHONEMES = "wʌt ə ˈbjutəfəl ˈmɔrnɪŋ"
+
+
+def test_read_batches_skips_lines_without_id(tmp_path, capsys):
+    lines = tmp_path / "lines.txt"
+    lines.write_text("a\t" + PHONEMES + "\nnoTabHere\n\nb\t" + PHONEMES + "\n", encoding="utf-8")
+
+    batches = list(identify_batch.read_batches([str(lines)], id_column=True, batch_size=1))
+
+    assert batches == [[("a", PHONEMES)], [("b", PHONEMES)]]
+    assert "lines.txt:2" in capsys.readouterr().err
+
+
+def test_read_batches_ids_by_line_number(tmp_path):
+    lines = tmp_path / "lines.txt"
+    lines.write_text(PHONEMES + "\n\n" + PHONEMES + "\n", encoding="utf-8")
+
+    (batch,) = identify_batch.read_batches([str(lines)])
+
+    assert [line_id for line_id, line in batch] == [str(lines) + ":1", str(lines) + ":3"]
+
+
+def test_main_writes_one_result_per_line(tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(text_to_ipa, "UNHANDLED_LIST_LIMIT", None)
+    lines = tmp_path / "lines.txt"
+    lines.write_text("a\t" + PHONEMES + "\nnoTabHere\nb\t" + PHONEMES + "\n", encoding="utf-8")
+
+    identify_batch.main([str(lines), "--id-column", "--top", "2", "--batch-size", "1"])
+
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    expected = identify.identify_language(PHONEMES)[:2]
+    assert [result["id"] for result in results] == ["a", "b"]
+    for result in results:
+        assert result["languages"] == [l for l, score in expected]
+        assert result["scores"] == [score for l, score in expected]
+
+
+def test_raw_text_does_not_list_unhandled_tokens(tmp_path, capsys, monkeypatch, batched_tokenizer):
+    monkeypatch.setattr(text_to_ipa, "UNHANDLED_LIST_LIMIT", None)
+    monkeypatch.setitem(text_to_ipa.unhandled_tokens_list, "en", [])
+    text_to_ipa.init_translation_cache()
+    lines = tmp_path / "lines.txt"
+    lines.write_text("the xqzzv house\n", encoding="utf-8")
+
+    identify_batch.main([str(lines), "--lang", "en"])
+
+    assert len(capsys.readouterr().out.splitlines()) == 1
+    assert text_to_ipa.unhandled_tokens_list["en"] == []
@@ -0,0 +1,61 @@
+import threading
+
+import pytest
+
+import identify
+import text_to_ipa
+
+SENTENCE = "What a beautiful morning it is today, my friend."
+
+
+def test_identifies_and_leaves_out_missing_dictionaries():
+    identified = identify.identify_text(SENTENCE, langs=["en", "es", "de"], timeout=30)
+
+    assert identified["language"] == "english"
+    assert identified["missing"] == ["german"] # (no IPA dictionary)
+    assert set(identified["coverage"]) == {"english", "spanish"}
+    assert identified["coverage"]["english"] > identified["coverage"]["spanish"]
+
+
+def test_over_budget_is_missing(monkeypatch):
+    transcribe = text_to_ipa.transcribe_known_tokens
+
+    def refuse_es(tokens, lang):
+        if lang == "es":
+            raise MemoryError("over budget")
+        return transcribe(tokens, lang)
+
+    monkeypatch.setattr(text_to_ipa, "transcribe_known_tokens", refuse_es)
+    identified = identify.identify_text(SENTENCE, langs=["en", "es"], timeout=30)
+
+    assert identified["language"] == "english"
+    assert identified["missing"] == ["spanish"]
+
+
+def test_other_errors_are_raised(monkeypatch):
+    def broken(tokens, lang):
+        raise KeyError(lang)
+
+    monkeypatch.setattr(text_to_ipa, "transcribe_known_tokens", broken)
+    with pytest.raises(KeyError):
+        identify.identify_text(SENTENCE, langs=["en", "es"], timeout=30)
+
+
+def test_timed_out_languages_do_not_hold_up_later_calls(monkeypatch):
+    transcribe = text_to_ipa.transcribe_known_tokens
+    release = threading.Event()
+
+    def slow_es(tokens, lang):
+        if lang == "es":
+            release.wait(30)
+        return transcribe(tokens, lang)
+
+    monkeypatch.setattr(text_to_ipa, "transcribe_known_tokens", slow_es)
+    try:
+        transcribe(["what"], "en") # (load the dictionary first)
+        for call in range(len(text_to_ipa.LANGUAGES) + 3):
+            identified = identify.identify_text(SENTENCE, langs=["en", "es"], timeout=0.5)
+            assert identified["language"] == "english"
+            assert identified["missing"] == ["spanish"]
+    finally:
+        release.set()
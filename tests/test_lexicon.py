@@ -0,0 +1,64 @@
+import pytest
+
+import lexicon
+import text_to_ipa
+
+WORDS = {"the": "ð ə", "then": "ð ɛ n", "there": "ð ɛ r", "house": "h aʊ s", "houses": "h aʊ z ɪ z",
+         "a": "ə", "ábaco": "a b a k o", "zoo": "z u", "they": "ð eɪ"}
+WORDS.update({"word" + str(i): "w " + str(i % 7) for i in range(100)})
+
+
+def test_lookup_like_a_dict():
+    compact = lexicon.CompactLexicon(WORDS)
+
+    assert len(compact) == len(WORDS)
+    assert dict(compact.items()) == WORDS
+    assert list(compact) == sorted(WORDS, key=lambda word: word.encode("utf-8"))
+    for word, ipa in WORDS.items():
+        assert word in compact
+        assert compact[word] == ipa
+    assert "thee" not in compact
+    assert compact.get("thee", "") == ""
+    with pytest.raises(KeyError):
+        compact["thee"]
+
+
+def test_prefix_search_and_longest_prefix():
+    compact = lexicon.CompactLexicon(WORDS)
+
+    assert list(compact.prefix_search("the")) == [("the", "ð ə"), ("then", "ð ɛ n"), ("there", "ð ɛ r"), ("they", "ð eɪ")]
+    assert list(compact.prefix_search("x")) == []
+    assert compact.longest_prefix("housework") == ("house", "h aʊ s")
+    assert compact.longest_prefix("xyz") is None
+
+
+def test_save_load_round_trip(tmp_path):
+    compact = lexicon.CompactLexicon(WORDS)
+    path = str(tmp_path / "words.lex")
+    compact.save(path)
+    loaded = lexicon.CompactLexicon.load(path)
+
+    assert dict(loaded.items()) == WORDS
+    assert loaded.edit_index is None
+
+
+def test_empty_lexicon():
+    compact = lexicon.CompactLexicon({})
+
+    assert len(compact) == 0
+    assert "the" not in compact
+    assert list(compact.prefix_search("")) == []
+
+
+def test_compact_dictionary_equals_dict(tmp_path, monkeypatch):
+    monkeypatch.setattr(text_to_ipa, "COMPILED_LEXICONS", str(tmp_path) + "/")
+    monkeypatch.setitem(text_to_ipa.languages, "tr", dict(text_to_ipa.languages["tr"]))
+
+    ipa_dict = text_to_ipa.init_ipa_dictionary("tr")
+    compact = text_to_ipa.init_ipa_dictionary("tr", compact=True)
+    assert isinstance(compact, lexicon.CompactLexicon)
+    assert dict(compact.items()) == dict(ipa_dict)
+
+    # The compiled lexicon is saved, and reused by the next load
+    assert [path.name for path in tmp_path.iterdir()] == [text_to_ipa.compiled_lexicon_path("tr").split("/")[-1]]
+    assert dict(text_to_ipa.init_ipa_dictionary("tr", compact=True).items()) == dict(ipa_dict)
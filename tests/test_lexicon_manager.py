@@ -0,0 +1,68 @@
+import text_to_ipa
+
+
+def setup_function():
+    text_to_ipa.init_lexicon_manager()
+
+
+def teardown_function():
+    text_to_ipa.init_lexicon_manager()
+
+
+def _unload(*langs):
+    for lang in langs:
+        text_to_ipa.languages[lang]["ipa_dict"] = {}
+        text_to_ipa.loaded_lexicons.pop(lang, None)
+
+
+def test_loads_once_and_counts_hits():
+    _unload("tr")
+    ipa_dict = text_to_ipa.get_ipa_dictionary("tr")
+
+    assert text_to_ipa.get_ipa_dictionary("tr") is ipa_dict
+    stats = text_to_ipa.lexicon_manager_stats()
+    assert stats["loads"] == 1 and stats["hits"] == 1
+    assert stats["loaded"]["tr"] == text_to_ipa.lexicon_size(ipa_dict)
+
+
+def test_evicts_before_loading(monkeypatch):
+    _unload("tr", "ko", *list(text_to_ipa.loaded_lexicons))
+    text_to_ipa.get_ipa_dictionary("tr")
+
+    # Leave room for tr, but not for tr and ko
+    budget = text_to_ipa.lexicon_manager_stats()["memory"] + text_to_ipa.estimate_lexicon_size("ko") - 1
+    text_to_ipa.init_lexicon_manager(budget)
+
+    loaded_at_load = []
+    init_ipa_dictionary = text_to_ipa.init_ipa_dictionary
+    def record(lang, compact=False):
+        loaded_at_load.append(list(text_to_ipa.loaded_lexicons))
+        return init_ipa_dictionary(lang, compact)
+    monkeypatch.setattr(text_to_ipa, "init_ipa_dictionary", record)
+
+    text_to_ipa.get_ipa_dictionary("ko")
+
+    assert loaded_at_load == [[]]
+    assert not text_to_ipa.languages["tr"]["ipa_dict"]
+    assert list(text_to_ipa.loaded_lexicons) == ["ko"]
+    assert text_to_ipa.lexicon_manager_stats()["evictions"] >= 1
+
+
+def test_estimates_are_upper_bounds():
+    _unload("tr")
+    for compact in (False, True):
+        text_to_ipa.init_lexicon_manager(compact=compact)
+        _unload("tr")
+        ipa_dict = text_to_ipa.get_ipa_dictionary("tr")
+        assert text_to_ipa.lexicon_size(ipa_dict) <= text_to_ipa.estimate_lexicon_size("tr", compact)
+    _unload("tr")
+
+
+def test_prefetch_skips_failed_languages(capsys):
+    _unload("tr")
+    text_to_ipa.prefetch_lexicons(["de", "tr"]).join() # (no IPA dictionary for de)
+
+    assert text_to_ipa.languages["tr"]["ipa_dict"]
+    assert text_to_ipa.lexicon_manager_stats()["prefetches"] == 1
+    assert "de" in capsys.readouterr().err
+    _unload("tr")
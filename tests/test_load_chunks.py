@@ -0,0 +1,28 @@
+import text_to_ipa
+
+
+def test_chunks_cover_file_in_whole_rows(tmp_path):
+    ipa = tmp_path / "xx.csv"
+    ipa.write_bytes('word,ipa\na,/a/\n"b,\nc",/b/\nd,/d/\ne,"/e/\n"\n'.encode("utf-8"))
+
+    chunks = text_to_ipa.ipa_csv_chunks(str(ipa), chunk_size=4)
+
+    assert chunks[0][0] == len(b"word,ipa\n")
+    assert chunks[-1][1] == len(ipa.read_bytes())
+    assert all(end == next_start for (start, end), (next_start, next_end) in zip(chunks, chunks[1:]))
+
+    parsed = {}
+    for start, end in chunks:
+        parsed.update(text_to_ipa.parse_ipa_chunk(str(ipa), start, end))
+    assert set(parsed) == {"a", "b,\nc", "d", "e"}
+
+
+def test_chunked_load_equals_serial_load(monkeypatch):
+    for lang in ("tr", "ko"):
+        monkeypatch.setitem(text_to_ipa.languages, lang, dict(text_to_ipa.languages[lang]))
+
+    serial = {lang: dict(text_to_ipa.init_ipa_dictionary(lang)) for lang in ("tr", "ko")}
+    chunked = text_to_ipa.load_ipa_dictionaries(["tr", "ko"], workers=2, chunk_size=4096)
+
+    assert chunked == serial
+    assert text_to_ipa.languages["tr"]["ipa_dict"] is chunked["tr"]
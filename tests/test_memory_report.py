@@ -0,0 +1,74 @@
+import sys
+
+import pytest
+
+import identify
+import memory_report
+import text_to_ipa
+import train_ngram
+
+
+def teardown_function():
+    text_to_ipa.init_lexicon_manager()
+
+
+def test_deep_sizeof_counts_shared_objects_once():
+    shared = ["x" * 1000]
+    seen = set()
+
+    first = memory_report.deep_sizeof({"a": shared}, seen)
+    second = memory_report.deep_sizeof({"b": shared}, seen)
+
+    assert first > 1000
+    assert second < 1000
+
+
+def test_trim_rebuilds_smaller_tables():
+    language_ngrams = train_ngram.train_languages(["en"])
+    full = language_ngrams["en"]["trigrams"]
+    profile = language_ngrams["en"]
+
+    removed = train_ngram.trim_ngrams(language_ngrams, 100)
+
+    trimmed = profile["trigrams"]
+    assert removed == sum(len(table) - 100 for table in identify.LANGUAGE_NGRAMS["en"].values())
+    assert list(trimmed) == list(full)[:100]
+    assert sys.getsizeof(trimmed) < sys.getsizeof(full) / 4
+    assert trimmed == train_ngram.train_languages(["en"], k=100)["en"]["trigrams"]
+
+
+def test_report_languages_and_total():
+    report = memory_report.memory_report(["tr"])
+
+    assert set(report["languages"]) == {"tr"}
+    assert set(report["languages"]["tr"]) >= {"lexicon", "bigrams", "packed", "oov_log", "total"}
+    assert report["total"] >= report["languages"]["tr"]["total"]
+
+
+def test_enforce_budget_keeps_lexicon_stats():
+    text_to_ipa.get_ipa_dictionary("tr")
+    stats = text_to_ipa.lexicon_manager_stats()
+
+    report = memory_report.enforce_budget(1 << 40, trim=False)
+
+    assert report["within_budget"]
+    after = text_to_ipa.lexicon_manager_stats()
+    assert after["hits"] == stats["hits"] and after["loads"] == stats["loads"]
+
+
+def test_refuse_before_parsing(monkeypatch):
+    for lang in list(text_to_ipa.loaded_lexicons):
+        text_to_ipa.languages[lang]["ipa_dict"] = {}
+        text_to_ipa.loaded_lexicons.pop(lang)
+    text_to_ipa.get_ipa_dictionary("tr")
+    text_to_ipa.languages["ko"]["ipa_dict"] = {}
+    text_to_ipa.init_lexicon_manager(text_to_ipa.lexicon_manager_stats()["memory"] + 1000, policy="refuse")
+
+    def parse(lang, compact=False):
+        raise AssertionError("parsed before refusing")
+    monkeypatch.setattr(text_to_ipa, "init_ipa_dictionary", parse)
+
+    with pytest.raises(MemoryError):
+        text_to_ipa.get_ipa_dictionary("ko")
+    assert text_to_ipa.lexicon_manager_stats()["refused"] == 1
+    assert text_to_ipa.languages["tr"]["ipa_dict"]
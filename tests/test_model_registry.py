@@ -0,0 +1,142 @@
+import hashlib
+import json
+import threading
+import time
+
+import pytest
+
+import identify
+import identify_batch
+import train_ngram
+from model_registry import ModelRegistry
+
+PHONEMES = "wʌt ə ˈbjutəfəl ˈmɔrnɪŋ"
+
+
+def _save_model(path, bits=8):
+    train_ngram.save_quantized(train_ngram.quantize_languages(identify.LANGUAGE_NGRAMS, bits), str(path))
+
+
+def test_versions_activate_and_rollback():
+    registry = ModelRegistry(keep=2)
+    for i in range(3):
+        registry.register("model", {"version": i})
+
+    assert registry.versions("model") == [3, 2]
+    assert registry.active("model").profiles == {"version": 2}
+    assert registry.rollback("model").version == 2
+    assert registry.rollback("model") is None
+    assert registry.activate("model", 3).version == 3
+
+
+def test_poll_reloads_changed_files(tmp_path):
+    model_file = tmp_path / "model.bin"
+    _save_model(model_file, 8)
+    registry = ModelRegistry()
+    registry.watch("model", str(model_file), interval=3600)
+    try:
+        assert registry.versions("model") == [1]
+        assert registry.poll() == []
+
+        _save_model(model_file, 16)
+        (model,) = registry.poll()
+        assert model.version == 2 and registry.active("model") is model
+        assert model.profiles["en"]["bigrams"]["bits"] == 16
+
+        model_file.write_bytes(b"broken")
+        assert registry.poll() == []
+        assert "model" in registry.errors and registry.active("model") is model
+    finally:
+        registry.stop()
+
+
+def test_concurrent_polls_load_once(tmp_path):
+    model_file = tmp_path / "model.bin"
+    model_file.write_bytes(b"model")
+    loads = []
+    def loader(data):
+        loads.append(data)
+        time.sleep(0.05)
+        return {}
+
+    registry = ModelRegistry()
+    registry._watched["model"] = {"path": str(model_file), "method": "freq", "loader": loader, "interval": 3600,
+                                  "due": None, "stat": None, "digest": None}
+    threads = [threading.Thread(target=registry.poll) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    assert registry.versions("model") == [1]
+
+
+def test_loads_the_bytes_it_hashed(tmp_path):
+    model_file = tmp_path / "model.bin"
+    registry = ModelRegistry()
+    try:
+        for contents in (b"first", b"second"):
+            model_file.write_bytes(contents)
+            registry.watch("model", str(model_file), "freq", loader=lambda data: {"data": data}, interval=3600)
+
+            model = registry.active("model")
+            assert model.profiles == {"data": contents}
+            assert model.source == str(model_file) + "@" + hashlib.sha1(contents).hexdigest()[:12]
+    finally:
+        registry.stop()
+
+
+def test_each_file_polled_at_its_interval(tmp_path):
+    fast, slow = tmp_path / "fast.bin", tmp_path / "slow.bin"
+    fast.write_bytes(b"1")
+    slow.write_bytes(b"1")
+    registry = ModelRegistry()
+    try:
+        registry.watch("slow", str(slow), "freq", loader=lambda data: {}, interval=3600)
+        registry.watch("fast", str(fast), "freq", loader=lambda data: {}, interval=0.02)
+        fast.write_bytes(b"22")
+        slow.write_bytes(b"22")
+
+        deadline = time.monotonic() + 5
+        while registry.versions("fast") != [2, 1] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert registry.versions("fast") == [2, 1]
+        assert registry.versions("slow") == [1]
+    finally:
+        registry.stop()
+
+    with pytest.raises(ValueError):
+        registry.watch("model", str(fast), interval=0)
+
+
+def test_serve_sets_identify_default_model():
+    quantized = train_ngram.quantize_languages(identify.LANGUAGE_NGRAMS, 8)
+    freq = identify.identify_language(PHONEMES)
+    registry = ModelRegistry()
+    registry.register("model", identify.LANGUAGE_NGRAMS, "freq")
+    registry.register("model", quantized, "quantized")
+    try:
+        registry.serve("model")
+        assert identify.identify_language(PHONEMES) == identify.identify_language(PHONEMES, "quantized", quantized)
+
+        registry.rollback("model")
+        assert identify.identify_language(PHONEMES) == freq
+    finally:
+        registry.unserve()
+
+    assert identify.default_model == ("freq", None)
+
+
+def test_batch_watch(tmp_path, capsys):
+    model_file = tmp_path / "model.bin"
+    _save_model(model_file, 8)
+    lines = tmp_path / "lines.txt"
+    lines.write_text(PHONEMES + "\n", encoding="utf-8")
+
+    identify_batch.main([str(lines), "--watch", str(model_file), "--top", "2"])
+
+    (result,) = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    expected = identify.identify_language(PHONEMES, "quantized", train_ngram.load_quantized(str(model_file)))[:2]
+    assert result["scores"] == [score for l, score in expected]
+    assert identify.default_model == ("freq", None)
@@ -0,0 +1,38 @@
+import math
+
+import identify
+import text_to_ipa
+import train_ngram
+
+SENTENCES = ["wʌt ə ˈbjutəfəl ˈmɔrnɪŋ", "ˈkwe ˈmaɲana ˈtam ˈbonita", "ʒ ʒ ʒ ʒ"]
+
+
+def test_phoneme_to_ids_extends_or_keeps_ids():
+    phoneme_ids = {}
+    assert train_ngram.phoneme_to_ids(["a", "b", "a"], phoneme_ids) == [3, 4, 3]
+    assert phoneme_ids == {"$": 1, "/$": 2, "a": 3, "b": 4}
+
+    # New phonemes get IDs after the known ones, for this call only
+    assert train_ngram.phoneme_to_ids(["c", "a", "d", "c"], phoneme_ids, extend=False) == [5, 3, 6, 5]
+    assert "c" not in phoneme_ids
+
+
+def test_packed_query_counts_match_tuple_ngrams():
+    phonemes = text_to_ipa.parse_ipa_input(SENTENCES[0])
+    packed = identify.compute_packed_ngrams(phonemes)
+    computed = identify.compute_ngrams(phonemes)
+
+    for n in computed:
+        keys = {train_ngram.ngram_key(train_ngram.phoneme_to_ids(gram, identify.PHONEME_IDS, extend=False)): entry["count"]
+                for gram, entry in computed[n].items()}
+        assert packed[n] == keys
+
+
+def test_packed_scores_equal_freq_scores():
+    for sentence in SENTENCES:
+        packed = identify.identify_language(sentence, method="packed")
+        freq = dict(identify.identify_language(sentence))
+
+        assert [l for l, score in packed] == [l for l, score in identify.identify_language(sentence)]
+        for l, score in packed:
+            assert math.isclose(score, freq[l], rel_tol=1e-9)
@@ -0,0 +1,35 @@
+import math
+
+import pytest
+
+import identify
+import text_to_ipa
+
+PHONEMES = "wʌt ə ˈbjutəfəl ˈmɔrnɪŋ"
+
+
+def test_prefix_scores_equal_full_rescoring():
+    phonemes = text_to_ipa.parse_ipa_input(PHONEMES)
+    prefix_predictions = identify.identify_prefixes(PHONEMES)
+
+    assert sorted(prefix_predictions) == list(range(1, len(phonemes)+1))
+    for length, predictions in prefix_predictions.items():
+        expected = identify.score_similarity(identify.compute_ngrams(phonemes[:length]))
+        assert [l for l, score in predictions] == [l for l, score in expected]
+        for (l, score), (expected_l, expected_score) in zip(predictions, expected):
+            assert math.isclose(score, expected_score, rel_tol=1e-9)
+
+
+def test_selected_lengths():
+    phonemes = text_to_ipa.parse_ipa_input(PHONEMES)
+    prefix_predictions = identify.identify_prefixes(PHONEMES, lengths=[3, 100, None])
+
+    assert set(prefix_predictions) == {3, 100, None}
+    assert prefix_predictions[100] == prefix_predictions[None]
+    assert [l for l, score in prefix_predictions[None]] == [l for l, score in identify.identify_language(PHONEMES)]
+    assert len(phonemes) < 100
+
+
+def test_packed_is_not_supported():
+    with pytest.raises(ValueError):
+        identify.identify_prefixes(PHONEMES, method="packed")
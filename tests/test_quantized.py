@@ -0,0 +1,71 @@
+import math
+
+import pytest
+
+import identify
+import train_ngram
+
+PHONEMES = "wʌt ə ˈbjutəfəl ˈmɔrnɪŋ"
+
+
+def test_codes_approximate_log_probs():
+    quantized = train_ngram.quantize_languages(identify.LANGUAGE_NGRAMS, bits=16)
+    table = quantized["en"]["trigrams"]
+    assert table["keys"].typecode == "Q" and table["codes"].typecode == "H"
+
+    for gram, entry in list(identify.LANGUAGE_NGRAMS["en"]["trigrams"].items())[:200]:
+        code = train_ngram.quantized_code(table, train_ngram.gram_hash(gram))
+        assert math.isclose(table["offset"] + code * table["scale"], entry["log_prob"], abs_tol=table["scale"])
+
+    assert train_ngram.quantized_code(table, train_ngram.gram_hash(("not", "a", "gram"))) is None
+
+
+def test_save_load_round_trip(tmp_path):
+    quantized = train_ngram.quantize_languages(identify.LANGUAGE_NGRAMS, bits=8)
+    model_file = str(tmp_path / "model.bin")
+    train_ngram.save_quantized(quantized, model_file)
+    loaded = train_ngram.load_quantized(model_file)
+
+    assert set(loaded) == set(quantized)
+    for l in quantized:
+        for n, table in quantized[l].items():
+            assert loaded[l][n]["keys"] == table["keys"]
+            assert loaded[l][n]["codes"] == table["codes"]
+            assert loaded[l][n]["offset"] == table["offset"]
+
+    assert identify.identify_language(PHONEMES, method="quantized", profiles=loaded) == \
+        identify.identify_language(PHONEMES, method="quantized", profiles=quantized)
+
+
+def test_quantized_scores_close_to_float():
+    quantized = train_ngram.quantize_languages(identify.LANGUAGE_NGRAMS, bits=16)
+    float_scores = dict(identify.identify_language(PHONEMES))
+
+    for lang, score in identify.identify_language(PHONEMES, method="quantized", profiles=quantized):
+        assert math.isclose(score, float_scores[lang], abs_tol=0.1)
+
+
+def test_rejects_other_files(tmp_path):
+    model_file = tmp_path / "model.bin"
+    model_file.write_bytes(b"not a model")
+    with pytest.raises(ValueError):
+        train_ngram.load_quantized(str(model_file))
+
+
+def test_evaluate_model_file_without_bigrams(tmp_path, batched_tokenizer):
+    import evaluate
+
+    snippets = tmp_path / "snippets.txt"
+    snippets.write_text("language\tsentence\tsource (url)\n"
+                        "en\tWhat a beautiful morning it is today.\thttps://example.org\n",
+                        encoding="utf-8")
+    identify.configure_orders([3, 4])
+    try:
+        model_file = str(tmp_path / "model.bin")
+        train_ngram.save_quantized(train_ngram.quantize_languages(identify.LANGUAGE_NGRAMS, bits=16), model_file)
+        report = evaluate.test_quantized(str(snippets), model_file=model_file)
+    finally:
+        identify.configure_orders([2, 3, 4])
+
+    assert report["bits"] == 16
+    assert report["top_agreement"] == 1.0
@@ -0,0 +1,60 @@
+import text_to_ipa
+
+# Small stand-in for an IPA dictionary, covering each unknown-token case
+IPA_DICT = {
+    "house": "h aʊ s",
+    "boat": "b oʊ t",
+    "houseboats": "h aʊ s b oʊ t s",
+    "run": "ɹ ʌ n",
+    "-ing": "ɪ ŋ",
+    "zebra": "z i b ɹ ə",
+    "zebrafish": "z i b ɹ ə f ɪ ʃ",
+    "zealot": "z ɛ l ə t",
+    "zeal": "z i l",
+}
+
+TOKENS = ["house-boat", "running", "houseboat", "zebr", "zea", "qqq", "42", "houseboat", "zebr"]
+
+
+def _counters(lang):
+    return (text_to_ipa.unhandled_tokens[lang], text_to_ipa.contains_word_cases[lang],
+            text_to_ipa.transcribed_tokens[lang], list(text_to_ipa.unhandled_tokens_list[lang]))
+
+
+def test_bulk_resolution_matches_each_token():
+    resolved = text_to_ipa.resolve_unknown_tokens(TOKENS, IPA_DICT, "en")
+
+    assert set(resolved) == set(TOKENS)
+    for token in TOKENS:
+        assert resolved[token] == text_to_ipa.resolve_unknown_token(token, IPA_DICT, "en")
+    assert resolved["zebr"][1] == "contains_word"
+    assert resolved["qqq"] == ("", "unhandled")
+
+
+def test_bulk_contains_word_matches_scan():
+    tokens = ["ze", "zeb", "zea", "hou", "x"]
+    found = text_to_ipa.contains_word_ipa_bulk(tokens, IPA_DICT, "en")
+
+    for token in tokens:
+        assert found[token] == text_to_ipa.contains_word_ipa(token, IPA_DICT, "en")
+
+
+def test_memo_counts_every_occurrence():
+    memo = text_to_ipa.resolve_unknown_tokens(TOKENS, IPA_DICT, "en")
+
+    before = _counters("en")
+    with_memo = text_to_ipa.ipa_lookup(TOKENS, "en", IPA_DICT, memo)
+    after_memo = _counters("en")
+    without_memo = text_to_ipa.ipa_lookup(TOKENS, "en", IPA_DICT)
+    after = _counters("en")
+
+    assert with_memo == without_memo
+    for a, b, c in zip(before[:3], after_memo[:3], after[:3]):
+        assert b - a == c - b
+
+
+def test_compact_contains_word_matches_dict():
+    compact = text_to_ipa.CompactLexicon(IPA_DICT)
+
+    for token in ["ze", "zeb", "zea", "hou", "x", "house", "ru"]:
+        assert text_to_ipa.contains_word_ipa(token, compact, "en") == text_to_ipa.contains_word_ipa(token, IPA_DICT, "en")
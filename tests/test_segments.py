@@ -0,0 +1,81 @@
+import math
+
+import pytest
+
+import identify
+import text_to_ipa
+
+
+def _phonemes(lang, n):
+    """
+    The first n phonemes of a language's IPA document.
+    """
+    phonemes = []
+    with open(text_to_ipa.IPA_DOCS + lang + "-doc-in-ipa-v2.txt", encoding="utf-8") as doc:
+        for line in doc:
+            phonemes += text_to_ipa.parse_ipa_input(line.strip())
+            if len(phonemes) >= n:
+                return phonemes[:n]
+
+
+def _assert_same_predictions(predictions, expected):
+    # (Languages with equal scores may be ordered differently, after rounding)
+    expected = dict(expected)
+    assert len(predictions) == len(expected)
+    for l, score in predictions:
+        assert math.isclose(score, expected[l], rel_tol=1e-9)
+    assert math.isclose(predictions[0][1], max(expected.values()), rel_tol=1e-9)
+
+
+def test_window_scores_equal_rescoring():
+    phonemes = _phonemes("en", 40)
+    windows = list(identify.identify_windows(phonemes, window=12))
+
+    assert [start for start, predictions in windows] == list(range(len(phonemes) - 12 + 1))
+    for start, predictions in windows:
+        expected = identify.score_similarity(identify.compute_ngrams(phonemes[start:start+12]))
+        _assert_same_predictions(predictions, expected)
+
+
+def test_step_keeps_last_window():
+    phonemes = _phonemes("es", 40)
+    starts = [start for start, predictions in identify.identify_windows(phonemes, window=12, step=5)]
+
+    assert starts == [0, 5, 10, 15, 20, 25, 28]
+
+
+def test_short_input_is_one_window():
+    phonemes = _phonemes("en", 8)
+    ((start, predictions),) = identify.identify_windows(phonemes, window=12)
+
+    assert start == 0
+    _assert_same_predictions(predictions, identify.score_similarity(identify.compute_ngrams(phonemes)))
+
+
+def test_invalid_windows():
+    with pytest.raises(ValueError):
+        list(identify.identify_windows(_phonemes("en", 40), window=1))
+    with pytest.raises(ValueError):
+        list(identify.identify_windows(_phonemes("en", 40), method="packed"))
+
+
+@pytest.mark.parametrize("first, second, languages", [("en", "ru", ["english", "russian"]),
+                                                      ("es", "ko", ["spanish", "korean"])])
+def test_segments_split_languages(first, second, languages):
+    phonemes = _phonemes(first, 150) + _phonemes(second, 150)
+    spans = identify.identify_segments(" ".join(phonemes))
+
+    assert [language for start, end, language in spans] == languages
+    assert spans[0][0] == 0 and spans[-1][1] == len(phonemes)
+    assert abs(spans[1][0] - 150) <= identify.SEGMENT_WINDOW // 5
+
+
+def test_segments_cover_input_without_short_spans():
+    phonemes = _phonemes("en", 60) + _phonemes("es", 10) + _phonemes("en", 60)
+    spans = identify.identify_segments(" ".join(phonemes), window=20, min_span=15)
+
+    assert spans[0][0] == 0 and spans[-1][1] == len(phonemes)
+    for (start, end, language), (next_start, next_end, next_language) in zip(spans, spans[1:]):
+        assert end == next_start and language != next_language
+    assert all(end - start >= 15 for start, end, language in spans)
+    assert identify.identify_segments("") == []
@@ -0,0 +1,40 @@
+import evaluate
+import identify
+from utilities import LANGUAGES
+
+PHONEMES = "wʌt ə ˈbjutəfəl ˈmɔrnɪŋ"
+
+
+def test_shortlist_scores_only_shortlisted_languages():
+    scores = identify.identify_language(PHONEMES, shortlist=3)
+    full_scores = dict(identify.identify_language(PHONEMES))
+
+    assert len(scores) == 3
+    for lang, score in scores:
+        assert score == full_scores[lang]
+
+
+def test_full_shortlist_equals_full_scoring():
+    assert identify.identify_language(PHONEMES, shortlist=len(LANGUAGES)) == identify.identify_language(PHONEMES)
+
+
+def test_audit_counts_into_given_stats():
+    stats = identify.shortlist_stats()
+    identify.identify_language(PHONEMES, shortlist=1, audit=stats)
+    identify.identify_language(PHONEMES, shortlist=1)
+
+    assert stats["audited"] == 1
+    report = identify.shortlist_report(stats)
+    assert report["miss_rate"] == stats["misses"]
+    assert identify.shortlist_report(identify.shortlist_stats())["miss_rate"] is None
+
+
+def test_documents_audit_is_opt_in(tmp_path):
+    doc = tmp_path / "en.txt"
+    doc.write_text(PHONEMES + "\n", encoding="utf-8")
+    docs = {"en": str(doc)}
+    results_path = str(tmp_path / "results")
+
+    assert "shortlist" not in evaluate.test_documents(docs, ipa=True, results_path=results_path, shortlist=3)
+    report = evaluate.test_documents(docs, ipa=True, results_path=results_path, shortlist=3, audit=True)
+    assert report["shortlist"]["audited"] == 1
@@ -0,0 +1,53 @@
+import math
+
+import pytest
+
+import evaluate
+import identify
+import text_to_ipa
+
+
+def test_pool_matches_serial(tmp_path, monkeypatch, batched_tokenizer):
+    # Cache transcriptions in the test's own directory (workers are forked, so they inherit it)
+    monkeypatch.setattr(evaluate, "TRANSCRIPTION_CACHE", str(tmp_path / "transcriptions.sqlite"))
+    monkeypatch.setattr(evaluate, "_transcription_cache_pid", None)
+    snippets = tmp_path / "snippets.txt"
+    snippets.write_text("language\tsentence\tsource (url)\n"
+                        "en\tWhat a beautiful morning it is today.\thttps://example.org\n"
+                        "es\tQué mañana tan bonita hace hoy.\thttps://example.org\n",
+                        encoding="utf-8")
+
+    size_results = evaluate.run_snippet_sizes(str(snippets), sizes=[10, None], workers=1)
+
+    assert (tmp_path / "transcriptions.sqlite").is_file()
+    assert set(size_results) == {10, None}
+    for n_chars, results in size_results.items():
+        assert set(results) == {"en", "es"}
+        for lang, result in results.items():
+            assert result == evaluate.test(evaluate._load_snippets(str(snippets))[lang], lang, n_chars)
+
+
+def test_phoneme_sizes_match_rescoring(tmp_path, batched_tokenizer):
+    snippets = tmp_path / "snippets.txt"
+    snippets.write_text("language\tsentence\tsource (url)\n"
+                        "en\tWhat a beautiful morning it is today.\thttps://example.org\n"
+                        "es\tQué mañana tan bonita hace hoy.\thttps://example.org\n",
+                        encoding="utf-8")
+
+    size_results = evaluate.run_snippet_sizes(str(snippets), sizes=[5, 12, None], workers=1, unit="phonemes")
+
+    assert set(size_results) == {5, 12, None}
+    for n_phonemes, results in size_results.items():
+        assert set(results) == {"en", "es"}
+        for lang, (predictions, result_lang, correct) in results.items():
+            phonemes = text_to_ipa.parse_ipa_input(evaluate.transcribe(evaluate._load_snippets(str(snippets))[lang], lang))
+            expected = dict(identify.identify_language(" ".join(phonemes[:n_phonemes])))
+
+            assert result_lang == lang and correct == (identify.best(predictions) == evaluate.NAMED_LANGS[lang])
+            for language, score in predictions:
+                assert math.isclose(score, expected[language], rel_tol=1e-9)
+
+
+def test_invalid_unit(tmp_path):
+    with pytest.raises(ValueError):
+        evaluate.run_snippet_sizes(str(tmp_path / "snippets.txt"), unit="words")
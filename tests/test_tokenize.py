@@ -0,0 +1,23 @@
+import jieba
+
+import text_to_ipa
+
+
+def test_batched_tokenizer_follows_treebank_rules():
+    tokens = text_to_ipa.fast_word_tokenize(["I can't go to the U.S. today.", 'He said "hi", then left...'])
+
+    assert tokens == [["I", "ca", "n't", "go", "to", "the", "U.S.", "today", "."],
+                      ["He", "said", "``", "hi", "''", ",", "then", "left", "..."]]
+
+
+def test_batched_tokenizer_keeps_sentences_apart():
+    tokens = text_to_ipa.tokenize_sentences(["one two", "", "three\nfour"], "en", batched=True)
+
+    assert tokens == [["one", "two"], [], ["three", "four"]]
+
+
+def test_batched_jieba_matches_jieba_tokenize():
+    sentences = ["我哋今日去街", "香港係一個城市"]
+
+    batched = text_to_ipa.tokenize_sentences(sentences, "yue", batched=True, workers=1)
+    assert batched == [[token[0] for token in jieba.tokenize(s)] for s in sentences]
@@ -0,0 +1,36 @@
+import evaluate
+import identify
+import train_ngram
+
+
+def test_top_k_profiles_equal_trained_top_k():
+    langs = ["en", "es"]
+    full = {l: identify.LANGUAGE_NGRAMS[l] for l in langs}
+    trained = train_ngram.train_languages(langs, k=50)
+
+    profiles = train_ngram.top_k_profiles(full, 50)
+
+    assert profiles == trained
+    for l in langs:
+        for n, table in profiles[l].items():
+            assert type(table) is dict
+            assert list(table) == list(trained[l][n])
+    assert train_ngram.top_k_profiles(full, 0) is full
+
+
+def test_entries_store_only_counts_and_log_probs():
+    for table in identify.LANGUAGE_NGRAMS["en"].values():
+        assert all(set(entry) == {"count", "log_prob"} for entry in table.values())
+
+
+def test_sweep_k(tmp_path, monkeypatch, batched_tokenizer):
+    monkeypatch.setattr(evaluate, "TRANSCRIPTION_CACHE", None)
+    snippets = tmp_path / "snippets.txt"
+    snippets.write_text("language\tsentence\tsource (url)\n"
+                        "en\tWhat a beautiful morning it is today.\thttps://example.org\n",
+                        encoding="utf-8")
+
+    report = evaluate.sweep_k(str(snippets), ks=[20, 0], results_path=str(tmp_path / "results"))
+
+    assert set(report) == {20, 0}
+    assert report[0]["tested"] == 1 and report[0]["mean_ms"] > 0
@@ -0,0 +1,125 @@
+import text_to_ipa
+
+
+def setup_function():
+    text_to_ipa.init_translation_cache()
+
+
+def teardown_function():
+    text_to_ipa.init_translation_cache()
+
+
+def test_key_normalizes_whitespace():
+    assert text_to_ipa.translation_key("a  b\tc", "en", "fit") == text_to_ipa.translation_key(" a b c ", "en", "fit")
+    assert text_to_ipa.translation_key("a b", "en", "fit") != text_to_ipa.translation_key("a b", "en", "exact")
+    assert text_to_ipa.translation_key("a b", "en", "fit") != text_to_ipa.translation_key("a b", "es", "fit")
+
+
+def test_memory_tier_is_lru():
+    text_to_ipa.init_translation_cache(max_entries=2)
+    for key in "abc":
+        text_to_ipa.cache_store(key, "en", key.upper())
+
+    assert text_to_ipa.cache_lookup("a") is None
+    assert text_to_ipa.cache_lookup("c") == "C"
+    assert text_to_ipa.translation_cache_stats()["evictions"] == 1
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    db = str(tmp_path / "cache.sqlite")
+    text_to_ipa.init_translation_cache(db_path=db)
+    text_to_ipa.cache_store("key", "en", "ð ə")
+
+    text_to_ipa.init_translation_cache(db_path=db)
+    assert text_to_ipa.cache_lookup("key") == "ð ə"
+    assert text_to_ipa.translation_cache_stats()["disk_hits"] == 1
+
+
+def test_translate_hits_cache(batched_tokenizer):
+    first = text_to_ipa.translate("the house", "en")
+    assert text_to_ipa.translate("the  house", "en") == first
+    stats = text_to_ipa.translation_cache_stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_invalidate_drops_other_versions():
+    text_to_ipa.languages["en"]["ipa_version"] = "old"
+    text_to_ipa.cache_store("key", "en", "ð ə")
+    text_to_ipa.languages["en"]["ipa_version"] = "new"
+    text_to_ipa.invalidate_translations("en")
+
+    assert text_to_ipa.cache_lookup("key") is None
+    text_to_ipa.languages["en"]["ipa_version"] = text_to_ipa.ipa_dictionary_version("en")
+
+
+def test_key_includes_transcription_config():
+    key = text_to_ipa.translation_key("a b", "en", "fit")
+    try:
+        text_to_ipa.init_nearest_word(["en"], 1)
+        assert text_to_ipa.translation_key("a b", "en", "fit") != key
+        assert text_to_ipa.translation_key("a b", "es", "fit") == text_to_ipa.translation_key("a b", "es", "fit")
+    finally:
+        text_to_ipa.init_nearest_word([])
+
+    compact = text_to_ipa.LEXICON_COMPACT
+    try:
+        text_to_ipa.LEXICON_COMPACT = not compact
+        assert text_to_ipa.translation_key("a b", "en", "fit") != key
+    finally:
+        text_to_ipa.LEXICON_COMPACT = compact
+    assert text_to_ipa.translation_key("a b", "en", "fit") == key
+
+
+def test_opening_disk_tier_keeps_memory_tier(tmp_path):
+    text_to_ipa.cache_store("key", "en", "ð ə")
+    text_to_ipa.open_translation_cache_db(str(tmp_path / "cache.sqlite"))
+
+    assert text_to_ipa.translation_cache_db is not None
+    assert text_to_ipa.cache_lookup("key") == "ð ə"
+
+
+def test_transcribe_keeps_callers_cache(tmp_path, monkeypatch, batched_tokenizer):
+    import evaluate
+
+    monkeypatch.setattr(evaluate, "TRANSCRIPTION_CACHE", str(tmp_path / "transcriptions.sqlite"))
+    monkeypatch.setattr(evaluate, "_transcription_cache_pid", None)
+    text_to_ipa.cache_store("key", "en", "ð ə")
+
+    evaluate.transcribe("the house", "en")
+    assert text_to_ipa.cache_lookup("key") == "ð ə"
+    assert text_to_ipa.translation_cache_db is not None
+
+    evaluate.init_transcription_cache(None)
+    assert text_to_ipa.translation_cache_db is None
+    assert text_to_ipa.cache_lookup("key") == "ð ə"
+
+
+def test_threads_share_both_tiers(tmp_path):
+    import threading
+
+    text_to_ipa.init_translation_cache(max_entries=50, db_path=str(tmp_path / "cache.sqlite"))
+    errors = []
+
+    def store(thread):
+        try:
+            for i in range(300):
+                text_to_ipa.cache_store(str(thread) + "-" + str(i), "en", "ð ə")
+                text_to_ipa.cache_lookup(str(thread) + "-" + str(i // 2))
+        except Exception as e:
+            errors.append(e)
+
+    def invalidate():
+        try:
+            for i in range(300):
+                text_to_ipa.invalidate_translations("en")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=store, args=(t,)) for t in range(4)] + [threading.Thread(target=invalidate)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert text_to_ipa.translation_cache_stats()["size"] == 50
@@ -18,7 +18,9 @@ Supports languages:
 [] Cantonese (yue)
 """
 
+import bisect
 import csv
+import io
 import utilities
 from utilities import LANGUAGES, DIACRITICS, ACCENTS, DOCUMENT_PATH, IPA_PATH, NAMED_LANGS, DEBUG
 import nltk
@@ -27,7 +29,15 @@ jieba.setLogLevel(20) # hide initializing message
 from nltk.stem import SnowballStemmer
 import os
 import re
+import hashlib
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
+from lexicon import CompactLexicon, EditIndex, EDIT_DISTANCE, EDIT_MAX_DISTANCE
 
 # Create directory for storing IPA-translated training documents
 IPA_DOCS = "./language-data/ipa-documents/"
@@ -35,24 +45,57 @@ if not os.path.isdir(IPA_DOCS):
 	os.mkdir(IPA_DOCS)
 
 # Save unhandlded token information
+# Note: these count the sentences actually transcribed by ipa_lookup(), so sentences
+# served from the translation cache (see translate()) are not counted again.
 unhandled_sents = {}
 unhandled_tokens = {}
 unhandled_tokens_list = {}
 transcribed_tokens = {}
 contains_word_cases = {}
+nearest_word_cases = {}
+UNHANDLED_LIST_LIMIT = None # max unhandled tokens listed for each language (None: no limit)
 for l in LANGUAGES:
     unhandled_tokens[l] = 0
     unhandled_tokens_list[l] = []
     transcribed_tokens[l] = 0
     unhandled_sents[l] = 0
     contains_word_cases[l] = 0
+    nearest_word_cases[l] = 0
 
 # Organize language files (ipa dictionary csv, document) in dictionary
 # Store built IPA dictionary objects.
 languages = {}
 for l in LANGUAGES:
-    languages[l] = {"ipa_csv": l+".csv", "doc_file": l+".txt", "ipa_dict": {}}
+    languages[l] = {"ipa_csv": l+".csv", "doc_file": l+".txt", "ipa_dict": {}, "ipa_version": None, "edit_index": None}
 languages["en_uk"]["doc_file"] = "en.txt" # exception
+IPA_CHUNK_SIZE = 1 << 20 # bytes of IPA dictionary CSV parsed by each worker (see load_ipa_dictionaries())
+COMPILED_LEXICONS = "./cache/lexicons/" # compact lexicons saved for reuse, by IPA dictionary version (None: not saved)
+ipa_versions = {} # IPA dictionary CSV path : ((mtime, size), version), so unchanged CSVs are hashed once
+
+# Nearest-word fallback for unknown tokens (see init_nearest_word())
+NEAREST_WORD_LANGS = set() # languages using the fallback
+NEAREST_WORD_DISTANCE = EDIT_DISTANCE # max edit distance to the nearest headword
+
+# Cache of translated sentences: in-memory LRU tier, with an optional on-disk (SQLite) tier.
+# Keyed by (language, mode, normalized sentence, IPA dictionary version).
+TRANSLATION_CACHE_SIZE = 10000 # max entries kept in memory
+TRANSLATION_CACHE_DISK_SIZE = 1000000 # max entries kept on disk
+translation_cache = OrderedDict()
+translation_cache_db = None
+translation_cache_disk_count = 0 # entries on disk, counted at init and updated on store
+translation_cache_lock = threading.Lock() # both tiers are shared by threads loading and translating
+cache_stats = {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0, "disk_evictions": 0}
+
+# Lexicon manager: IPA dictionaries are loaded on first use and the least recently
+# used ones are evicted when their approximate memory use exceeds the budget.
+LEXICON_MEMORY_BUDGET = None # max bytes of loaded IPA dictionaries (None: no limit)
+LEXICON_COMPACT = False # load IPA dictionaries as lexicon.CompactLexicon
+LEXICON_POLICY = "evict" # when over budget: "evict" other dictionaries, or "refuse" to load
+LEXICON_SIZE_RATIOS = {False: 6, True: 1.5} # approximate bytes in memory per byte of IPA dictionary CSV (dict, CompactLexicon)
+loaded_lexicons = OrderedDict() # language : approximate bytes, least recently used first
+lexicon_lock = threading.Lock()
+lexicon_loading = {l: threading.Lock() for l in LANGUAGES} # one load at a time per language
+lexicon_stats = {"loads": 0, "hits": 0, "evictions": 0, "prefetches": 0, "refused": 0}
 
 
 
@@ -139,13 +182,23 @@ def clean_ipa(transcription):
     return cleaned
 
 # Initialize IPA dictionaries for all languages
-def init_ipa_dictionary(language):
+def init_ipa_dictionary(language, compact=False):
     """
     Create dictionary object using IPA dictionary CSV files.
 
     param: language, the string language abbreviation
+    param: compact, default False. If True, store the dictionary as a read-only
+                    lexicon.CompactLexicon, which uses several times less memory
+                    than a dict but is slower to look up
     returns: ipa_dict, the dictionary of string word : string IPA transcription(s) pairs
     """
+    # Reuse a compiled lexicon of the same IPA dictionary version, if saved
+    version = ipa_dictionary_version(language)
+    if compact and COMPILED_LEXICONS:
+        lexicon_path = compiled_lexicon_path(language, version)
+        if os.path.isfile(lexicon_path):
+            return store_ipa_dictionary(language, CompactLexicon.load(lexicon_path), compact, version)
+
     # IPA CSV file path 
     #ipa = IPA_PATH + languages[language]["ipa_csv"]
     ipa = IPA_PATH + language + ".csv"
@@ -170,29 +223,669 @@ def init_ipa_dictionary(language):
 
             # Add token-transcription pair to dictionary
             ipa_dict[token] = transcription
+
+    return store_ipa_dictionary(language, ipa_dict, compact, version)
+
+def store_ipa_dictionary(language, ipa_dict, compact=False, version=None):
+    """
+    Store a loaded IPA dictionary as the dictionary of a language.
+
+    param: language, the string language abbreviation
+    param: ipa_dict, the dictionary of string word : string IPA transcription(s) pairs
+    param: compact, default False. If True, store as a lexicon.CompactLexicon
+    param: version, (optional) the string version of the IPA dictionary CSV it was loaded from,
+                    if already computed (see ipa_dictionary_version())
+    returns: ipa_dict, the stored dictionary
+    """
+    # Version the dictionary by its contents, so cached translations
+    # made with an older version of the CSV are never reused
+    languages[language]["ipa_version"] = version or ipa_dictionary_version(language)
+
+    if compact:
+        ipa_dict = compile_lexicon(language, ipa_dict)
     
-    # Add dictionary object to global variable
+    # Add dictionary object to global variable (if within the memory budget)
+    track_lexicon(language, ipa_dict)
     languages[language]["ipa_dict"] = ipa_dict
+    languages[language]["edit_index"] = None
+
+    invalidate_translations(language)
     
     return ipa_dict
 
+def current_ipa_version(language):
+    """
+    Returns the version of a language's IPA dictionary (see ipa_dictionary_version()),
+    as computed when it was last loaded, or now if it was never loaded.
+    """
+    if languages[language]["ipa_version"] is None:
+        languages[language]["ipa_version"] = ipa_dictionary_version(language)
+
+    return languages[language]["ipa_version"]
+
+def compiled_lexicon_path(language, version=None):
+    """
+    Returns the path of the compiled lexicon of a version of a language's IPA dictionary
+    (default: the current version, see current_ipa_version()).
+    """
+    version = version or current_ipa_version(language)
+    return COMPILED_LEXICONS + language + "-" + version[:16] + ".lex"
+
+def compiled_edit_index_path(language):
+    """
+    Returns the path of the saved edit index of the current version of a language's IPA dictionary,
+    for dictionaries that are not compact (see get_edit_index()).
+    """
+    return COMPILED_LEXICONS + language + "-" + current_ipa_version(language)[:16] + ".edits"
+
+def save_compiled(language, path, save):
+    """
+    Save a compiled lexicon or edit index of a language to a path in COMPILED_LEXICONS,
+    replacing those of older versions of its IPA dictionary (files with the same extension).
+
+    param: language, the string language abbreviation
+    param: path, the string path (see compiled_lexicon_path(), compiled_edit_index_path())
+    param: save, a function taking the string path to save to
+    """
+    if not os.path.isdir(COMPILED_LEXICONS):
+        os.makedirs(COMPILED_LEXICONS)
+    extension = os.path.splitext(path)[1]
+    for name in os.listdir(COMPILED_LEXICONS):
+        if name.startswith(language + "-") and name.endswith(extension):
+            os.remove(COMPILED_LEXICONS + name)
+    
+    # Write to a temporary file first, so a partly written file is never loaded
+    save(path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+def compile_lexicon(language, ipa_dict):
+    """
+    Compress an IPA dictionary into a lexicon.CompactLexicon, with an edit index
+    if the language uses the nearest-word fallback (see init_nearest_word()).
+    Saves the lexicon to COMPILED_LEXICONS (if set), replacing older versions,
+    so it is built only once for each version of the IPA dictionary.
+
+    param: language, the string language abbreviation
+    param: ipa_dict, the dictionary of string word : string IPA transcription(s) pairs,
+                     or an already compiled lexicon.CompactLexicon
+    returns: lexicon, the lexicon.CompactLexicon
+    """
+    lexicon = ipa_dict if isinstance(ipa_dict, CompactLexicon) else CompactLexicon(ipa_dict)
+    changed = lexicon is not ipa_dict
+
+    if language in NEAREST_WORD_LANGS and (lexicon.edit_index is None 
+                                           or lexicon.edit_index.max_distance < NEAREST_WORD_DISTANCE):
+        lexicon.build_edit_index(NEAREST_WORD_DISTANCE)
+        changed = True
+
+    if changed and COMPILED_LEXICONS:
+        save_compiled(language, compiled_lexicon_path(language), lexicon.save)
+
+    return lexicon
+
+# Load IPA dictionaries in parallel
+def load_ipa_dictionaries(langs=LANGUAGES, workers=None, chunk_size=IPA_CHUNK_SIZE, compact=False):
+    """
+    Load the IPA dictionaries of several languages at once, parsing chunks of 
+    each CSV file in a pool of processes. Gives the same dictionaries as
+    init_ipa_dictionary() (for repeated tokens, the last entry wins).
+    Languages without an IPA dictionary file are skipped.
+
+    param: langs, a list of string language abbreviations
+    param: workers, (optional) the int number of processes (default: number of CPUs)
+    param: chunk_size, the int approximate number of bytes in each chunk
+    param: compact, default False. If True, store dictionaries as lexicon.CompactLexicon
+    returns: ipa_dicts, a dictionary of language : IPA dictionary
+    """
+    langs = [l for l in langs if os.path.isfile(IPA_PATH + languages[l]["ipa_csv"])]
+    jobs = [(l, IPA_PATH + languages[l]["ipa_csv"], start, end) 
+            for l in langs for start, end in ipa_csv_chunks(IPA_PATH + languages[l]["ipa_csv"], chunk_size)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        parsed = [parse_ipa_chunk(path, start, end) for l, path, start, end in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parsed = list(executor.map(parse_ipa_chunk, *zip(*[job[1:] for job in jobs])))
+
+    # Merge chunks in file order, so later entries replace earlier ones
+    merged = {l: {} for l in langs}
+    for (l, path, start, end), chunk in zip(jobs, parsed):
+        merged[l].update(chunk)
+
+    return {l: store_ipa_dictionary(l, merged[l], compact) for l in langs}
+
+def ipa_csv_chunks(ipa, chunk_size=IPA_CHUNK_SIZE):
+    """
+    Split an IPA dictionary CSV file (after its heading) into byte ranges of whole rows.
+    Ranges end after a newline that is not inside a quoted field.
+
+    param: ipa, the string path to the CSV file
+    param: chunk_size, the int approximate number of bytes in each chunk
+    returns: chunks, a list of (int start, int end) byte offsets
+    """
+    with open(ipa, "rb") as ipa_csv:
+        data = ipa_csv.read()
+
+    start = data.find(b"\n") + 1 # skip heading
+    if not start:
+        return []
+
+    chunks = []
+    quotes = 0 # number of quote characters before start (odd: inside a quoted field)
+    while start < len(data):
+        end = data.find(b"\n", min(start + chunk_size, len(data)) - 1)
+        while end != -1 and (quotes + data.count(b'"', start, end)) % 2:
+            end = data.find(b"\n", end + 1) # newline is inside a quoted field
+        end = len(data) if end == -1 else end + 1
+
+        quotes += data.count(b'"', start, end)
+        chunks.append((start, end))
+        start = end
+
+    return chunks
+
+def parse_ipa_chunk(ipa, start, end):
+    """
+    Parse and clean the rows of an IPA dictionary CSV file in a byte range (see ipa_csv_chunks()).
+    Returns a dictionary of string word : string IPA transcription.
+    """
+    with open(ipa, "rb") as ipa_csv:
+        ipa_csv.seek(start)
+        text = ipa_csv.read(end - start).decode("utf-8")
+
+    ipa_dict = {}
+    for entry in csv.reader(io.StringIO(text, newline="")):
+        ipa_dict[entry[0].lower()] = clean_ipa("".join(entry[1:]))
+
+    return ipa_dict
+
+# Compute a version string for an IPA dictionary CSV file
+def ipa_dictionary_version(language):
+    """
+    Returns a hash of the contents of the IPA dictionary CSV file for a language.
+    The hash changes whenever the dictionary file changes. The file is only hashed
+    again if its modification time or size changed since it was last hashed.
+
+    param: language, the string language abbreviation
+    returns: version, the string hex digest of the file contents
+    """
+    ipa = IPA_PATH + language + ".csv"
+    stat = os.stat(ipa)
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    known = ipa_versions.get(ipa)
+    if known is not None and known[0] == signature:
+        return known[1]
+
+    version = hash_ipa_dictionary(ipa)
+    ipa_versions[ipa] = (signature, version)
+
+    return version
+
+def hash_ipa_dictionary(path):
+    """
+    Returns the string hex digest of the contents of an IPA dictionary CSV file.
+    """
+    with open(path, "rb") as ipa_csv:
+        return hashlib.sha1(ipa_csv.read()).hexdigest()
+
+
+
+"""
+Translation cache functions
+"""
+
+def init_translation_cache(max_entries=TRANSLATION_CACHE_SIZE, db_path=None, max_disk_entries=TRANSLATION_CACHE_DISK_SIZE):
+    """
+    (Re)initialize the translation cache used by translate().
+    Clears the in-memory tier and resets hit/miss counters.
+
+    param: max_entries, int max number of translations kept in memory
+    param: db_path, (optional) string path to a SQLite file for the on-disk tier,
+                    which keeps translations across restarts. Default None (memory only).
+    param: max_disk_entries, int max number of translations kept on disk
+    """
+    global TRANSLATION_CACHE_SIZE, TRANSLATION_CACHE_DISK_SIZE
+
+    TRANSLATION_CACHE_SIZE = max_entries
+    TRANSLATION_CACHE_DISK_SIZE = max_disk_entries
+    with translation_cache_lock:
+        translation_cache.clear()
+        for stat in cache_stats:
+            cache_stats[stat] = 0
+
+    open_translation_cache_db(db_path)
+
+def open_translation_cache_db(db_path):
+    """
+    Open (or close, if db_path is None) the on-disk tier of the translation cache,
+    keeping the in-memory tier and hit/miss counters (see init_translation_cache()).
+
+    param: db_path, string path to a SQLite file for the on-disk tier, or None
+    """
+    global translation_cache_db, translation_cache_disk_count
+
+    with translation_cache_lock:
+        if translation_cache_db is not None:
+            translation_cache_db.close()
+            translation_cache_db = None
+
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+
+            # Several processes (e.g. evaluation workers) may share the file
+            translation_cache_db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+            translation_cache_db.execute("PRAGMA journal_mode=WAL")
+            translation_cache_db.execute("CREATE TABLE IF NOT EXISTS translations "
+                                         "(key TEXT PRIMARY KEY, lang TEXT, version TEXT, ipa TEXT, accessed REAL)")
+            translation_cache_db.execute("CREATE INDEX IF NOT EXISTS translations_accessed ON translations (accessed)")
+            translation_cache_db.commit()
+            translation_cache_disk_count = translation_cache_db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    # Drop entries made with dictionaries that have since changed
+    if db_path:
+        for l in LANGUAGES:
+            if languages[l]["ipa_version"]:
+                invalidate_translations(l)
+
+def translation_key(sentence, lang, mode):
+    """
+    Returns the cache key for translating a sentence in a given language and mode,
+    with the current transcription configuration: the nearest-word fallback for the
+    language (see init_nearest_word()) and the lexicon backend (see init_lexicon_manager()).
+    Sentences are normalized by collapsing whitespace, which does not change tokenization.
+
+    param: sentence, the string sentence
+    param: lang, the string language abbreviation
+    param: mode, the string translation mode ("fit" or "exact")
+    return: key, the string hex digest key
+    """
+    normalized = " ".join(sentence.split())
+    version = languages[lang]["ipa_version"]
+    nearest_word = NEAREST_WORD_DISTANCE if lang in NEAREST_WORD_LANGS else None
+    backend = "compact" if LEXICON_COMPACT else "dict"
+    key = "\t".join([lang, mode, str(version), str(nearest_word), backend, normalized])
+
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+def cache_lookup(key):
+    """
+    Look up a cached translation, first in memory, then on disk.
+    Returns the string IPA translation, or None if not cached.
+    """
+    with translation_cache_lock:
+        if key in translation_cache:
+            translation_cache.move_to_end(key) # mark as most recently used
+            cache_stats["hits"] += 1
+            return translation_cache[key][2]
+
+        if translation_cache_db is not None:
+            row = translation_cache_db.execute("SELECT lang, version, ipa FROM translations WHERE key = ?", (key,)).fetchone()
+            if row:
+                translation_cache_db.execute("UPDATE translations SET accessed = ? WHERE key = ?", (time.time(), key))
+                translation_cache_db.commit()
+                cache_stats["hits"] += 1
+                cache_stats["disk_hits"] += 1
+            
+                # Promote to the in-memory tier
+                _cache_in_memory(key, row[0], row[2])
+                return row[2]
+
+        cache_stats["misses"] += 1
+        return None
+
+def cache_store(key, lang, ipa):
+    """
+    Store a translation in the cache (in memory, and on disk if enabled).
+    Evicts least recently used entries when a tier is full.
+    """
+    global translation_cache_disk_count
+
+    with translation_cache_lock:
+        _cache_in_memory(key, lang, ipa)
+
+        if translation_cache_db is not None:
+            translation_cache_db.execute("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)",
+                                         (key, lang, languages[lang]["ipa_version"], ipa, time.time()))
+            translation_cache_disk_count += 1
+        
+            # Evict least recently used 10% of entries when disk tier is full
+            # (only counting entries again when the running count says it may be)
+            size = translation_cache_disk_count
+            if size > TRANSLATION_CACHE_DISK_SIZE:
+                size = translation_cache_db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+                translation_cache_disk_count = size
+            if size > TRANSLATION_CACHE_DISK_SIZE:
+                n_evict = max(size - TRANSLATION_CACHE_DISK_SIZE, TRANSLATION_CACHE_DISK_SIZE // 10)
+                translation_cache_db.execute("DELETE FROM translations WHERE key IN "
+                                             "(SELECT key FROM translations ORDER BY accessed LIMIT ?)", (n_evict,))
+                cache_stats["disk_evictions"] += n_evict
+                translation_cache_disk_count -= n_evict
+            translation_cache_db.commit()
+
+def _cache_in_memory(key, lang, ipa):
+    """
+    Store a translation in the in-memory LRU tier. Call with translation_cache_lock held.
+    """
+    translation_cache[key] = (lang, languages[lang]["ipa_version"], ipa)
+    translation_cache.move_to_end(key)
+
+    while len(translation_cache) > TRANSLATION_CACHE_SIZE:
+        translation_cache.popitem(last=False) # least recently used
+        cache_stats["evictions"] += 1
+
+def invalidate_translations(lang):
+    """
+    Remove cached translations for a language that were made 
+    with a different version of its IPA dictionary.
+    """
+    with translation_cache_lock:
+        version = languages[lang]["ipa_version"]
+
+        stale = [key for key, (l, v, ipa) in translation_cache.items() if l == lang and v != version]
+        for key in stale:
+            del translation_cache[key]
+
+        if translation_cache_db is not None:
+            translation_cache_db.execute("DELETE FROM translations WHERE lang = ? AND version IS NOT ?", (lang, version))
+            translation_cache_db.commit()
+
+def translation_cache_stats():
+    """
+    Returns a dictionary of translation cache counters and sizes.
+    """
+    with translation_cache_lock:
+        stats = dict(cache_stats)
+        stats["size"] = len(translation_cache)
+        if translation_cache_db is not None:
+            stats["disk_size"] = translation_cache_db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"]/lookups if lookups else 0.0
+
+    return stats
+
+
+
+
+"""
+Lexicon manager functions
+"""
+
+def init_lexicon_manager(memory_budget=None, compact=False, policy="evict", reset_stats=True):
+    """
+    (Re)initialize the lexicon manager, which loads IPA dictionaries on first use
+    and evicts the least recently used ones to stay within a memory budget.
+    Already loaded dictionaries are kept, and evicted if over the new budget.
+
+    param: memory_budget, (optional) int max bytes of loaded IPA dictionaries. Default None (no limit).
+    param: compact, default False. If True, load dictionaries as lexicon.CompactLexicon
+    param: policy, default "evict". What to do when loading a dictionary goes over budget:
+                "evict": evict least recently used dictionaries of other languages
+                "refuse": keep the loaded dictionaries, and raise MemoryError instead of loading
+    param: reset_stats, default True, reset the lexicon manager counters (see lexicon_manager_stats())
+    """
+    global LEXICON_MEMORY_BUDGET, LEXICON_COMPACT, LEXICON_POLICY
+
+    if policy not in ("evict", "refuse"):
+        raise ValueError("policy must be \"evict\" or \"refuse\"")
+
+    LEXICON_MEMORY_BUDGET = memory_budget
+    LEXICON_COMPACT = compact
+    LEXICON_POLICY = policy
+    if reset_stats:
+        for stat in lexicon_stats:
+            lexicon_stats[stat] = 0
+
+    with lexicon_lock:
+        _evict_lexicons()
+
+def lexicon_size(ipa_dict):
+    """
+    Returns the approximate memory size in bytes of an IPA dictionary
+    (a dict of strings, or a lexicon.CompactLexicon).
+    """
+    if isinstance(ipa_dict, CompactLexicon):
+        return ipa_dict.nbytes()
+
+    size = sys.getsizeof(ipa_dict)
+    for token, transcription in ipa_dict.items():
+        size += sys.getsizeof(token) + sys.getsizeof(transcription)
+    return size
+
+def get_ipa_dictionary(lang):
+    """
+    Returns the IPA dictionary for a language, loading it if needed.
+    
+    param: lang, the string language abbreviation
+    returns: ipa_dict, the dictionary of string word : string IPA transcription(s) pairs
+    """
+    ipa_dict = languages[lang]["ipa_dict"]
+    if ipa_dict:
+        with lexicon_lock:
+            if lang in loaded_lexicons:
+                loaded_lexicons.move_to_end(lang) # mark as most recently used
+            lexicon_stats["hits"] += 1
+        return ipa_dict
+
+    # Only load each dictionary once, even if requested by several threads
+    with lexicon_loading[lang]:
+        ipa_dict = languages[lang]["ipa_dict"]
+        if not ipa_dict:
+            reserve_lexicon(lang, estimate_lexicon_size(lang, LEXICON_COMPACT))
+            ipa_dict = init_ipa_dictionary(lang, LEXICON_COMPACT)
+
+    return ipa_dict
+
+def estimate_lexicon_size(lang, compact=False):
+    """
+    Returns an estimate of the memory size in bytes of a language's IPA dictionary
+    before it is loaded, from the size of its CSV file (see LEXICON_SIZE_RATIOS).
+    """
+    return int(os.path.getsize(IPA_PATH + lang + ".csv") * LEXICON_SIZE_RATIOS[compact])
+
+def reserve_lexicon(lang, size):
+    """
+    Make room within the memory budget for an IPA dictionary about to be loaded,
+    by evicting least recently used dictionaries of other languages first,
+    so memory use does not peak over the budget while it loads.
+    With the "refuse" policy, raises MemoryError instead if it would not fit.
+    """
+    with lexicon_lock:
+        if LEXICON_POLICY == "evict":
+            _evict_lexicons(reserve=size)
+        elif LEXICON_MEMORY_BUDGET is not None and sum(loaded_lexicons.values()) + size > LEXICON_MEMORY_BUDGET:
+            lexicon_stats["refused"] += 1
+            raise MemoryError("Loading the " + lang + " IPA dictionary (about " + str(size) + " bytes) "
+                              "would exceed the lexicon memory budget (" + str(LEXICON_MEMORY_BUDGET) + " bytes)")
+
+def track_lexicon(lang, ipa_dict):
+    """
+    Record a newly loaded IPA dictionary, evicting least recently used
+    dictionaries of other languages if over the memory budget.
+    With the "refuse" policy, raises MemoryError instead if over the budget.
+    """
+    size = lexicon_size(ipa_dict)
+
+    with lexicon_lock:
+        if LEXICON_POLICY == "refuse" and LEXICON_MEMORY_BUDGET is not None:
+            others = sum(s for l, s in loaded_lexicons.items() if l != lang)
+            if others + size > LEXICON_MEMORY_BUDGET:
+                lexicon_stats["refused"] += 1
+                raise MemoryError("Loading the " + lang + " IPA dictionary (" + str(size) + " bytes) "
+                                  "would exceed the lexicon memory budget (" + str(LEXICON_MEMORY_BUDGET) + " bytes)")
+
+        loaded_lexicons[lang] = size
+        loaded_lexicons.move_to_end(lang)
+        lexicon_stats["loads"] += 1
+        _evict_lexicons()
+
+def _evict_lexicons(reserve=0):
+    """
+    Evict least recently used IPA dictionaries until within the memory budget,
+    leaving room for reserve bytes of a dictionary about to be loaded (see reserve_lexicon()).
+    Unless reserving, the most recently used dictionary is always kept. Call with lexicon_lock held.
+    """
+    if LEXICON_MEMORY_BUDGET is None:
+        return
+
+    keep = 0 if reserve else 1
+    while len(loaded_lexicons) > keep and sum(loaded_lexicons.values()) + reserve > LEXICON_MEMORY_BUDGET:
+        lang, size = loaded_lexicons.popitem(last=False)
+        languages[lang]["ipa_dict"] = {}
+        languages[lang]["edit_index"] = None
+        lexicon_stats["evictions"] += 1
+
+def prefetch_lexicons(langs):
+    """
+    Load the IPA dictionaries of languages expected to be needed soon, in a background thread.
+    Dictionaries are loaded in the given order, and are subject to the memory budget.
+
+    param: langs, a list of string language abbreviations
+    returns: the started daemon thread (join() it to wait for loading)
+    """
+    def prefetch():
+        for lang in langs:
+            if not languages[lang]["ipa_dict"]:
+                try:
+                    get_ipa_dictionary(lang)
+                except MemoryError:
+                    return # refused: over the memory budget
+                except Exception as e:
+                    print("Could not prefetch the IPA dictionary for", lang + ":", repr(e), file=sys.stderr)
+                    continue
+                with lexicon_lock:
+                    lexicon_stats["prefetches"] += 1
+
+    thread = threading.Thread(target=prefetch, daemon=True)
+    thread.start()
+    return thread
+
+def lexicon_manager_stats():
+    """
+    Returns a dictionary of lexicon manager counters, and the approximate
+    memory use of each loaded IPA dictionary.
+    """
+    with lexicon_lock:
+        stats = dict(lexicon_stats)
+        stats["loaded"] = dict(loaded_lexicons)
+        stats["memory"] = sum(loaded_lexicons.values())
+    stats["budget"] = LEXICON_MEMORY_BUDGET
+
+    return stats
+
 
 
 """
 Conversion functions
 """
 
-def tokenize_sentences(sentences, language="en"):
+# Precompiled regexes for the batched word tokenizer (see fast_word_tokenize()).
+# These follow the rules of nltk's word_tokenize (NLTKWordTokenizer with Punkt sentence splitting),
+# applied in a few passes over a whole batch of newline-separated sentences.
+_SPLIT_CHARS = re.compile(r"[«»“”‘’„;@#$%&?!*()\[\]{}<>]|`+|\.{2,}|--|[:,](?!\d)")
+_START_QUOTE = re.compile(r'(^|(?<=[\s(\[{<`]))"', re.M)
+_END_QUOTE = re.compile(r'"')
+_SINGLE_QUOTE = re.compile(r"(?i)(?<=\S)'(?!re|ve|ll|m|t|s|d)(?=\w\b)")
+_FINAL_PERIOD = re.compile(r"(?<=[^\s.])\.(?=[\]\)}>\"']*(?:[ \t]|$))", re.M)
+_ABBREVIATION = re.compile(r"(?<!\S)(\w\.(?:\w\.)+|[^\W\d_]\.|\d+\.)(?=[ \t]*(\S))")
+_CLITICS = re.compile(r"(?<=[^'\s])('[sSmMdD]|'ll|'LL|'re|'RE|'ve|'VE|n't|N'T|')(?=[ \t]|$)", re.M)
+_CONTRACTIONS = re.compile(r"(?i)\b(can)(not)\b|\b(d)('ye)\b|\b(gim)(me)\b|\b(gon)(na)\b|\b(got)(ta)\b|\b(lem)(me)\b|\b(mor)('n)\b|\b(wan)(na)(?=\s)")
+_ABBREVIATION_MARK = "\u0000"
+
+def fast_word_tokenize(sentences):
+    """
+    Tokenize a list of sentences with precompiled regexes, processing the whole list at once.
+    Gives the same tokens as nltk.tokenize.word_tokenize on our corpora, without
+    re-running Punkt sentence splitting for every sentence.
+
+    Note: word-final periods are split off as sentence ends, except after initials, numbered
+    items (e.g. "1.") and dotted abbreviations (e.g. "u.s.") followed by a lowercase word, 
+    which Punkt also keeps together.
+
+    param: sentences, a list of string sentences
+    returns: tokens_list, a list of string tokens for each sentence
+    """
+    # Process the batch as one newline-separated string
+    text = "\n".join(s.replace("\r", " ").replace("\n", " ") for s in sentences)
+
+    # Protect abbreviations from having their final period split off,
+    # when the next word is lowercase (Punkt's orthographic heuristic)
+    text = _ABBREVIATION.sub(lambda m: m.group(1)[:-1] + _ABBREVIATION_MARK if m.group(2).islower() else m.group(1), text)
+
+    # Quotes
+    text = _START_QUOTE.sub(" `` ", text)
+    text = _END_QUOTE.sub(" '' ", text)
+    text = _SINGLE_QUOTE.sub("' ", text)
+
+    # Punctuation and sentence-final periods
+    text = _SPLIT_CHARS.sub(r" \g<0> ", text)
+    text = _FINAL_PERIOD.sub(" . ", text)
+
+    # Clitics and contractions
+    text = _CLITICS.sub(r" \1", text)
+    text = _CONTRACTIONS.sub(lambda m: " " + " ".join(g for g in m.groups() if g) + " ", text)
+
+    text = text.replace(_ABBREVIATION_MARK, ".")
+    tokens_list = [line.split() for line in text.split("\n")]
+
+    return tokens_list
+
+def jieba_parallel_tokenize(sentences, workers=None):
+    """
+    Tokenize a list of Cantonese sentences with jieba's parallel mode,
+    cutting the whole list across a pool of processes at once.
+    Gives the same tokens as jieba.tokenize for each sentence.
+
+    param: sentences, a list of string sentences
+    param: workers, (optional) the int number of processes (default: number of CPUs)
+    returns: tokens_list, a list of string tokens for each sentence
+    """
+    # Each sentence is one line of the batch
+    text = "\n".join(s.replace("\r", " ").replace("\n", " ") for s in sentences)
+
+    # Note: parallel mode is only supported on POSIX systems
+    if os.name == "posix":
+        jieba.enable_parallel(workers)
+    try:
+        tokens = list(jieba.cut(text))
+    finally:
+        if os.name == "posix":
+            jieba.disable_parallel()
+
+    # Split tokens back into sentences at the newline tokens
+    tokens_list = [[]]
+    for tk in tokens:
+        if tk == "\n":
+            tokens_list.append([])
+        else:
+            tokens_list[-1].append(tk)
+
+    return tokens_list
+
+def tokenize_sentences(sentences, language="en", batched=False, workers=None):
     """
     Tokenize each sentence in a list of sentences, based on the given language.
 
     param: sentences, a list of string sentences
     param: language, a string language acronym, 
                     default "en" for English and Latin alphabet languages
+    param: batched, default False. If True, tokenize the whole list at once
+                    (see fast_word_tokenize() and jieba_parallel_tokenize()),
+                    which is much faster for long lists of sentences.
+    param: workers, (optional) the int number of processes for batched Cantonese tokenizing
     returns: tokens_list, a list of string tokens t for each sentence s (a txs sized array)
     """
     tokens_list = []
 
+    if batched and sentences:
+        if language=="yue":
+            return jieba_parallel_tokenize(sentences, workers)
+        return fast_word_tokenize(sentences)
+
     # Use a different method to tokenize Cantonese
     if language=="yue": 
         for s in sentences:
@@ -240,20 +933,32 @@ def similar_word_ipa(token, ipa_dict, lang):
     languanges, only looks at trimmed tokens > 1 char.
     """
     ipa = ""
-    for i in range(len(token),-1,-1):
-        trimmed = token[:i]
+    for trimmed in similar_word_parts(token, ipa_dict, lang):
+        ipa += ipa_dict[trimmed]
+        ipa += "   " if lang=="yue" else " " # for yue ipa-dict formatting
 
-        # Note: only allow logographic languages to be trimmed to a single char
-        if trimmed in ipa_dict and (len(trimmed)>1 or lang=="yue"):
-            ipa += ipa_dict[trimmed]
-            ipa += "   " if lang=="yue" else " " # for yue ipa-dict formatting
+    return ipa
 
-            ending = token.replace(trimmed,"",1)
-            ipa += similar_word_ipa(ending, ipa_dict, lang)
-            
-            return ipa # Return IPA here, since further trims aren't needed
+def similar_word_parts(token, ipa_dict, lang):
+    """
+    Returns the list of tokens in the ipa_dict that similar_word_ipa() uses for a token:
+    the longest one the token starts with, then the longest one the rest of the token
+    starts with, and so on, until the rest of the token starts with none.
+    """
+    parts = []
+    while token:
+        for i in range(len(token),0,-1):
+            trimmed = token[:i]
+
+            # Note: only allow logographic languages to be trimmed to a single char
+            if trimmed in ipa_dict and (len(trimmed)>1 or lang=="yue"):
+                parts.append(trimmed)
+                token = token[i:]
+                break # further trims aren't needed
+        else:
+            break
 
-    return ipa
+    return parts
 
 def contains_word_ipa(token, ipa_dict, lang):
     """
@@ -274,10 +979,14 @@ def contains_word_ipa(token, ipa_dict, lang):
     """
     ipa = ""
     possible = []
-    for tok in ipa_dict.keys():
-        if token in tok and tok.startswith(token):
-            possible.append(tok)
-    
+    if isinstance(ipa_dict, CompactLexicon):
+        # Headwords are sorted, so those starting with the token are found by binary search
+        possible = [tok for tok, transcription in ipa_dict.prefix_search(token)]
+    else:
+        for tok in ipa_dict.keys():
+            if token in tok and tok.startswith(token):
+                possible.append(tok)
+
     if possible: # If a containing token has been found
         shortest = min(possible, key = lambda x:len(x))
         diff = len(shortest) - len(token)
@@ -287,10 +996,155 @@ def contains_word_ipa(token, ipa_dict, lang):
 
     return (ipa, None)
 
+def contains_word_ipa_bulk(tokens, ipa_dict, lang):
+    """
+    Applies contains_word_ipa() to many tokens at once, with a single merge of the
+    sorted tokens against the sorted headwords of the ipa_dict, instead of a scan 
+    of the whole ipa_dict for each token.
+
+    Gives the same results as contains_word_ipa() (among shortest similar tokens
+    of equal length, the first in the ipa_dict is used).
+
+    param: tokens, an iterable of string tokens
+    param: ipa_dict, the dictionary ipa dictionary for the given language
+    param: lang, the string language abbreviation in use
+    return: found, a dictionary of token : (ipa, shortest), as returned by contains_word_ipa()
+    """
+    headwords = sorted(ipa_dict) # (already sorted for a lexicon.CompactLexicon)
+    positions = None # headword : position in the ipa_dict, only built to break ties
+    
+    found = {}
+    start = 0
+    for token in sorted(set(tokens)):
+        if not token:
+            found[token] = ("", None) # (contained in no token)
+            continue
+
+        # Headwords starting with the token follow it in sorted order
+        start = bisect.bisect_left(headwords, token, start)
+        possible = []
+        for i in range(start, len(headwords)):
+            tok = headwords[i]
+            if not tok.startswith(token):
+                break
+            if not possible or len(tok) < len(possible[0]):
+                possible = [tok]
+            elif len(tok) == len(possible[0]):
+                possible.append(tok)
+
+        if not possible:
+            found[token] = ("", None)
+            continue
+        
+        shortest = possible[0]
+        if len(possible) > 1:
+            if positions is None:
+                positions = {tok: i for i, tok in enumerate(ipa_dict)}
+            shortest = min(possible, key = lambda x:positions[x])
+        
+        diff = len(shortest) - len(token)
+        found[token] = (ipa_dict[shortest][:-diff], shortest)
+
+    return found
+
+def init_nearest_word(langs, max_distance=EDIT_DISTANCE):
+    """
+    Choose the languages whose unknown tokens may be transcribed as their nearest
+    headword in the IPA dictionary (see nearest_word_ipa()), when no other heuristic
+    finds IPA for them. This finds simple typos and spelling variants.
+
+    Each dictionary gets an edit index, built on first use and saved to COMPILED_LEXICONS:
+    for compact dictionaries (see init_lexicon_manager()), with the compiled lexicon 
+    (see compile_lexicon()), else on its own (see get_edit_index()).
+
+    Translations cached before are not reused, as the fallback is part of their key
+    (see translation_key()).
+
+    param: langs, the list of string language abbreviations (empty to turn the fallback off)
+    param: max_distance, int max edit distance to the nearest headword 
+                         (at most lexicon.EDIT_MAX_DISTANCE; at most 2 recommended)
+    """
+    global NEAREST_WORD_LANGS, NEAREST_WORD_DISTANCE
+
+    if not 0 <= max_distance <= EDIT_MAX_DISTANCE:
+        raise ValueError("max_distance must be between 0 and " + str(EDIT_MAX_DISTANCE) + ", not " + str(max_distance))
+
+    NEAREST_WORD_LANGS = set(langs)
+    NEAREST_WORD_DISTANCE = max_distance
+    for l in LANGUAGES:
+        languages[l]["edit_index"] = None
+
+def get_edit_index(lang, ipa_dict):
+    """
+    Returns the edit index of a language's IPA dictionary, as (lexicon.EditIndex, headwords),
+    where headwords is the sorted list of indexed headwords. Loaded from COMPILED_LEXICONS
+    (if saved for the current version of the dictionary), or built and saved there on first use.
+    """
+    with lexicon_loading[lang]:
+        edit_index = languages[lang]["edit_index"]
+        if edit_index is None:
+            headwords = sorted(ipa_dict)
+            index = None
+            if COMPILED_LEXICONS:
+                index_path = compiled_edit_index_path(lang)
+                if os.path.isfile(index_path):
+                    index = EditIndex.load(index_path)
+                    if index.max_distance < NEAREST_WORD_DISTANCE or len(index) != len(headwords):
+                        index = None
+
+            if index is None:
+                index = EditIndex(headwords, NEAREST_WORD_DISTANCE)
+                if COMPILED_LEXICONS:
+                    save_compiled(lang, compiled_edit_index_path(lang), index.save)
+
+            edit_index = (index, headwords)
+            languages[lang]["edit_index"] = edit_index
+
+            with lexicon_lock:
+                if lang in loaded_lexicons:
+                    loaded_lexicons[lang] += edit_index[0].nbytes() + sys.getsizeof(headwords)
+    
+    return edit_index
+
+def nearest_word_ipa(token, ipa_dict, lang):
+    """
+    Finds the IPA of the nearest headword to a token in the ipa_dict: the headword with the
+    fewest edits (inserted, deleted, substituted or swapped letters) from the token,
+    up to NEAREST_WORD_DISTANCE edits (see init_nearest_word()).
+
+    Note: this is meant for typos and spelling variants, and does not guarantee accurate pronunciation!
+
+    param: token, the string token
+    param: ipa_dict, the dictionary ipa dictionary for the given language
+    param: lang, the string language abbreviation in use
+    return: (ipa, nearest), where: ipa, the string of IPA characters found, or "" if none found
+                                   nearest, the headword used, or None if none found
+    """
+    if isinstance(ipa_dict, CompactLexicon):
+        if ipa_dict.edit_index is None or ipa_dict.edit_index.max_distance < NEAREST_WORD_DISTANCE:
+            with lexicon_loading[lang]:
+                compile_lexicon(lang, ipa_dict)
+            with lexicon_lock:
+                if lang in loaded_lexicons:
+                    loaded_lexicons[lang] = lexicon_size(ipa_dict)
+        found = ipa_dict.nearest(token, NEAREST_WORD_DISTANCE)
+        if found is None:
+            return ("", None)
+        nearest, ipa, distance = found
+        return (ipa, nearest)
+
+    edit_index, headwords = get_edit_index(lang, ipa_dict)
+    found = edit_index.nearest(token, lambda ids: ((i, headwords[i]) for i in ids), NEAREST_WORD_DISTANCE)
+    if found is None:
+        return ("", None)
+    word_id, nearest, distance = found
+    return (ipa_dict[nearest], nearest)
+
 def handle_unknown_tokens(token, ipa_dict, lang):
     """
     Handles a token not found in the ipa dictionary for a given language.
-    Uses various methods.
+    Uses various methods (see resolve_unknown_token()), and keeps track of
+    tokens that could not be handled.
 
     param: token, the string token
     param: ipa_dict, the dictionary ipa dictionary for the given language
@@ -299,11 +1153,29 @@ def handle_unknown_tokens(token, ipa_dict, lang):
 
     FUTURE: allow just a language abbrev. to be passed too.
     """
-    found = ""
+    found, case = resolve_unknown_token(token, ipa_dict, lang)
+    count_unknown_token(token, lang, case)
+
+    return found
+
+def resolve_unknown_token(token, ipa_dict, lang, stemmer=None, contains_word=True):
+    """
+    Finds IPA for a token not found in the ipa dictionary for a given language,
+    without keeping track of it (see count_unknown_token()).
 
+    param: token, the string token
+    param: ipa_dict, the dictionary ipa dictionary for the given language
+    param: lang, the string language abbreviation in use
+    param: stemmer, (optional) the nltk SnowballStemmer for the language, if any
+    param: contains_word, default True, try the contains-word heuristic (Case 4) and after;
+                          if False, tokens it would be tried on return case "contains_word"
+    returns: (found, case), where: found, the string IPA found, or "" if none found
+                                   case, the string case that handled the token: "no_letter", "hyphenated",
+                                   "stem", "similar_word", "contains_word", "nearest_word" or "unhandled"
+    """
     # Only handle tokens that contain at least one letter
     if not contains_letter(token):
-        return found
+        return ("", "no_letter")
 
     # Case 1: Check hyphenated words
     if "-" in token:
@@ -312,32 +1184,25 @@ def handle_unknown_tokens(token, ipa_dict, lang):
         # Try joining hyphenated words
         joined = "".join(token_list)
         if joined in ipa_dict:
-            found = ipa_dict[joined]
+            return (ipa_dict[joined], "hyphenated")
         
         # Try separating hyphenated words
-        else:
-            ipa = ""
-            # Look for each new token
-            for tok in token_list:
-                # Concatenate transcriptions
-                ipa += (ipa_dict[tok] + " ") if tok in ipa_dict else ""
-            # If IPA was found for at least 1 separated token, add to found
-            if ipa:
-                found = ipa 
-            
-            # Else, skip this word
-            else:
-                unhandled_tokens[lang] += 1
-                unhandled_tokens_list[lang].append(token)   
-            
-            return found
+        ipa = ""
+        # Look for each new token
+        for tok in token_list:
+            # Concatenate transcriptions
+            ipa += (ipa_dict[tok] + " ") if tok in ipa_dict else ""
+        # If IPA was found for at least 1 separated token, it was handled
+        # Else, skip this word
+        return (ipa, "hyphenated" if ipa else "unhandled")
 
     # Case 2: Try a word stemmer from NLTK
     named_lang = NAMED_LANGS[lang]
-    if named_lang in SnowballStemmer.languages:
+    if stemmer is None and named_lang in SnowballStemmer.languages:
+        stemmer = SnowballStemmer(named_lang)
+    if stemmer is not None:
         
         # Find stem of token
-        stemmer = SnowballStemmer(named_lang)
         token_stem = stemmer.stem(token)
 
         # Add stem to IPA
@@ -351,28 +1216,79 @@ def handle_unknown_tokens(token, ipa_dict, lang):
                 ipa+= " " + ipa_dict[suffix]
                 #FUTURE: allow a suffix to also be treated as a stem (make recursive) e.g. "-enen" for suffix "-en"
 
-            found = ipa
-            return(found)
+            return (ipa, "stem")
         
     # Case 3: Try a similar-word pronunciation heuristic
     ipa = similar_word_ipa(token, ipa_dict, lang)
     if ipa:
-        found = ipa
-        return found
+        return (ipa, "similar_word")
 
     # Case 4: Try a contains-word pronunciation heuristic
+    if not contains_word:
+        return ("", "contains_word")
+
     ipa, similar = contains_word_ipa(token, ipa_dict, lang)
     if ipa:
-        contains_word_cases[lang] += 1 # keeping track
         #print("HANDLED: "+token+", "+similar+", "+ipa)
-        found = ipa
-        return found
+        return (ipa, "contains_word")
 
-    # Else, skip this word and add to unhandled tokens list
-    unhandled_tokens[lang] += 1
-    unhandled_tokens_list[lang].append(token)   
-    
-    return found
+    # Case 5: Try the nearest word by edit distance (for languages using it)
+    # Else, skip this word
+    return resolve_nearest_word(token, ipa_dict, lang)
+
+def resolve_nearest_word(token, ipa_dict, lang):
+    """
+    Case 5 of resolve_unknown_token(): the nearest-word fallback, for languages
+    using it (see init_nearest_word()). Returns (found, "nearest_word") if IPA
+    was found, else ("", "unhandled").
+    """
+    if lang in NEAREST_WORD_LANGS:
+        ipa, nearest = nearest_word_ipa(token, ipa_dict, lang)
+        if ipa:
+            return (ipa, "nearest_word")
+
+    return ("", "unhandled")
+
+def count_unknown_token(token, lang, case):
+    """
+    Keeps track of an occurrence of an unknown token, by the case that handled it
+    (see resolve_unknown_token()): tokens handled with the contains-word heuristic
+    or the nearest-word fallback are counted, and unhandled tokens are added to the
+    unhandled tokens list (up to UNHANDLED_LIST_LIMIT tokens for each language).
+    """
+    if case == "contains_word":
+        contains_word_cases[lang] += 1 # keeping track
+    elif case == "nearest_word":
+        nearest_word_cases[lang] += 1
+    elif case == "unhandled":
+        unhandled_tokens[lang] += 1
+        if UNHANDLED_LIST_LIMIT is None or len(unhandled_tokens_list[lang]) < UNHANDLED_LIST_LIMIT:
+            unhandled_tokens_list[lang].append(token)
+
+def resolve_unknown_tokens(tokens, ipa_dict, lang):
+    """
+    Finds IPA for many tokens not found in the ipa dictionary at once (e.g. all unknown
+    tokens of a document), without keeping track of them (see count_unknown_token()).
+    Each distinct token is handled once, and the contains-word heuristic is applied 
+    to all tokens that need it together (see contains_word_ipa_bulk()).
+
+    param: tokens, an iterable of string tokens
+    param: ipa_dict, the dictionary ipa dictionary for the given language
+    param: lang, the string language abbreviation in use
+    returns: resolved, a dictionary of token : (found, case), as returned by resolve_unknown_token()
+    """
+    named_lang = NAMED_LANGS[lang]
+    stemmer = SnowballStemmer(named_lang) if named_lang in SnowballStemmer.languages else None
+
+    resolved = {}
+    for token in set(tokens):
+        resolved[token] = resolve_unknown_token(token, ipa_dict, lang, stemmer, contains_word=False)
+
+    remaining = [token for token, (found, case) in resolved.items() if case == "contains_word"]
+    for token, (ipa, similar) in contains_word_ipa_bulk(remaining, ipa_dict, lang).items():
+        resolved[token] = (ipa, "contains_word") if ipa else resolve_nearest_word(token, ipa_dict, lang)
+
+    return resolved
 
 # Evenly space out phoneme characters in a string of phonemes
 def remove_extra_spaces(phonemes):
@@ -388,7 +1304,7 @@ def remove_extra_spaces(phonemes):
     return pretty
 
 # Transcribe sentence from text to IPA
-def ipa_lookup(sent, lang, ipa_dict=None):
+def ipa_lookup(sent, lang, ipa_dict=None, oov_memo=None):
     """
     Look up IPA transcriptions for a given sentence (list of tokens).
     Return the sentence in IPA.
@@ -397,13 +1313,14 @@ def ipa_lookup(sent, lang, ipa_dict=None):
     param: lang, the string language abbreviation 
     param: ipa_dict, the dictionary object IPA dictionary for the language
                      (use lang to create, if no ipa_dict given)
+    param: oov_memo, (optional) a dictionary of unknown token : (IPA found, case), shared 
+                     between calls so each unknown token is only handled once
+                     (see resolve_unknown_token(), resolve_unknown_tokens())
     returns: phonemic_sent, the string sentence in phonemes
     """
 
     if not ipa_dict:
-        ipa_dict = languages[lang]["ipa_dict"]
-        if not ipa_dict:
-            ipa_dict = init_ipa_dictionary(lang)
+        ipa_dict = get_ipa_dictionary(lang)
     
     phonemic_sent = ""
 
@@ -412,7 +1329,13 @@ def ipa_lookup(sent, lang, ipa_dict=None):
             
         # Handle unknown tokens
         if token not in ipa_dict:
-            ipa = handle_unknown_tokens(token, ipa_dict, lang)
+            if oov_memo is not None and token in oov_memo:
+                ipa, case = oov_memo[token]
+            else:
+                ipa, case = resolve_unknown_token(token, ipa_dict, lang)
+                if oov_memo is not None:
+                    oov_memo[token] = (ipa, case)
+            count_unknown_token(token, lang, case)
             
             if ipa: # if ipa found
                 transcribed_tokens[lang] += 1
@@ -432,7 +1355,7 @@ def ipa_lookup(sent, lang, ipa_dict=None):
     return remove_extra_spaces(phonemic_sent)
 
 # Convert document from tokens to IPA for training
-def convert(doc_path, language):
+def convert(doc_path, language, bulk=True):
     """
     Convert document from natural language tokens 
     to phonemes in IPA characters using an IPA dictionary
@@ -442,6 +1365,9 @@ def convert(doc_path, language):
 
     param: doc_path, a string path to the document to be converted
     param: language, a string abbreviation for the document language
+    param: bulk, default True, find IPA for all unknown tokens of the document
+                 at once before transcribing (see resolve_unknown_tokens()),
+                 instead of handling each occurrence as it appears
 
     Supported languages: 
     [] English (North American) (en)
@@ -457,7 +1383,7 @@ def convert(doc_path, language):
     [] Cantonese (yue)
     """
     
-    ipa_dict = init_ipa_dictionary(language)
+    ipa_dict = get_ipa_dictionary(language)
     
     text_file = doc_path
     ipa_file = IPA_DOCS+language+"-doc-in-ipa-v2.txt"
@@ -491,10 +1417,16 @@ def convert(doc_path, language):
         # Tokenize each sentence and convert to IPA, then write to phoneme document
         tokenized_sents = tokenize_sentences(sentences, language)
 
+        # Find IPA for each distinct unknown token once
+        oov_memo = None
+        if bulk:
+            unknown = {token for sent in tokenized_sents for token in sent if token not in ipa_dict}
+            oov_memo = resolve_unknown_tokens(unknown, ipa_dict, language)
+
         for sent in tokenized_sents:
 
             # Look up IPA transcription
-            phonemic_sent = ipa_lookup(sent, language, ipa_dict)
+            phonemic_sent = ipa_lookup(sent, language, ipa_dict, oov_memo)
             
             # Only write sentences with IPA found to phonemes document
             if phonemic_sent:
@@ -506,6 +1438,9 @@ def convert_documents():
     """
     Convert all documents for training into IPA.
     """
+    # Load all IPA dictionaries up front, in parallel
+    load_ipa_dictionaries(LANGUAGES)
+
     for lang in LANGUAGES:
         
         doc = DOCUMENT_PATH + languages[lang]["doc_file"]
@@ -529,10 +1464,12 @@ def convert_documents():
             print(l+" ( size =", len(unique_tokens), ")"+":",unique_tokens,"\n")
 
         print("\nNumber of tokens (including repeats) handled using contains-word heuristic:\n", contains_word_cases, "\n")
+        if NEAREST_WORD_LANGS:
+            print("Number of tokens (including repeats) handled using nearest-word fallback:\n", nearest_word_cases, "\n")
 
 
 # Simple translate
-def translate(sentence, lang, mode="fit"):
+def translate(sentence, lang, mode="fit", use_cache=True, oov_memo=None):
     """
     Translate a sentence in a given language from text to IPA characters.
     *Can be used for any sentence argument in a known language.*
@@ -544,27 +1481,88 @@ def translate(sentence, lang, mode="fit"):
                 "fit": matches close-enough IPA using various methods
                 "exact": returns only known IPA for specific tokens;
                          (this mode might not translate every word)
+    param: use_cache, default True, reuse translations of repeated sentences
+                      (see init_translation_cache()). Cached translations are not 
+                      counted in the transcribed and unhandled token counters again, 
+                      so use_cache=False to count every sentence for coverage statistics.
+    param: oov_memo, (optional) a dictionary of unknown tokens already handled
+                     (see ipa_lookup())
     return: phonemes, the string ipa transcription of the given sentence 
     """
 
-    ipa_dict = languages[lang]["ipa_dict"]
-    # Only initialize IPA dictionary once
-    if not ipa_dict:
-        ipa_dict = init_ipa_dictionary(lang)
+    if use_cache:
+        # Cached translations only need the dictionary version, not the dictionary
+        current_ipa_version(lang)
+
+        key = translation_key(sentence, lang, mode)
+        phonemes = cache_lookup(key)
+        if phonemes is not None:
+            return phonemes
+
+    # Only initialize IPA dictionary once (see get_ipa_dictionary())
+    ipa_dict = get_ipa_dictionary(lang)
 
     tokens = tokenize_sentences([sentence],lang)[0] # function takes list of sentences
                                                  # and returns list of list of tokens,
                                                  # so take 1st item
 
+    phonemes = None
     if mode=="fit":
-        return ipa_lookup(tokens, lang, ipa_dict)
+        phonemes = ipa_lookup(tokens, lang, ipa_dict, oov_memo)
     
     elif mode=="exact":
         phonemes = ""
         for tok in tokens:
             if tok in ipa_dict:
                 phonemes += ipa_dict[tok] + " "
-        return phonemes
+
+    if use_cache and phonemes is not None:
+        key = translation_key(sentence, lang, mode) # in case loading changed the version
+        cache_store(key, lang, phonemes)
+
+    return phonemes
+
+def tokenizer_family(lang):
+    """
+    Returns the tokenizer used for a language (see tokenize_sentences()): 
+    "jieba" for Cantonese, else "nltk". Languages of the same family share tokens.
+    """
+    return "jieba" if lang=="yue" else "nltk"
+
+def transcribe_known_tokens(tokens, lang, ipa_dict=None):
+    """
+    Transcribe the tokens of a sentence using the IPA dictionary of a language, with only 
+    the similar-word heuristic for unknown tokens (see similar_word_ipa()), and without 
+    keeping track of them. Used to transcribe text of an unknown language into each 
+    candidate language, since the other heuristics transcribe almost any token.
+
+    param: tokens, the list of string tokens
+    param: lang, the string language abbreviation
+    param: ipa_dict, (optional) the IPA dictionary for the language (default: get_ipa_dictionary())
+    returns: (phonemes, coverage), where: phonemes, the string IPA transcription
+                                          coverage, the float fraction of tokens containing a letter
+                                          found in the IPA dictionary, counting the fraction of characters
+                                          found of unknown tokens (None if there are no such tokens)
+    """
+    if not ipa_dict:
+        ipa_dict = get_ipa_dictionary(lang)
+
+    phonemes = ""
+    words, known = 0, 0.0
+    for token in tokens:
+        if token in ipa_dict:
+            phonemes += ipa_dict[token] + " "
+            known += 1
+            words += 1
+        elif contains_letter(token):
+            parts = similar_word_parts(token, ipa_dict, lang)
+            for part in parts:
+                phonemes += ipa_dict[part] + " "
+            known += sum(len(part) for part in parts) / len(token)
+            words += 1
+
+    coverage = known / words if words else None
+    return remove_extra_spaces(phonemes), coverage
 
 def parse_ipa_input(ipa):
     """
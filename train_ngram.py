@@ -6,7 +6,14 @@ June, 2022
 Train an ngram model on phoneme distributions in several languages.
 """
 
+import bisect
+import hashlib
 import math
+import json
+import os
+import struct
+from array import array
+from itertools import islice
 import nltk
 from nltk.lm import NgramCounter
 from nltk import ngrams
@@ -22,6 +29,21 @@ for l in LANGUAGES:
 END_UTTERANCE = "."
 LANGUAGE_NGRAMS = {} # store here for access later
 
+LOWEST_PROB = 0.0001128 # by taking lowest probability unigram across all languages, minus trailing digits
+
+# Names of n-gram sizes that can be trained (see make_orders())
+ORDER_NAMES = {1: "unigrams", 2: "bigrams", 3: "trigrams", 4: "fourgrams", 
+               5: "fivegrams", 6: "sixgrams", 7: "sevengrams"}
+
+# N-gram sizes trained and scored, and 64-bit rolling hash of n-grams of phoneme IDs (see extract_ngram_keys())
+ORDERS = {"bigrams": 2, "trigrams": 3, "fourgrams": 4}
+HASH_BASE = 1099511628211 # 64-bit FNV prime
+HASH_MASK = (1 << 64) - 1
+
+# Quantized model file format
+QUANTIZED_MAGIC = b"PNGRAMQ2\n"
+QUANTIZED_TYPECODES = {8: "B", 16: "H"} # unsigned 8- and 16-bit codes
+
 
 # Open and parse corpus files for phonemes
 def load_corpus_phonemes(corpus_file, end_utterance_symbol = END_UTTERANCE):
@@ -55,6 +77,7 @@ def create_ngrams(tokens, n, k=0):
                         the ngram given the number of all ngrams generated for the tokens.
     
                         Example: {"('ə', 'f', 'ə')" : {"count": 4, "log_prob": -3.09105},...}
+                        N-grams are ordered from most to least frequent (ties in order of first occurrence).
     """
 
     # Generate list of ngrams with start and end padding
@@ -73,6 +96,22 @@ def create_ngrams(tokens, n, k=0):
         else:
             ngram_counts[ngram] += 1
 
+    top_ngrams = rank_ngrams(ngram_counts, k)
+
+    #print_grams(top_ngrams)
+
+    return(top_ngrams)
+
+
+def rank_ngrams(ngram_counts, k=0):
+    """
+    Order counted n-grams from most to least frequent, keeping the top k,
+    with log probabilities over all n-grams (see create_ngrams()).
+
+    param: ngram_counts, a dictionary of n-gram : int count, in order of first occurrence
+    param: k, int size of most frequent n-grams to return (default is all n-grams)
+    return: top_ngrams, a dict of n-gram : {"count", "log_prob"}, as in create_ngrams()
+    """
     # Total number of all ngrams
     sum_ngrams = sum(ngram_counts.values())
 
@@ -96,9 +135,43 @@ def create_ngrams(tokens, n, k=0):
         log_prob = math.log(prob)
         top_ngrams[ngram]["log_prob"] = log_prob
 
-    #print_grams(top_ngrams)
+    return top_ngrams
 
-    return(top_ngrams)
+
+# Choose n-gram sizes
+def make_orders(sizes):
+    """
+    Returns a dictionary of n-gram name : int n for the given n-gram sizes (1 to 7),
+    for example make_orders(range(1, 8)) for unigrams to sevengrams.
+    """
+    orders = {}
+    for n in sorted(set(sizes)):
+        if n not in ORDER_NAMES:
+            raise ValueError("n-gram sizes must be in " + str(list(ORDER_NAMES)))
+        orders[ORDER_NAMES[n]] = n
+
+    return orders
+
+
+def count_ngrams(tokens, orders=ORDERS):
+    """
+    Count the padded n-grams of each order in a list of tokens, as create_ngrams() does for one order.
+
+    param: tokens, list of string tokens from which to compute n-grams
+    param: orders, the dictionary of n-gram name : int n (default ORDERS)
+    return: counts, a dictionary of the form {"bigrams": {n-gram tuple: int count, ...}, ...},
+                    with n-grams in order of first occurrence
+    """
+    counts = {}
+    for name, n in orders.items():
+        grams = ngrams(tokens, n, left_pad_symbol="$", right_pad_symbol="/$", pad_left=True, pad_right=True)
+
+        ngram_counts = {}
+        for ngram in grams:
+            ngram_counts[ngram] = ngram_counts.get(ngram, 0) + 1
+        counts[name] = ngram_counts
+
+    return counts
 
 
 def print_grams(top_ngrams, with_header=True):
@@ -129,28 +202,27 @@ def print_l_grams(language_ngrams):
     
     
 # Compute dictionary of top k n-grams for each language
-def train_languages(langs, k=0):
+def train_languages(langs, k=0, orders=ORDERS):
     """
     Creates a dictionary of n-grams for each language,
     that can be accessed in language identification. 
 
     param: langs, the list of languages to create ngrams for
     param: k, (optional) the int most frequent n-grams to find for each language
+    param: orders, (optional) the dictionary of n-gram name : int n (default ORDERS:
+                   bigrams, trigrams, four-grams; see make_orders())
     returns: language_ngrams, a dictionary of dictionaries for 
-                              each language, containing: 
-                              bigrams, trigrams, four-grams.
+                              each language, containing a table for each order.
     """
     language_ngrams = {}
 
     for l in langs:
 
-        ngrams_dict = {}
         corpus = CORPORA[l]
         phonemes = load_corpus_phonemes(corpus)
         
-        ngrams_dict["bigrams"] = create_ngrams(phonemes, 2, k)
-        ngrams_dict["trigrams"] = create_ngrams(phonemes, 3, k)
-        ngrams_dict["fourgrams"] = create_ngrams(phonemes, 4, k)
+        counts = count_ngrams(phonemes, orders)
+        ngrams_dict = {name: rank_ngrams(counts[name], k) for name in orders}
 
         language_ngrams[l] = ngrams_dict
 
@@ -158,6 +230,316 @@ def train_languages(langs, k=0):
     return language_ngrams
 
 
+# Derive top k n-gram profiles from full n-gram tables
+def top_k_profiles(language_ngrams, k=0):
+    """
+    Returns language profiles of only the top k n-grams of each table, 
+    taken from the full tables (which are in frequency order), so any k 
+    can be compared without training again. The new tables share the
+    entries of the full tables, and score like train_languages(langs, k).
+
+    param: language_ngrams, the dictionary of full n-gram tables from train_languages() (with k=0)
+    param: k, (optional) the int most frequent n-grams to keep (default 0, all n-grams)
+    returns: profiles, a dictionary like language_ngrams, for identify.compare_language()
+    """
+    if k == 0:
+        return language_ngrams
+
+    return {l: {n: dict(islice(table.items(), k)) for n, table in language_ngrams[l].items()} 
+            for l in language_ngrams}
+
+
+# Trim n-gram tables to their top k n-grams
+def trim_ngrams(language_ngrams, k):
+    """
+    Replace each table with a new table of only its top k n-grams, to save memory
+    (deleting n-grams would not shrink the table). The tables of each language are 
+    replaced within its dictionary, so references to that dictionary see the trimmed tables.
+    Log probabilities stay over all n-grams, as in train_languages(langs, k).
+
+    param: language_ngrams, the dictionary of n-grams from train_languages()
+    param: k, the int most frequent n-grams to keep
+    returns: removed, the int number of n-grams removed
+    """
+    removed = 0
+    for l in language_ngrams:
+        for n, table in language_ngrams[l].items():
+            if len(table) > k:
+                removed += len(table) - k
+                language_ngrams[l][n] = dict(islice(table.items(), k)) # tables are in frequency order
+
+    return removed
+
+
+# Map phonemes to integer IDs
+def phoneme_to_ids(phonemes, phoneme_ids, extend=True):
+    """
+    Map a list of phonemes to a list of integer phoneme IDs.
+    The padding symbols "$" and "/$" always have IDs.
+
+    param: phonemes, the list of string phonemes
+    param: phoneme_ids, the dictionary of phoneme : int ID
+    param: extend, default True, add new phonemes to phoneme_ids. If False,
+                   new phonemes get IDs (after all known IDs) for this call only.
+    return: ids, the list of int IDs
+    """
+    for symbol in ("$", "/$"):
+        if symbol not in phoneme_ids:
+            phoneme_ids[symbol] = len(phoneme_ids) + 1
+
+    new_ids = phoneme_ids if extend else {}
+    ids = []
+    for phoneme in phonemes:
+        phoneme_id = phoneme_ids.get(phoneme)
+        if phoneme_id is None:
+            phoneme_id = new_ids.get(phoneme)
+            if phoneme_id is None:
+                phoneme_id = len(phoneme_ids) + 1 if extend else len(phoneme_ids) + len(new_ids) + 1
+                new_ids[phoneme] = phoneme_id
+        ids.append(phoneme_id)
+
+    return ids
+
+
+# Hash n-grams of phoneme IDs to 64-bit keys
+def ngram_key(ids):
+    """
+    Returns the 64-bit key of an n-gram of phoneme IDs: a polynomial hash,
+    the same key extract_ngram_keys() computes with its rolling hash.
+    """
+    key = 0
+    for phoneme_id in ids:
+        key = (key * HASH_BASE + phoneme_id) & HASH_MASK
+
+    return key
+
+
+def extract_ngram_keys(ids, orders=ORDERS, check=None):
+    """
+    Count the n-grams of all orders in a sequence of phoneme IDs as 64-bit keys,
+    in one pass with a rolling hash for each order (no n-gram tuples are built).
+    N-grams are padded like create_ngrams(): n-1 "$" IDs on the left, n-1 "/$" IDs on the right.
+
+    param: ids, the list (or array) of int phoneme IDs, already padded with
+                max(orders)-1 "$" IDs on the left and "/$" IDs on the right
+    param: orders, the dictionary of n-gram name : int n (default ORDERS)
+    param: check, (optional) a dictionary of key : n-gram of IDs, to check for hash collisions.
+                  Raises ValueError if two different n-grams have the same key.
+    return: counts, a dictionary of the form {"bigrams": {int key: int count, ...}, ...}
+    """
+    max_n = max(orders.values())
+    length = len(ids)
+
+    # State for each order: [n, B^n (to remove the leaving ID), first and last window end, hash, counts]
+    states = []
+    counts = {}
+    for name, n in orders.items():
+        counts[name] = {}
+        states.append([n, pow(HASH_BASE, n, HASH_MASK + 1), max_n - 1, length - 1 - (max_n - n), 0, counts[name]])
+
+    for i in range(length):
+        entering = ids[i]
+        for state in states:
+            n, power, first, last, key, table = state
+
+            # Slide the window: add the entering ID, remove the leaving ID
+            key = key * HASH_BASE + entering
+            if i >= n:
+                key -= ids[i-n] * power
+            key &= HASH_MASK
+            state[4] = key
+
+            if first <= i <= last:
+                table[key] = table.get(key, 0) + 1
+
+                if check is not None:
+                    gram = tuple(ids[i-n+1:i+1])
+                    if check.setdefault(key, gram) != gram:
+                        raise ValueError("Hash collision: " + str(check[key]) + " and " + str(gram))
+
+    return counts
+
+
+# Convert n-gram tables to tables keyed by 64-bit n-gram keys
+def pack_profiles(language_ngrams, phoneme_ids):
+    """
+    Convert trained n-gram tables (of n-gram tuples) to tables of 64-bit n-gram keys : log probability,
+    with the same keys extract_ngram_keys() computes for queries (see ngram_key()).
+
+    param: language_ngrams, the dictionary of n-grams from train_languages()
+    param: phoneme_ids, the dictionary of phoneme : int ID, extended with any new phonemes
+    return: packed, a dictionary of the form {"en": {"bigrams": {int key: float log_prob, ...}, ...}, ...}
+    """
+    packed = {}
+    for l in language_ngrams:
+        packed[l] = {}
+        for n in language_ngrams[l]:
+            table = {}
+            for gram, entry in language_ngrams[l][n].items():
+                table[ngram_key(phoneme_to_ids(gram, phoneme_ids))] = entry["log_prob"]
+            packed[l][n] = table
+
+    return packed
+
+
+# Quantize log probabilities of trained n-grams
+def gram_hash(gram):
+    """
+    Returns a stable 64-bit hash of an n-gram tuple of phonemes (the same in every process),
+    which keys the n-grams of quantized tables.
+    """
+    key = "\x1f".join(gram).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def quantized_code(table, key):
+    """
+    Returns the code of an n-gram in a quantized table, or None if the n-gram is not in it.
+    The table's keys are sorted, so the n-gram's key (its gram_hash()) is found by binary search.
+    """
+    keys = table["keys"]
+    i = bisect.bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+        return table["codes"][i]
+    return None
+
+
+def quantize_languages(language_ngrams, bits=8):
+    """
+    Quantize the log probabilities of trained n-grams into 8- or 16-bit integer codes.
+    Each table (language and n-gram size) has its own offset and scale, so that:
+        log_prob ~= offset + code * scale
+    
+    Tables keep no n-gram tuples: n-grams are keyed by their 64-bit hashes (see gram_hash())
+    in a sorted array, with an array of codes in the same order (see quantized_code()).
+
+    param: language_ngrams, the dictionary of n-grams from train_languages()
+    param: bits, int size of codes, 8 or 16 (default 8)
+    returns: quantized, a dictionary of quantized tables for each language, of the form:
+                        {"en": {"bigrams": {"bits": 8, "offset": -9.1, "scale": 0.03,
+                                            "keys": array("Q", [...]), "codes": array("B", [...])},
+                                "trigrams": ..., ...}, ...}
+    """
+    if bits not in QUANTIZED_TYPECODES:
+        raise ValueError("bits must be one of " + str(list(QUANTIZED_TYPECODES)))
+
+    levels = 2**bits - 1
+    quantized = {}
+
+    for l in language_ngrams:
+        quantized[l] = {}
+        for n in language_ngrams[l]:
+            grams = language_ngrams[l][n]
+            log_probs = [grams[gram]["log_prob"] for gram in grams]
+
+            offset = min(log_probs) if log_probs else 0.0
+            scale = (max(log_probs) - offset) / levels if log_probs else 0.0
+
+            # Sort codes by the hashes of their n-grams
+            hashed = sorted((gram_hash(gram), round((log_prob - offset) / scale) if scale else 0)
+                            for gram, log_prob in zip(grams, log_probs))
+            keys = array("Q", (key for key, code in hashed))
+            codes = array(QUANTIZED_TYPECODES[bits], (code for key, code in hashed))
+            for i in range(1, len(keys)):
+                if keys[i] == keys[i-1]:
+                    raise ValueError("Hash collision between n-grams of " + l + " " + n)
+
+            quantized[l][n] = {"bits": bits, "offset": offset, "scale": scale, "keys": keys, "codes": codes}
+
+    return quantized
+
+
+def save_quantized(quantized, model_file):
+    """
+    Save a quantized model (from quantize_languages()) to a binary file.
+
+    File layout: a magic line, a JSON header line describing each table, 
+    then for each table its little-endian arrays of 64-bit keys and of codes.
+
+    The file is written next to model_file and then renamed, so a process
+    watching model_file never reads a partly written model.
+
+    param: quantized, the dictionary of quantized tables
+    param: model_file, string file path to write
+    """
+    header = []
+    blobs = []
+    swap = struct.pack("=H", 1) != struct.pack("<H", 1)
+
+    for l in quantized:
+        for n in quantized[l]:
+            table = quantized[l][n]
+            keys, codes = array("Q", table["keys"]), array(QUANTIZED_TYPECODES[table["bits"]], table["codes"])
+            if swap:
+                keys.byteswap() # store little-endian
+                codes.byteswap()
+
+            header.append({"lang": l, "n": n, "bits": table["bits"], 
+                           "offset": table["offset"], "scale": table["scale"],
+                           "size": len(codes)})
+            blobs.append(keys.tobytes())
+            blobs.append(codes.tobytes())
+
+    with open(model_file + ".tmp", "wb") as f:
+        f.write(QUANTIZED_MAGIC)
+        f.write(json.dumps(header).encode("utf-8") + b"\n")
+        for blob in blobs:
+            f.write(blob)
+    os.replace(model_file + ".tmp", model_file)
+
+
+def load_quantized(model_file):
+    """
+    Load a quantized model saved with save_quantized().
+    Keys and codes are read straight into arrays (no n-gram tuples are built).
+
+    param: model_file, string file path to read
+    returns: quantized, the dictionary of quantized tables (see quantize_languages())
+    """
+    with open(model_file, "rb") as f:
+        data = f.read()
+
+    return parse_quantized(data, model_file)
+
+
+def parse_quantized(data, source="bytes"):
+    """
+    Load a quantized model from the bytes of a file saved with save_quantized()
+    (see load_quantized()).
+
+    param: data, the bytes of the model file
+    param: source, (optional) string name of where the bytes came from, for errors
+    returns: quantized, the dictionary of quantized tables (see quantize_languages())
+    """
+    if not data.startswith(QUANTIZED_MAGIC):
+        raise ValueError("Not a quantized n-gram model file: " + source)
+
+    start = len(QUANTIZED_MAGIC)
+    end = data.index(b"\n", start)
+    header = json.loads(data[start:end].decode("utf-8"))
+    position = end + 1
+    swap = struct.pack("=H", 1) != struct.pack("<H", 1)
+
+    quantized = {}
+    for table in header:
+        arrays = []
+        for typecode in ("Q", QUANTIZED_TYPECODES[table["bits"]]):
+            values = array(typecode)
+            n_bytes = table["size"] * values.itemsize
+            values.frombytes(data[position:position+n_bytes])
+            if swap:
+                values.byteswap()
+            position += n_bytes
+            arrays.append(values)
+        keys, codes = arrays
+
+        quantized.setdefault(table["lang"], {})[table["n"]] = {
+            "bits": table["bits"], "offset": table["offset"], "scale": table["scale"],
+            "keys": keys, "codes": codes}
+
+    return quantized
+
+
 # Run training functions as needed:
 if __name__ == "__main__":
 